@@ -0,0 +1,123 @@
+"""
+Bytes uploaded to blob storage for a replayed story workload, with
+timestamped blob names (BLOB_CONTENT_ADDRESSING=false, the old behaviour)
+and with content-addressed names, which skip blobs that already exist.
+
+The workload is `--requests` POST /api/stories drawn from `--distinct`
+theme/character combinations, a `--fresh` fraction of them bypassing the
+generation cache. Repeats get the cached story text (and, with the audio
+cache, the stored narration), so their uploads are the duplicates content
+addressing can skip; cached illustrations reuse the stored image and are not
+uploaded in either mode. Each mode runs in a fresh process
+and database against its own fake Azure server; bytes are counted by the
+fake blob endpoint.
+
+    cd backend
+    python -m benchmarks.blob_dedup --requests 60 --distinct 10 --fresh 0.2
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+from fake_azure.server import FakeAzureServer, FakeAzureProfile, fake_azure_env
+
+THEMES = ['Space Adventure', 'Magic Kingdom', 'Ocean Explorer', 'Dinosaur World', 'Fairy Tale', 'Superhero']
+CHARACTERS = ['a brave fox', 'a curious robot', 'a tiny dragon', 'a kind giant', 'two clever mice']
+
+REPLAY = """
+import os, json, random, requests
+from create_app import create_app
+from extensions import db, service_registry
+workload = json.loads(os.environ['WORKLOAD'])
+app = create_app()
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+for request in workload:
+    response = client.post('/api/stories', json=request)
+    assert response.status_code == 201, response.get_data(as_text=True)
+stats = requests.get(os.environ['FAKE_STATS_URL']).json()
+print(json.dumps({
+    'uploadedBytes': stats['uploadedBytes'],
+    'stored': {name: container['bytes'] for name, container in stats['blobs'].items()},
+    'content': service_registry.storage.content_stats()
+}))
+"""
+
+
+def workload(args):
+    import random
+    rng = random.Random(args.seed)
+    combinations = [
+        (rng.choice(THEMES), rng.sample(CHARACTERS, rng.randint(1, 2)), rng.choice(['3-5', '6-8']))
+        for _ in range(args.distinct)
+    ]
+    requests = []
+    for _ in range(args.requests):
+        theme, characters, age_group = rng.choice(combinations)
+        requests.append({
+            'theme': theme, 'characters': characters, 'age_group': age_group,
+            'fresh': rng.random() < args.fresh
+        })
+    return requests
+
+
+def replay(label, args, requests):
+    fake = FakeAzureServer(FakeAzureProfile.instant(), quiet=True).start()
+    workdir = tempfile.mkdtemp(prefix='blob-dedup-')
+    env = {
+        **os.environ,
+        **fake_azure_env(fake.url),
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'stories.db')}",
+        'GENERATION_CACHE_PATH': os.path.join(workdir, 'cache.db'),
+        'AUDIO_CACHE_ENABLED': 'false' if args.no_audio_cache else 'true',
+        'BLOB_CONTENT_ADDRESSING': 'true' if label == 'content' else 'false',
+        'FAKE_STATS_URL': f"{fake.url}/_fake/stats",
+        'WORKLOAD': json.dumps(requests)
+    }
+    try:
+        output = subprocess.run(
+            [sys.executable, '-c', REPLAY], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+    finally:
+        fake.stop()
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bytes uploaded with and without content-addressed blobs")
+    parser.add_argument('--requests', type=int, default=60)
+    parser.add_argument('--distinct', type=int, default=10, help="distinct theme/characters/age combinations")
+    parser.add_argument('--fresh', type=float, default=0.2, help="fraction of requests that skip the generation cache")
+    parser.add_argument('--no-audio-cache', action='store_true', help="turn off the narration cache")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    requests = workload(args)
+    results = {label: replay(label, args, requests) for label in ('timestamped', 'content')}
+
+    containers = sorted({name for result in results.values() for name in result['uploadedBytes']})
+    print(f"\n{args.requests} requests, {args.distinct} combinations, {args.fresh:.0%} fresh, "
+          f"audio cache {'off' if args.no_audio_cache else 'on'}")
+    print(f"\n{'uploaded MB':>12} {'timestamped':>12} {'content':>9} {'saved':>7}")
+    for name in containers + ['total']:
+        if name == 'total':
+            before = sum(results['timestamped']['uploadedBytes'].values())
+            after = sum(results['content']['uploadedBytes'].values())
+        else:
+            before = results['timestamped']['uploadedBytes'].get(name, 0)
+            after = results['content']['uploadedBytes'].get(name, 0)
+        saved = 1 - after / before if before else 0
+        print(f"{name:>12} {before / 1e6:12.2f} {after / 1e6:9.2f} {saved:7.1%}")
+    stored_before = sum(results['timestamped']['stored'].values())
+    stored_after = sum(results['content']['stored'].values())
+    print(f"\nStored: {stored_before / 1e6:.2f} MB timestamped, {stored_after / 1e6:.2f} MB content-addressed")
+    print(f"Content-addressed saves: {results['content']['content']}")
+
+
+if __name__ == '__main__':
+    main()
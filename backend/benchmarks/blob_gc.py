@@ -0,0 +1,79 @@
+"""
+Deleting orphaned blobs one Delete Blob request at a time (what a loop over
+delete_blob does) against Blob Batch requests of up to 256 deletes, as the
+garbage collector sends them, plus how fast a sweep lists a container.
+
+Runs against the fake blob endpoint with a fixed per-request latency
+(`--latency blob=fixed:0.02` by default) standing in for the round trip.
+
+    cd backend
+    python -m benchmarks.blob_gc --blobs 1000 --batch-sizes 1,64,256
+"""
+import os
+import time
+import argparse
+
+from fake_azure.server import FakeAzureServer, fake_azure_env, add_profile_arguments, profile_from_args
+
+
+def fill(storage, container, count, label):
+    names = [f"orphan_{label}_{index:05d}.png" for index in range(count)]
+    storage.upload_blobs([(container, name, b'x' * 256, 'image/png') for name in names])
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark one-by-one and batched blob deletes")
+    parser.add_argument('--blobs', type=int, default=1000)
+    parser.add_argument('--batch-sizes', default='1,64,256', help="comma separated deletes per Blob Batch request")
+    parser.add_argument('--page-size', type=int, default=1000, help="List Blobs page size for the listing pass")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.latency:
+        args.latency = ['blob=fixed:0.02']
+
+    fake = FakeAzureServer(profile_from_args(args), quiet=True).start()
+    os.environ.update(fake_azure_env(fake.url))
+    from services.blob_storage import BlobStorageService
+
+    storage = BlobStorageService()
+    storage.ensure_containers()
+    container = 'images'
+
+    print(f"\n{args.blobs} blobs, latency {', '.join(args.latency)}")
+    print(f"\n{'method':>14} {'requests':>9} {'seconds':>8} {'deletes/s':>10}")
+    try:
+        names = fill(storage, container, args.blobs, 'single')
+        start = time.perf_counter()
+        for name in names:
+            storage.delete_blob(container, name)
+        elapsed = time.perf_counter() - start
+        print(f"{'delete_blob':>14} {len(names):9d} {elapsed:8.2f} {len(names) / elapsed:10.0f}")
+
+        for batch_size in (int(value) for value in args.batch_sizes.split(',')):
+            names = fill(storage, container, args.blobs, f'batch{batch_size}')
+            start = time.perf_counter()
+            deleted = 0
+            for offset in range(0, len(names), batch_size):
+                deleted += len(storage.delete_blobs(container, names[offset:offset + batch_size])[0])
+            elapsed = time.perf_counter() - start
+            assert deleted == len(names), f"only {deleted} of {len(names)} deleted"
+            requests = -(-len(names) // batch_size)
+            print(f"{f'batch of {batch_size}':>14} {requests:9d} {elapsed:8.2f} {deleted / elapsed:10.0f}")
+
+        names = fill(storage, container, args.blobs, 'listed')
+        start = time.perf_counter()
+        pages = listed = 0
+        for page in storage.list_blob_pages(container, page_size=args.page_size):
+            pages += 1
+            listed += len(page)
+        elapsed = time.perf_counter() - start
+        print(f"\nListed {listed} blobs in {pages} pages in {elapsed:.2f}s ({listed / elapsed:.0f}/s)")
+        for offset in range(0, len(names), storage.MAX_BATCH_DELETE):
+            storage.delete_blobs(container, names[offset:offset + storage.MAX_BATCH_DELETE])
+    finally:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
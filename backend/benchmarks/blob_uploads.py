@@ -0,0 +1,74 @@
+"""
+Compare blob upload throughput of the old synchronous path (one upload after
+another, default client settings) with the async backend (uploads in flight
+together on one event loop, each split into blocks sent `--concurrency` at a
+time), against the fake Azure blob endpoint, for a few payload sizes.
+`blob.mb` gives each connection a bandwidth (0.05 s per MB = 20 MB/s);
+without it the fake server only adds per-request latency.
+
+    cd backend
+    python -m benchmarks.blob_uploads --sizes 1,5,10,20 --uploads 6 --latency blob=fixed:0.02 --latency blob.mb=fixed:0.05
+"""
+import os
+import time
+import argparse
+
+from fake_azure.server import FakeAzureServer, fake_azure_env, add_profile_arguments, profile_from_args
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async blob uploads")
+    parser.add_argument('--sizes', default='1,5,10,20', help="comma separated payload sizes in MB")
+    parser.add_argument('--uploads', type=int, default=6, help="uploads per size (e.g. stories saved at once)")
+    parser.add_argument('--block-size', type=int, default=4, help="block size in MB")
+    parser.add_argument('--concurrency', type=int, default=4, help="blocks in flight per upload")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = FakeAzureServer(profile_from_args(args), quiet=True).start()
+    os.environ.update(fake_azure_env(fake.url))
+    os.environ['BLOB_ASYNC_UPLOADS'] = 'false'
+
+    from azure.storage.blob import BlobServiceClient, ContentSettings
+    from services.blob_storage import BlobStorageService
+    from services.async_blob_storage import AsyncBlobStorage
+
+    storage = BlobStorageService()
+    storage.ensure_containers()
+    # The old client: library defaults, one connection per upload
+    sync_client = BlobServiceClient(account_url=storage.account_url, credential=storage.account_key)
+    block_size = args.block_size * 1024 * 1024
+    async_storage = AsyncBlobStorage(
+        storage.account_url, storage.account_key,
+        block_size=block_size, max_concurrency=args.concurrency, single_put_size=block_size
+    )
+
+    print(f"\n{'MB':>4} {'sync s':>8} {'sync MB/s':>10} {'async s':>8} {'async MB/s':>11} {'speed-up':>9}")
+    try:
+        for size_mb in (int(value) for value in args.sizes.split(',')):
+            data = os.urandom(size_mb * 1024 * 1024)
+            total_mb = size_mb * args.uploads
+
+            start = time.perf_counter()
+            for index in range(args.uploads):
+                sync_client.get_blob_client(container='audio', blob=f"bench_sync_{size_mb}_{index}.bin").upload_blob(
+                    data, overwrite=True, content_settings=ContentSettings(content_type='application/octet-stream')
+                )
+            sync_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            async_storage.upload_many([
+                ('audio', f"bench_async_{size_mb}_{index}.bin", data, 'application/octet-stream')
+                for index in range(args.uploads)
+            ])
+            async_seconds = time.perf_counter() - start
+
+            print(f"{size_mb:4} {sync_seconds:8.2f} {total_mb / sync_seconds:10.1f} {async_seconds:8.2f} "
+                  f"{total_mb / async_seconds:11.1f} {sync_seconds / async_seconds:8.1f}x")
+    finally:
+        async_storage.close()
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
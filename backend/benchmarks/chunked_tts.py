@@ -0,0 +1,68 @@
+"""
+Compare single-call narration with parallel chunked synthesis against the fake
+Azure Speech endpoint, for a few story lengths.
+
+    cd backend
+    python -m benchmarks.chunked_tts --lengths 1000,2500,5000 --repeat 3 --latency speech.char=fixed:0.002
+"""
+import os
+import time
+import random
+import argparse
+
+from fake_azure.server import FakeAzureServer, fake_azure_env, add_profile_arguments, profile_from_args
+
+
+def story_text(length, rng):
+    words = 'the little dragon flew over the quiet village and smiled at the stars'.split()
+    paragraphs = []
+    while sum(len(p) for p in paragraphs) < length:
+        sentences = [' '.join(rng.choice(words) for _ in range(12)).capitalize() + '.' for _ in range(4)]
+        paragraphs.append(' '.join(sentences))
+    return '\n\n'.join(paragraphs)[:length]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark chunked vs single-call text to speech")
+    parser.add_argument('--lengths', default='1000,2500,5000', help="comma separated text lengths in characters")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--chunk-chars', type=int, default=800)
+    parser.add_argument('--workers', type=int, default=4)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = FakeAzureServer(profile_from_args(args), quiet=True).start()
+    os.environ.update(fake_azure_env(fake.url))
+    os.environ['RATE_LIMIT_SPEECH_CPS'] = '10000000'
+
+    from services import mp3
+    from services.azure_services import AzureServices
+    from services.speech_chunks import synthesize_chunks
+
+    services = AzureServices()
+    rng = random.Random(args.seed)
+    print(f"\n{'chars':>6} {'chunks':>6} {'single s':>9} {'chunked s':>10} {'speed-up':>9} {'audio s':>8}")
+    try:
+        for length in (int(value) for value in args.lengths.split(',')):
+            text = story_text(length, rng)
+            single_times, chunked_times = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                services.synthesize_speech(text)
+                single_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                chunked, timings = synthesize_chunks(
+                    services.synthesize_speech, text, max_chars=args.chunk_chars, max_workers=args.workers
+                )
+                chunked_times.append(time.perf_counter() - start)
+            single_s = sorted(single_times)[len(single_times) // 2]
+            chunked_s = sorted(chunked_times)[len(chunked_times) // 2]
+            print(f"{length:>6} {len(timings):>6} {single_s:9.2f} {chunked_s:10.2f} "
+                  f"{single_s / chunked_s:8.1f}x {mp3.duration(chunked):8.1f}")
+    finally:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
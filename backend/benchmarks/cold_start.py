@@ -0,0 +1,92 @@
+"""
+Worker cold start: how long `create_app()` takes in a fresh process and how
+many blob storage requests it makes, with services built lazily (the default)
+and eagerly (SERVICES_EAGER_INIT, the old import-time behaviour), against the
+fake Azure server. "first use" is building the story and speech services and
+checking the containers afterwards, i.e. what the first request pays when lazy.
+
+    cd backend
+    python -m benchmarks.cold_start --runs 5 --latency blob=fixed:0.03
+
+Pass --backend-dir with an older checkout's backend/ to measure the code from
+before the service registry (it builds two AzureServices on import).
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+from fake_azure.server import FakeAzureServer, fake_azure_env, add_profile_arguments, profile_from_args
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import os, json, time, requests
+def blob_requests():
+    return requests.get(os.environ['FAKE_STATS_URL']).json()['requests'].get('blob', 0)
+before = blob_requests()
+start = time.perf_counter()
+from create_app import create_app
+app = create_app()
+boot = time.perf_counter() - start
+boot_requests = blob_requests() - before
+try:
+    from extensions import service_registry
+except ImportError:
+    service_registry = None
+start = time.perf_counter()
+if service_registry is not None:
+    service_registry.story_services
+    service_registry.speech_services
+    service_registry.azure.blob_storage.ensure_containers()
+print(json.dumps({
+    'boot': boot, 'firstUse': time.perf_counter() - start,
+    'bootRequests': boot_requests, 'firstUseRequests': blob_requests() - before - boot_requests
+}))
+"""
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def run(label, env, backend_dir, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=backend_dir, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        results.append(json.loads(output))
+    print(f"{label:>8} {median([r['boot'] for r in results]):9.3f} {median([r['bootRequests'] for r in results]):10} "
+          f"{median([r['firstUse'] for r in results]):12.3f} {median([r['firstUseRequests'] for r in results]):10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark worker cold start with lazy and eager services")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--backend-dir', default=BACKEND_DIR)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = FakeAzureServer(profile_from_args(args), quiet=True).start()
+    workdir = tempfile.mkdtemp(prefix='cold-start-')
+    env = {
+        **os.environ,
+        **fake_azure_env(fake.url),
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'stories.db')}",
+        'GENERATION_CACHE_PATH': os.path.join(workdir, 'cache.db'),
+        'PYTHONPATH': args.backend_dir,
+        'FAKE_STATS_URL': f"{fake.url}/_fake/stats"
+    }
+    print(f"\n{'':>8} {'boot s':>9} {'boot blob':>10} {'first use s':>12} {'first blob':>10}")
+    try:
+        run('lazy', {**env, 'SERVICES_EAGER_INIT': 'false'}, args.backend_dir, args.runs)
+        run('eager', {**env, 'SERVICES_EAGER_INIT': 'true'}, args.backend_dir, args.runs)
+    finally:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
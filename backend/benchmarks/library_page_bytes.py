@@ -0,0 +1,138 @@
+"""
+Bytes a browser downloads for one page of the story library (50 cards) when
+each card loads the original 1024x1024 PNG, the 256px thumbnail, or what
+`srcset` picks for the card's rendered width. Variants are rendered with the
+same process pool code the backend uses, so the render time is reported too.
+
+Needs Pillow. Without --images, illustration-like PNGs (gradients, shapes and
+a little grain, ~1-2 MB like DALL-E output) are generated; pass a directory
+of real illustrations for representative numbers.
+
+    cd backend
+    python -m benchmarks.library_page_bytes --stories 50 --card-width 320 --dpr 2
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+
+from services.image_variants import ImageVariants, IMAGE_FORMATS, Image
+
+DEFAULT_WIDTHS = [256, 512, 1024]
+
+
+def illustration(rng, size=1024):
+    """
+    A PNG with the broad shapes and soft shading of a generated illustration
+    """
+    from PIL import ImageDraw, ImageFilter
+
+    top = tuple(rng.randrange(40, 256) for _ in range(3))
+    bottom = tuple(rng.randrange(0, 200) for _ in range(3))
+    image = Image.linear_gradient('L').resize((size, size))
+    image = Image.merge('RGB', [
+        image.point(lambda y, a=a, b=b: a + (b - a) * y // 255) for a, b in zip(top, bottom)
+    ])
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randrange(12, 24)):
+        x, y, r = rng.randrange(size), rng.randrange(size), rng.randrange(20, size // 4)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(6))
+    grain = Image.effect_noise((size, size), 12).convert('RGB')
+    image = Image.blend(image, grain, 0.08)
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def load_images(args):
+    if args.images:
+        paths = sorted(
+            os.path.join(args.images, name) for name in os.listdir(args.images)
+            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
+        )
+        if not paths:
+            sys.exit(f"No images found in {args.images}")
+        images = [open(path, 'rb').read() for path in paths]
+    else:
+        rng = random.Random(args.seed)
+        images = [illustration(rng) for _ in range(min(args.stories, args.distinct))]
+    return [images[index % len(images)] for index in range(args.stories)]
+
+
+def srcset_choice(variants, needed_width):
+    """
+    The candidate a browser picks from a srcset: the smallest at least as wide
+    as the rendered width in device pixels, else the largest
+    """
+    ordered = sorted(variants, key=lambda variant: variant[0])
+    for variant in ordered:
+        if variant[0] >= needed_width:
+            return variant
+    return ordered[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark library page bytes with and without image variants")
+    parser.add_argument('--stories', type=int, default=50)
+    parser.add_argument('--distinct', type=int, default=10, help="distinct generated images, reused across cards")
+    parser.add_argument('--images', help="directory of illustrations to use instead of generated ones")
+    parser.add_argument('--widths', default=','.join(str(width) for width in DEFAULT_WIDTHS))
+    parser.add_argument('--formats', default='webp,avif')
+    parser.add_argument('--quality', type=int, default=75)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--card-width', type=int, default=320, help="rendered card width in CSS pixels")
+    parser.add_argument('--dpr', type=float, default=2.0, help="device pixel ratio")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if Image is None:
+        parser.error("Pillow is required (pip install Pillow)")
+    images = load_images(args)
+    variants = ImageVariants(
+        [int(width) for width in args.widths.split(',')],
+        [name.strip() for name in args.formats.split(',') if name.strip()],
+        quality=args.quality,
+        workers=args.workers
+    )
+    if not variants.enabled:
+        parser.error("None of the requested formats can be encoded by this Pillow build")
+
+    try:
+        # Each distinct image is rendered once; repeated cards reuse its variants
+        rendered = {}
+        start = time.perf_counter()
+        for data in images:
+            if id(data) not in rendered:
+                rendered[id(data)] = variants.render(data)
+        render_seconds = time.perf_counter() - start
+    finally:
+        variants.close()
+
+    needed = round(args.card_width * args.dpr)
+    smallest = variants.widths[0]
+    totals = {'original PNG': sum(len(data) for data in images)}
+    for name in variants.formats:
+        totals[f"{name} {smallest}px thumbnail"] = 0
+        totals[f"{name} srcset ({needed}px)"] = 0
+    for data in images:
+        by_format = {}
+        for width, _, name, encoded in rendered[id(data)]:
+            by_format.setdefault(name, []).append((width, encoded))
+        for name, candidates in by_format.items():
+            totals[f"{name} {smallest}px thumbnail"] += len(min(candidates)[1])
+            totals[f"{name} srcset ({needed}px)"] += len(srcset_choice(candidates, needed)[1])
+
+    original = totals['original PNG']
+    print(f"\n{args.stories} cards, {len(rendered)} distinct images, rendered in {render_seconds:.2f}s "
+          f"({args.workers} worker processes)")
+    print(f"\n{'':>26} {'page KB':>9} {'per card KB':>12} {'vs PNG':>8}")
+    for label, total in totals.items():
+        print(f"{label:>26} {total / 1024:9.0f} {total / 1024 / args.stories:12.1f} {total / original:8.1%}")
+    print(f"\nContent types: {', '.join(IMAGE_FORMATS[name]['content_type'] for name in variants.formats)}")
+
+
+if __name__ == '__main__':
+    main()
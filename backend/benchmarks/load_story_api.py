@@ -0,0 +1,237 @@
+"""
+End-to-end load benchmark for the story API against the local fake Azure server.
+
+For each worker configuration (gunicorn workers x threads) this starts the
+backend with a fresh SQLite database, drives POST and GET /api/stories at a
+fixed arrival rate (open loop, so a slow server can't slow down the load) and
+reports p50/p95/p99 latency and throughput per request type.
+
+    cd backend
+    python -m benchmarks.load_story_api --configs 1x4,2x4,4x4 --rps 4 --duration 60 \\
+        --latency gpt=lognormal:4,0.35 --latency dalle=lognormal:8,0.3 --throttle-rate dalle=0.05
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fake_azure.server import FakeAzureServer, fake_azure_env, add_profile_arguments, profile_from_args
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+THEMES = ['Space Adventure', 'Underwater Kingdom', 'Enchanted Forest', 'Dinosaur Island', 'Friendly Robots']
+CHARACTERS = ['a brave astronaut', 'a curious octopus', 'a tiny dragon', 'a helpful robot', 'a sleepy bear']
+AGE_GROUPS = ['3-5', '6-8', '9-12']
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def parse_configs(spec):
+    configs = []
+    for item in spec.split(','):
+        workers, _, threads = item.strip().partition('x')
+        configs.append((int(workers), int(threads or 1)))
+    return configs
+
+
+def backend_env(fake_url, workdir, args):
+    env = dict(os.environ)
+    env.update(fake_azure_env(fake_url))
+    env.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'stories.db')}",
+        'GENERATION_CACHE_PATH': os.path.join(workdir, 'generation_cache.db'),
+        'GENERATION_CACHE_ENABLED': 'true' if args.cache else 'false',
+        'PYTHONUNBUFFERED': '1'
+    })
+    if args.no_client_limits:
+        # Measure the app and the fake upstreams, not our own client-side quotas
+        env.update({
+            'RATE_LIMIT_GPT_RPM': '100000',
+            'RATE_LIMIT_GPT_TPM': '100000000',
+            'RATE_LIMIT_DALLE_IPM': '100000',
+            'RATE_LIMIT_SPEECH_CPS': '10000000'
+        })
+    return env
+
+
+def create_schema(env):
+    subprocess.run(
+        [sys.executable, '-c', 'from create_app import create_app\n'
+                               'from extensions import db\n'
+                               'app = create_app()\n'
+                               'app.app_context().push()\n'
+                               'db.create_all()'],
+        cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def start_backend(workers, threads, port, env, log):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+         '-b', f"127.0.0.1:{port}", '--timeout', '300', 'app:app'],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with status {process.returncode}, see {log.name}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/stories", timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"Backend did not start within 60s, see {log.name}")
+
+
+def run_load(base_url, rps, duration, post_ratio, max_in_flight, seed):
+    rng = random.Random(seed)
+    local = threading.local()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def send(kind, body):
+        start = time.perf_counter()
+        try:
+            if kind == 'POST':
+                response = session().post(f"{base_url}/api/stories", json=body, timeout=300)
+            else:
+                response = session().get(f"{base_url}/api/stories", timeout=300)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        with samples_lock:
+            samples.append((kind, status, time.perf_counter() - start))
+
+    total = int(rps * duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for i in range(total):
+            # Open loop: request i goes out at i / rps regardless of how earlier ones are doing
+            delay = started + i / rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if rng.random() < post_ratio:
+                body = {
+                    'theme': rng.choice(THEMES),
+                    'characters': rng.sample(CHARACTERS, 2),
+                    'age_group': rng.choice(AGE_GROUPS)
+                }
+                pool.submit(send, 'POST', body)
+            else:
+                pool.submit(send, 'GET', None)
+    elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def summarize(samples, elapsed):
+    rows = {}
+    for kind in ('POST', 'GET'):
+        latencies = [latency for k, status, latency in samples if k == kind and 200 <= status < 300]
+        failures = sum(1 for k, status, _ in samples if k == kind and not 200 <= status < 300)
+        rows[kind] = {
+            'sent': sum(1 for k, _, _ in samples if k == kind),
+            'ok': len(latencies),
+            'failed': failures,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'throughput': len(latencies) / elapsed if elapsed else 0.0
+        }
+    return rows
+
+
+def print_report(results):
+    def seconds(value):
+        return f"{value:8.3f}" if value is not None else f"{'-':>8}"
+
+    print(f"\n{'config':>8} {'type':>5} {'sent':>6} {'ok':>6} {'failed':>6} "
+          f"{'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'ok/s':>7}")
+    for result in results:
+        for kind, row in result['requests'].items():
+            print(f"{result['config']:>8} {kind:>5} {row['sent']:>6} {row['ok']:>6} {row['failed']:>6} "
+                  f"{seconds(row['p50'])} {seconds(row['p95'])} {seconds(row['p99'])} {row['throughput']:7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the story API against the fake Azure server")
+    parser.add_argument('--configs', default='1x4,2x4', help="comma separated gunicorn WORKERSxTHREADS")
+    parser.add_argument('--rps', type=float, default=2.0, help="target arrival rate (requests per second)")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds of load per configuration")
+    parser.add_argument('--post-ratio', type=float, default=0.3, help="fraction of requests that create a story")
+    parser.add_argument('--max-in-flight', type=int, default=256)
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--fake-url', help="use an already running fake Azure server")
+    parser.add_argument('--cache', action='store_true', help="leave the generation cache enabled")
+    parser.add_argument('--no-client-limits', action='store_true', help="raise the client-side rate limits out of the way")
+    parser.add_argument('--json', help="also write the results to this file")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = None
+    fake_url = args.fake_url
+    if not fake_url:
+        fake = FakeAzureServer(profile_from_args(args), quiet=True).start()
+        fake_url = fake.url
+    print(f"Fake Azure at {fake_url}", file=sys.stderr)
+
+    results = []
+    try:
+        for workers, threads in parse_configs(args.configs):
+            config = f"{workers}x{threads}"
+            with tempfile.TemporaryDirectory(prefix='story-bench-') as workdir:
+                env = backend_env(fake_url, workdir, args)
+                create_schema(env)
+                with open(os.path.join(tempfile.gettempdir(), f"story-bench-{config}.log"), 'w') as log:
+                    backend = start_backend(workers, threads, args.port, env, log)
+                    try:
+                        print(f"[{config}] {args.rps:g} rps for {args.duration:g}s", file=sys.stderr)
+                        samples, elapsed = run_load(
+                            f"http://127.0.0.1:{args.port}", args.rps, args.duration,
+                            args.post_ratio, args.max_in_flight, args.seed
+                        )
+                    finally:
+                        backend.terminate()
+                        backend.wait(timeout=30)
+            results.append({
+                'config': config,
+                'workers': workers,
+                'threads': threads,
+                'rps': args.rps,
+                'elapsed': elapsed,
+                'requests': summarize(samples, elapsed)
+            })
+    finally:
+        if fake is not None:
+            upstream = requests.get(f"{fake_url}/_fake/stats").json()
+            print(f"\nFake Azure requests: {upstream['requests']} throttled: {upstream['throttled']} "
+                  f"errors: {upstream['errors']}", file=sys.stderr)
+            fake.stop()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
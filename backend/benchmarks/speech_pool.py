@@ -0,0 +1,82 @@
+"""
+Measure the per-request overhead of the Speech SDK path with a synthesizer
+built for every call (the old behaviour) and with the pooled, pre-connected
+synthesizers. Needs real AZURE_SPEECH_KEY / AZURE_SPEECH_REGION credentials:
+the SDK talks to Speech over a websocket that the fake Azure server does not
+implement. Short texts are used so that connection setup dominates.
+
+    cd backend
+    python -m benchmarks.speech_pool --requests 20 --concurrency 4
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+
+from services.speech_pool import SynthesizerPool
+
+OUTPUT_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3
+
+
+def per_call(voice, text):
+    config = speechsdk.SpeechConfig(subscription=os.getenv("AZURE_SPEECH_KEY"), region=os.getenv("AZURE_SPEECH_REGION"))
+    config.speech_synthesis_voice_name = voice
+    config.set_speech_synthesis_output_format(OUTPUT_FORMAT)
+    synthesizer = speechsdk.SpeechSynthesizer(speech_config=config, audio_config=None)
+    return synthesizer.speak_text_async(text).get()
+
+
+def pooled(pool, voice, text):
+    with pool.synthesizer(voice, OUTPUT_FORMAT) as entry:
+        return entry.synthesizer.speak_text_async(text).get()
+
+
+def run(label, synthesize, requests, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        result = synthesize()
+        if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+            raise RuntimeError(f"Speech synthesis failed: {result.reason}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        times = sorted(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>9} {times[len(times) // 2] * 1000:8.0f} {times[int(len(times) * 0.95) - 1] * 1000:8.0f} "
+          f"{times[-1] * 1000:8.0f} {requests / elapsed:8.1f}")
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-call vs pooled Speech synthesizers")
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--voice', default=None, help="defaults to AZURE_SPEECH_VOICE")
+    parser.add_argument('--text', default="Once upon a time, a little dragon learned to fly.")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if not os.getenv("AZURE_SPEECH_KEY") or not os.getenv("AZURE_SPEECH_REGION"):
+        parser.error("AZURE_SPEECH_KEY and AZURE_SPEECH_REGION must be set")
+    voice = args.voice or os.getenv("AZURE_SPEECH_VOICE", "en-US-JennyNeural")
+
+    pool = SynthesizerPool(
+        os.getenv("AZURE_SPEECH_KEY"), os.getenv("AZURE_SPEECH_REGION"), max_idle=args.concurrency
+    )
+    # Pre-connect as the app does at startup, so the pooled run measures steady state
+    pool.warm(voice, OUTPUT_FORMAT, args.concurrency)
+
+    print(f"\n{'':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'req/s':>8}")
+    per_call_times = run('per-call', lambda: per_call(voice, args.text), args.requests, args.concurrency)
+    pooled_times = run('pooled', lambda: pooled(pool, voice, args.text), args.requests, args.concurrency)
+    saved = per_call_times[len(per_call_times) // 2] - pooled_times[len(pooled_times) // 2]
+    print(f"\nPer-request overhead saved (p50): {saved * 1000:.0f} ms")
+    print(f"Pool: {pool.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Storage overhead on its own: upload, read back, sign and delete the same
+blobs with the local filesystem backend and the Azure backend (against the
+fake blob endpoint, with no added latency unless --latency says so), so the
+numbers are the cost of the storage code path rather than of a network.
+
+    cd backend
+    python -m benchmarks.storage_backends --sizes 0.01,1,5 --blobs 50
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from fake_azure.server import FakeAzureServer, FakeAzureProfile, fake_azure_env, add_profile_arguments, profile_from_args
+
+
+def measure(storage, data, blobs, label):
+    names = [f"bench_{label}_{index}.bin" for index in range(blobs)]
+    timings = {}
+
+    start = time.perf_counter()
+    for name in names:
+        storage.upload_blob('audio', name, data, 'application/octet-stream')
+    timings['upload'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name in names:
+        for _ in storage.stream_blob('audio', name):
+            pass
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name in names:
+        storage.signed_url('audio', name)
+    timings['sign'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name in names:
+        storage.delete_blob('audio', name)
+    timings['delete'] = time.perf_counter() - start
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the local and Azure storage backends")
+    parser.add_argument('--sizes', default='0.01,1,5', help="comma separated blob sizes in MB")
+    parser.add_argument('--blobs', type=int, default=50, help="blobs per size")
+    parser.add_argument('--root', help="directory for the local backend (a temporary one by default)")
+    parser.add_argument('--no-fsync', action='store_true', help="don't fsync local writes")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    profile = profile_from_args(args) if args.latency else FakeAzureProfile.instant()
+    fake = FakeAzureServer(profile, quiet=True).start()
+    os.environ.update(fake_azure_env(fake.url))
+
+    from services.blob_storage import BlobStorageService
+    from services.local_storage import LocalStorageBackend
+
+    backends = {
+        'local': LocalStorageBackend(
+            args.root or tempfile.mkdtemp(prefix='storage-bench-'), 'http://localhost:5000/api/storage',
+            'benchmark', fsync=not args.no_fsync
+        ),
+        'azure': BlobStorageService()
+    }
+    for storage in backends.values():
+        storage.ensure_containers()
+
+    print(f"\n{'MB':>6} {'backend':>8} {'upload ms':>10} {'read ms':>8} {'read MB/s':>10} {'sign us':>8} {'delete ms':>10}")
+    try:
+        for size in (float(value) for value in args.sizes.split(',')):
+            data = os.urandom(int(size * 1024 * 1024))
+            for label, storage in backends.items():
+                timings = measure(storage, data, args.blobs, label)
+                print(f"{size:6g} {label:>8} {timings['upload'] / args.blobs * 1000:10.2f} "
+                      f"{timings['read'] / args.blobs * 1000:8.2f} {size * args.blobs / timings['read']:10.0f} "
+                      f"{timings['sign'] / args.blobs * 1e6:8.1f} {timings['delete'] / args.blobs * 1000:10.2f}")
+    finally:
+        if backends['azure'].async_storage is not None:
+            backends['azure'].async_storage.close()
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,7 @@ class Config:
     # Azure Speech configuration
     AZURE_SPEECH_KEY = os.getenv("AZURE_SPEECH_KEY")
     AZURE_SPEECH_REGION = os.getenv("AZURE_SPEECH_REGION")
+    AZURE_SPEECH_VOICE = os.getenv("AZURE_SPEECH_VOICE", "en-US-JennyNeural")
 
     # Azure Blob Storage configuration
     AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
@@ -28,5 +29,159 @@ class Config:
     AZURE_STORAGE_ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
     AZURE_STORAGE_ACCOUNT_KEY = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
 
+    # Story creation pipeline: run independent GPT/DALL-E/TTS/upload stages in parallel
+    STORY_PIPELINE_CONCURRENT = os.getenv("STORY_PIPELINE_CONCURRENT", "true").lower() == "true"
+    STORY_PIPELINE_MAX_WORKERS = int(os.getenv("STORY_PIPELINE_MAX_WORKERS", "4"))
+
+    # Background story jobs: POST /api/stories returns 202 and a job id when
+    # STORY_ASYNC_JOBS is on or the client sends "Prefer: respond-async"
+    STORY_ASYNC_JOBS = os.getenv("STORY_ASYNC_JOBS", "false").lower() == "true"
+    STORY_JOB_WORKERS = int(os.getenv("STORY_JOB_WORKERS", "2"))
+    STORY_JOB_POLL_INTERVAL = float(os.getenv("STORY_JOB_POLL_INTERVAL", "1.0"))
+    STORY_JOB_STALE_SECONDS = int(os.getenv("STORY_JOB_STALE_SECONDS", "900"))
+    # How often idle workers look for jobs whose worker died (stale heartbeat)
+    STORY_JOB_STALE_CHECK_SECONDS = float(os.getenv("STORY_JOB_STALE_CHECK_SECONDS", "60"))
+    STORY_JOB_MAX_ATTEMPTS = int(os.getenv("STORY_JOB_MAX_ATTEMPTS", "3"))
+
+    # Generation cache: reuse GPT/DALL-E results for equivalent requests.
+    # SQLite so that all gunicorn workers on the host share it
+    GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "true").lower() == "true"
+    GENERATION_CACHE_PATH = os.getenv(
+        "GENERATION_CACHE_PATH", str(Path(__file__).parent.parent / "instance" / "generation_cache.db")
+    )
+    GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1000"))
+    GENERATION_CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # Warm pool of pre-generated stories for preset requests, e.g.
+    # [{"theme": "Space Adventure", "age_group": "3-5", "characters": ["a brave astronaut"]}]
+    WARM_POOL_BUCKETS = os.getenv("WARM_POOL_BUCKETS", "[]")
+    WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "3"))
+
+    # Batch generation (POST /api/stories/batch)
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+    BATCH_MAX_CONCURRENT_ITEMS = int(os.getenv("BATCH_MAX_CONCURRENT_ITEMS", "8"))
+    BATCH_GPT_CONCURRENCY = int(os.getenv("BATCH_GPT_CONCURRENCY", "4"))
+    BATCH_DALLE_CONCURRENCY = int(os.getenv("BATCH_DALLE_CONCURRENCY", "2"))
+    BATCH_SPEECH_CONCURRENCY = int(os.getenv("BATCH_SPEECH_CONCURRENCY", "4"))
+    BATCH_COMMIT_SIZE = int(os.getenv("BATCH_COMMIT_SIZE", "10"))
+    BATCH_COMMIT_INTERVAL = float(os.getenv("BATCH_COMMIT_INTERVAL", "2.0"))
+
+    # Client-side rate limits for the Azure upstreams, shared by all threads in a worker.
+    # Size these to your deployment quota divided by the number of worker processes
+    RATE_LIMIT_GPT_RPM = int(os.getenv("RATE_LIMIT_GPT_RPM", "60"))
+    RATE_LIMIT_GPT_TPM = int(os.getenv("RATE_LIMIT_GPT_TPM", "60000"))
+    RATE_LIMIT_DALLE_IPM = int(os.getenv("RATE_LIMIT_DALLE_IPM", "6"))
+    RATE_LIMIT_SPEECH_CPS = int(os.getenv("RATE_LIMIT_SPEECH_CPS", "2000"))
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+    RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "120"))
+
+    # GPT deployment routing (JSON list of {name, endpoint, api_key, deployment, api_version, weight})
+    AZURE_OPENAI_DEPLOYMENTS = os.getenv("AZURE_OPENAI_DEPLOYMENTS", "")
+    GPT_HEDGE_REQUESTS = os.getenv("GPT_HEDGE_REQUESTS", "false").lower() == "true"
+    GPT_HEDGE_DEFAULT_DELAY = float(os.getenv("GPT_HEDGE_DEFAULT_DELAY", "8"))
+    GPT_BREAKER_FAILURES = int(os.getenv("GPT_BREAKER_FAILURES", "5"))
+    GPT_BREAKER_OPEN_SECONDS = float(os.getenv("GPT_BREAKER_OPEN_SECONDS", "30"))
+    GPT_BREAKER_SLOW_SECONDS = float(os.getenv("GPT_BREAKER_SLOW_SECONDS", "60"))
+
+    # Keep-alive HTTP connection pools per upstream (connections per worker process)
+    HTTP_POOL_GPT = int(os.getenv("HTTP_POOL_GPT", "20"))
+    HTTP_POOL_DALLE = int(os.getenv("HTTP_POOL_DALLE", "10"))
+    HTTP_POOL_IMAGES = int(os.getenv("HTTP_POOL_IMAGES", "10"))
+    HTTP_POOL_SPEECH = int(os.getenv("HTTP_POOL_SPEECH", "20"))
+    HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+    # Blob uploads: larger blobs are split into blocks, max_concurrency of them in flight.
+    # The async backend runs all uploads on one aio event loop per process
+    BLOB_ASYNC_UPLOADS = os.getenv("BLOB_ASYNC_UPLOADS", "true").lower() == "true"
+    BLOB_BLOCK_SIZE = int(os.getenv("BLOB_BLOCK_SIZE", str(4 * 1024 * 1024)))
+    BLOB_SINGLE_PUT_SIZE = int(os.getenv("BLOB_SINGLE_PUT_SIZE", str(4 * 1024 * 1024)))
+    BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))
+
+    # Where blobs are stored: 'azure' (Blob Storage, AZURE_STORAGE_CONNECTION_STRING) or
+    # 'local' (files under STORAGE_LOCAL_ROOT, served signed from STORAGE_LOCAL_URL)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure").lower()
+    STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", str(Path(__file__).parent.parent / "instance" / "storage"))
+    STORAGE_LOCAL_URL = os.getenv("STORAGE_LOCAL_URL", "http://localhost:5000/api/storage")
+    STORAGE_LOCAL_FSYNC = os.getenv("STORAGE_LOCAL_FSYNC", "true").lower() == "true"
+    # Key for the local URLs' HMAC signatures; SECRET_KEY when unset
+    STORAGE_URL_SECRET = os.getenv("STORAGE_URL_SECRET")
+    STORAGE_URL_TTL_SECONDS = int(os.getenv("STORAGE_URL_TTL_SECONDS", str(365 * 24 * 3600)))
+
+    # Name blobs saved from bytes by the SHA-256 of their content and skip uploading
+    # ones that already exist; story rows keep reference counts (blob_ref table)
+    BLOB_CONTENT_ADDRESSING = os.getenv("BLOB_CONTENT_ADDRESSING", "true").lower() == "true"
+
+    # Delete the media of deleted stories once nothing references it (batched, in a background
+    # job), and optionally sweep the containers for older unreferenced blobs every few seconds.
+    # Blobs younger than the grace period are never swept: their story may not be committed yet
+    GC_ON_DELETE = os.getenv("GC_ON_DELETE", "true").lower() == "true"
+    GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "256"))
+    GC_PAGE_SIZE = int(os.getenv("GC_PAGE_SIZE", "1000"))
+    GC_GRACE_SECONDS = int(os.getenv("GC_GRACE_SECONDS", str(24 * 3600)))
+    # Deleting a story frees its unshared blobs at once, unless touched this recently by a
+    # pipeline still generating another story; keep it above a pipeline's run time
+    GC_PENDING_SECONDS = int(os.getenv("GC_PENDING_SECONDS", "900"))
+    GC_SWEEP_INTERVAL_SECONDS = int(os.getenv("GC_SWEEP_INTERVAL_SECONDS", str(6 * 3600)))
+    GC_DRY_RUN = os.getenv("GC_DRY_RUN", "false").lower() == "true"
+
+    # Check (and create) the blob containers before the first upload in each worker.
+    # Can be turned off once `flask warm-services` has run at deploy time
+    BLOB_VERIFY_CONTAINERS = os.getenv("BLOB_VERIFY_CONTAINERS", "true").lower() == "true"
+    # Build all Azure services in create_app instead of on first use (the old behaviour)
+    SERVICES_EAGER_INIT = os.getenv("SERVICES_EAGER_INIT", "false").lower() == "true"
+
+    # Generated images are piped from DALL-E into blob storage in blocks of this size
+    IMAGE_STREAM_BLOCK_SIZE = int(os.getenv("IMAGE_STREAM_BLOCK_SIZE", str(1024 * 1024)))
+
+    # Images per DALL-E request (DALL-E 3 only accepts 1, DALL-E 2 up to 10) and how many
+    # candidates a user may ask for when regenerating an illustration
+    DALLE_IMAGES_PER_CALL = int(os.getenv("DALLE_IMAGES_PER_CALL", "1"))
+    ILLUSTRATION_MAX_CANDIDATES = int(os.getenv("ILLUSTRATION_MAX_CANDIDATES", "4"))
+
+    # Thumbnails and WebP/AVIF copies of each stored illustration, rendered in a process pool
+    IMAGE_VARIANTS_ENABLED = os.getenv("IMAGE_VARIANTS_ENABLED", "true").lower() == "true"
+    IMAGE_VARIANT_WIDTHS = [
+        int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "256,512,1024").split(",") if width.strip()
+    ]
+    IMAGE_VARIANT_FORMATS = [
+        name.strip() for name in os.getenv("IMAGE_VARIANT_FORMATS", "webp,avif").split(",") if name.strip()
+    ]
+    IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "75"))
+    IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+
+    # Narration: long texts are synthesized as parallel chunks joined frame by frame
+    SPEECH_CHUNKED = os.getenv("SPEECH_CHUNKED", "true").lower() == "true"
+    SPEECH_CHUNK_CHARS = int(os.getenv("SPEECH_CHUNK_CHARS", "800"))
+    SPEECH_CHUNK_WORKERS = int(os.getenv("SPEECH_CHUNK_WORKERS", "4"))
+    SPEECH_CHUNK_ATTEMPTS = int(os.getenv("SPEECH_CHUNK_ATTEMPTS", "3"))
+
+    # Voices a request may ask for; each gets its own pool of pre-connected Speech synthesizers
+    SPEECH_VOICES = [
+        voice.strip()
+        for voice in os.getenv("SPEECH_VOICES", f"{AZURE_SPEECH_VOICE},en-US-GuyNeural,en-US-AriaNeural,en-GB-SoniaNeural").split(",")
+        if voice.strip()
+    ]
+    # Narration formats clients may negotiate (Accept header or `format`); MP3 is always allowed
+    SPEECH_AUDIO_FORMATS = [
+        name.strip() for name in os.getenv("SPEECH_AUDIO_FORMATS", "mp3,ogg-opus,webm-opus").split(",") if name.strip()
+    ]
+    SPEECH_POOL_MAX_IDLE = int(os.getenv("SPEECH_POOL_MAX_IDLE", "4"))
+    SPEECH_POOL_IDLE_SECONDS = float(os.getenv("SPEECH_POOL_IDLE_SECONDS", "300"))
+    SPEECH_POOL_MAX_USES = int(os.getenv("SPEECH_POOL_MAX_USES", "500"))
+    SPEECH_POOL_WARM = int(os.getenv("SPEECH_POOL_WARM", "1"))
+
+    # Narration already in blob storage, keyed on hash(text, voice, format)
+    AUDIO_CACHE_ENABLED = os.getenv("AUDIO_CACHE_ENABLED", "true").lower() == "true"
+    AUDIO_CACHE_PATH = os.getenv("AUDIO_CACHE_PATH", GENERATION_CACHE_PATH)
+    AUDIO_CACHE_MAX_ENTRIES = int(os.getenv("AUDIO_CACHE_MAX_ENTRIES", "5000"))
+    # Must stay below the one-year expiry of the stored SAS URLs
+    AUDIO_CACHE_TTL_SECONDS = int(os.getenv("AUDIO_CACHE_TTL_SECONDS", str(180 * 24 * 3600)))
+
     # Security
-    SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
\ No newline at end of file
+    SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
+    # Bearer token for GET /api/metrics; the endpoint is off while unset
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
\ No newline at end of file
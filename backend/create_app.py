@@ -1,10 +1,11 @@
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
 from config.config import Config
 
-from extensions import db, migrate
+from extensions import db, migrate, job_queue, warm_pool, service_registry, blob_collector
 
 def create_app():
     app = Flask(__name__)
@@ -18,11 +19,70 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    # Azure services are built on first use, so importing the routes does no network I/O
+    service_registry.init_app(app)
     
     # Import and register blueprints
-    from routes import story_routes, auth_routes, speech_routes
+    from routes import story_routes, auth_routes, speech_routes, job_routes, metrics_routes, storage_routes
     app.register_blueprint(story_routes.bp, url_prefix='/api')
     app.register_blueprint(auth_routes.bp, url_prefix='/api')
     app.register_blueprint(speech_routes.bp, url_prefix='/api')
+    app.register_blueprint(job_routes.bp, url_prefix='/api')
+    app.register_blueprint(metrics_routes.bp, url_prefix='/api')
+    app.register_blueprint(storage_routes.bp, url_prefix='/api')
+
+    # Background story generation jobs share the story routes' Azure services
+    job_queue.init_app(app, services_factory=lambda: service_registry.story_services)
+    warm_pool.init_app(app, job_queue)
+    blob_collector.init_app(app, job_queue, service_registry)
+
+    @app.cli.command('invalidate-audio-cache')
+    @click.option('--voice', help="Only forget narration in this voice")
+    @click.option('--all', 'everything', is_flag=True, help="Forget all stored narration")
+    def invalidate_audio_cache(voice, everything):
+        """
+        Forget stored narration so it is synthesized again. By default drops
+        every voice not in AZURE_SPEECH_VOICE/SPEECH_VOICES, e.g. after changing them.
+        """
+        cache = service_registry.audio_cache
+        if cache is None:
+            click.echo("Audio cache is disabled")
+            return
+        if everything:
+            removed = cache.invalidate()
+        elif voice:
+            removed = cache.invalidate(voice=voice)
+        else:
+            removed = cache.invalidate(keep_voices=[Config.AZURE_SPEECH_VOICE, *Config.SPEECH_VOICES])
+        click.echo(f"Removed {removed} audio cache entries")
+
+    @app.cli.command('warm-services')
+    def warm_services():
+        """
+        Build the Azure services and check (or create) the blob containers.
+        Run at deploy time; workers can then skip the check (BLOB_VERIFY_CONTAINERS=false).
+        """
+        for name, seconds in service_registry.warm().items():
+            click.echo(f"{name:>16} {seconds:6.2f}s")
+
+    @app.cli.command('gc-blobs')
+    @click.option('--dry-run', is_flag=True, help="Only report what would be deleted")
+    @click.option('--grace-hours', type=float, help="Keep blobs younger than this (default GC_GRACE_SECONDS)")
+    def gc_blobs(dry_run, grace_hours):
+        """
+        Delete stored media no story references any more. Safe to run from cron;
+        blobs younger than the grace period are kept for in-flight pipelines.
+        """
+        result = blob_collector.sweep(
+            grace_seconds=None if grace_hours is None else int(grace_hours * 3600),
+            dry_run=dry_run or None
+        )
+        click.echo(f"Listed {result['listed']} blobs, {result['candidates']} unreferenced")
+        if result['dryRun']:
+            click.echo(f"Would delete {result['wouldDelete']} blobs ({result['wouldFreeBytes']} bytes)")
+        else:
+            click.echo(f"Deleted {result['deleted']} blobs ({result['bytesFreed']} bytes) in {result['batches']} batches, "
+                       f"{result['missing']} already gone, {result['recentlyUsed']} recently used, "
+                       f"{result['failed']} failed")
     
     return app
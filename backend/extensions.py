@@ -1,5 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from services.job_queue import StoryJobQueue
+from services.warm_pool import WarmPool
+from services.registry import ServiceRegistry
+from services.blob_gc import BlobCollector
 
 db = SQLAlchemy()
 migrate = Migrate()
+job_queue = StoryJobQueue()
+warm_pool = WarmPool()
+service_registry = ServiceRegistry()
+blob_collector = BlobCollector()
@@ -0,0 +1,4 @@
+from .profile import FakeAzureProfile, LatencyModel
+from .server import create_fake_azure, fake_azure_env, FakeAzureServer
+
+__all__ = ['FakeAzureProfile', 'LatencyModel', 'create_fake_azure', 'fake_azure_env', 'FakeAzureServer']
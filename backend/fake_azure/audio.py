@@ -0,0 +1,119 @@
+"""
+Silent Ogg/Opus and WebM/Opus files for the fake Speech endpoint, at about the
+bitrate Azure produces, so narration sizes and durations compare realistically
+with the MP3 output.
+"""
+import struct
+
+OPUS_FRAME_SECONDS = 0.02
+# TOC byte for a 20 ms mono CELT frame (code 3: frame count byte follows)
+_OPUS_TOC = 0xF8 | 0x03
+
+
+def opus_packet(size=40):
+    """
+    One 20 ms silent Opus packet padded to `size` bytes (40 bytes is 16 kbps)
+    """
+    padding = size - 5
+    return bytes([_OPUS_TOC, 0x41, padding, 0xFF, 0xFE]) + bytes(padding)
+
+
+def _opus_head(pre_skip=312):
+    return b'OpusHead' + struct.pack('<BBHIhB', 1, 1, pre_skip, 48000, 0, 0)
+
+
+# -- Ogg ---------------------------------------------------------------------
+
+def _ogg_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_OGG_CRC = _ogg_crc_table()
+
+
+def _ogg_crc(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC[((crc >> 24) & 0xFF) ^ byte]
+    return crc
+
+
+def _ogg_page(packets, granule, sequence, header_type=0, serial=0x5354):
+    lacing = bytearray()
+    for packet in packets:
+        lacing += b'\xff' * (len(packet) // 255) + bytes([len(packet) % 255])
+    header = struct.pack('<4sBBqIII', b'OggS', 0, header_type, granule, serial, sequence, 0) + bytes([len(lacing)]) + lacing
+    page = bytearray(header + b''.join(packets))
+    page[22:26] = struct.pack('<I', _ogg_crc(page))
+    return bytes(page)
+
+
+def silent_ogg_opus(seconds, packets_per_page=50):
+    pre_skip = 312
+    frames = max(1, int(seconds / OPUS_FRAME_SECONDS))
+    packet = opus_packet()
+    pages = [
+        _ogg_page([_opus_head(pre_skip)], 0, 0, header_type=0x02),
+        _ogg_page([b'OpusTags' + struct.pack('<I', 4) + b'fake' + struct.pack('<I', 0)], 0, 1)
+    ]
+    written = 0
+    while written < frames:
+        count = min(packets_per_page, frames - written)
+        written += count
+        last = written == frames
+        pages.append(_ogg_page(
+            [packet] * count, pre_skip + written * 960, len(pages), header_type=0x04 if last else 0
+        ))
+    return b''.join(pages)
+
+
+# -- WebM --------------------------------------------------------------------
+
+def _ebml_size(size):
+    length = 1
+    while size >= (1 << (7 * length)) - 1:
+        length += 1
+    return ((1 << (7 * length)) | size).to_bytes(length, 'big')
+
+
+def _element(element_id, body):
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+    return id_bytes + _ebml_size(len(body)) + body
+
+
+def _uint(element_id, value):
+    return _element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big'))
+
+
+def silent_webm_opus(seconds, frames_per_cluster=50):
+    """
+    A live-style WebM (unknown segment size, no Duration), like the Speech service streams
+    """
+    frames = max(1, int(seconds / OPUS_FRAME_SECONDS))
+    packet = opus_packet()
+    header = _element(0x1A45DFA3, b''.join([
+        _uint(0x4286, 1), _uint(0x42F7, 1), _uint(0x42F2, 4), _uint(0x42F3, 8),
+        _element(0x4282, b'webm'), _uint(0x4287, 4), _uint(0x4285, 2)
+    ]))
+    info = _element(0x1549A966, _uint(0x2AD7B1, 1000000) + _element(0x4D80, b'fake_azure'))
+    tracks = _element(0x1654AE6B, _element(0xAE, b''.join([
+        _uint(0xD7, 1), _uint(0x73C5, 1), _uint(0x83, 2), _element(0x86, b'A_OPUS'),
+        _element(0x63A2, _opus_head()),
+        _element(0xE1, _element(0xB5, struct.pack('>f', 48000.0)) + _uint(0x9F, 1))
+    ])))
+    clusters = []
+    for first in range(0, frames, frames_per_cluster):
+        cluster_ms = first * 20
+        blocks = [
+            _element(0xA3, b'\x81' + struct.pack('>hB', (index - first) * 20, 0x80) + packet)
+            for index in range(first, min(frames, first + frames_per_cluster))
+        ]
+        clusters.append(_element(0x1F43B675, _uint(0xE7, cluster_ms) + b''.join(blocks)))
+    # Segment of unknown size: the Speech service writes WebM as it synthesizes
+    return header + bytes.fromhex('18538067') + b'\x01\xff\xff\xff\xff\xff\xff\xff' + info + tracks + b''.join(clusters)
@@ -0,0 +1,121 @@
+"""
+A small threaded WSGI server that keeps HTTP/1.1 connections open between
+requests. Werkzeug's development server answers every request with
+`Connection: close`, which would hide exactly what the keep-alive pools in
+services.http_clients are there to save (a TCP connect per call), so the
+fake Azure server runs on this one instead.
+
+Responses with a Content-Length are written as they are; responses without
+one (GPT token streams, streamed speech) use chunked encoding and are
+flushed chunk by chunk, so streaming latency is unchanged.
+"""
+import io
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_to_bytes
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections are dropped after this many seconds
+    timeout = 30
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip trailers up to the blank line
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _environ(self, body):
+        path, _, query = self.path.partition('?')
+        environ = {
+            'REQUEST_METHOD': self.command,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.server.server_address[0],
+            'SERVER_PORT': str(self.server.server_address[1]),
+            'SERVER_PROTOCOL': self.request_version,
+            'REMOTE_ADDR': self.client_address[0],
+            'CONTENT_TYPE': self.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False
+        }
+        for name, value in self.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH', 'HTTP_TRANSFER_ENCODING'):
+                continue
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _run_app(self):
+        environ = self._environ(self._read_body())
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+
+        result = self.server.app(environ, start_response)
+        try:
+            code, _, reason = response['status'].partition(' ')
+            code = int(code)
+            names = {name.lower() for name, _ in response['headers']}
+            head = self.command == 'HEAD' or code in (204, 304) or code < 200
+            chunked = not head and 'content-length' not in names
+            self.send_response(code, reason)
+            for name, value in response['headers']:
+                if name.lower() != 'connection':
+                    self.send_header(name, value)
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for data in result:
+                if head or not data:
+                    continue
+                self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data) if chunked else data)
+                self.wfile.flush()
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = _run_app
+
+
+class KeepAliveWSGIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host, port, app, quiet=False):
+        super().__init__((host, port), KeepAliveHandler)
+        self.app = app
+        self.quiet = quiet
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
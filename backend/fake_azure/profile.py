@@ -0,0 +1,121 @@
+import math
+import random
+
+
+class LatencyModel:
+    """
+    A latency distribution in seconds, parsed from specs like:
+
+        fixed:0.5
+        uniform:0.2,1.5
+        normal:2.0,0.5          (mean, standard deviation)
+        lognormal:2.0,0.4       (median, sigma of the underlying normal)
+    """
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, kind='fixed', params=(0.0,)):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}' (expected one of {', '.join(self.KINDS)})")
+        self.kind = kind
+        self.params = tuple(float(p) for p in params)
+
+    @classmethod
+    def parse(cls, spec):
+        kind, _, params = spec.partition(':')
+        return cls(kind.strip(), [p for p in params.split(',') if p.strip()] or (0.0,))
+
+    def sample(self, rng=random):
+        if self.kind == 'fixed':
+            value = self.params[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(self.params[0], self.params[1])
+        elif self.kind == 'normal':
+            value = rng.gauss(self.params[0], self.params[1])
+        else:
+            value = rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        return max(0.0, value)
+
+    def __repr__(self):
+        return f"{self.kind}:{','.join(f'{p:g}' for p in self.params)}"
+
+
+# Rough shapes of the real services, so an unconfigured fake still behaves like Azure
+DEFAULT_LATENCY = {
+    'gpt': 'lognormal:4.0,0.35',
+    'gpt.token': 'fixed:0.01',
+    'dalle': 'lognormal:8.0,0.3',
+    'speech': 'lognormal:0.5,0.3',
+    'speech.char': 'fixed:0.001',
+    'blob': 'lognormal:0.05,0.5',
+    'blob.mb': 'fixed:0.0'
+}
+
+
+class FakeAzureProfile:
+    """
+    Per-upstream behaviour of the fake Azure server: a latency distribution,
+    the fraction of requests that fail with 500 and the fraction throttled
+    with 429 + Retry-After. Upstreams are gpt, dalle, speech and blob; GPT
+    latency can also be set per deployment as 'gpt.<deployment>', 'gpt.token'
+    is the delay between streamed tokens, 'speech.char' the synthesis time
+    per character of text and 'blob.mb' the time to receive each MB of an
+    uploaded blob or block (one connection's bandwidth, off by default).
+    """
+    def __init__(self, latency=None, error_rate=None, throttle_rate=None, retry_after=1.0, seed=None):
+        self.latency = {name: LatencyModel.parse(spec) for name, spec in DEFAULT_LATENCY.items()}
+        for name, model in (latency or {}).items():
+            self.latency[name] = model if isinstance(model, LatencyModel) else LatencyModel.parse(model)
+        self.error_rate = dict(error_rate or {})
+        self.throttle_rate = dict(throttle_rate or {})
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def instant(cls):
+        """
+        No latency and no failures, for functional tests
+        """
+        return cls(latency={name: 'fixed:0' for name in DEFAULT_LATENCY})
+
+    @classmethod
+    def from_specs(cls, latency=(), error_rate=(), throttle_rate=(), **kwargs):
+        """
+        Build a profile from CLI-style 'upstream=value' strings
+        """
+        def pairs(specs, convert):
+            result = {}
+            for spec in specs:
+                name, _, value = spec.partition('=')
+                result[name.strip()] = convert(value.strip())
+            return result
+
+        return cls(
+            latency=pairs(latency, LatencyModel.parse),
+            error_rate=pairs(error_rate, float),
+            throttle_rate=pairs(throttle_rate, float),
+            **kwargs
+        )
+
+    def sample_latency(self, upstream, deployment=None):
+        model = self.latency.get(f"{upstream}.{deployment}") or self.latency.get(upstream)
+        return model.sample(self.rng) if model else 0.0
+
+    def outcome(self, upstream):
+        """
+        'ok', 'error' or 'throttled' for the next request to an upstream
+        """
+        roll = self.rng.random()
+        throttle = self.throttle_rate.get(upstream, 0.0)
+        if roll < throttle:
+            return 'throttled'
+        if roll < throttle + self.error_rate.get(upstream, 0.0):
+            return 'error'
+        return 'ok'
+
+    def describe(self):
+        return {
+            'latency': {name: repr(model) for name, model in self.latency.items()},
+            'errorRate': self.error_rate,
+            'throttleRate': self.throttle_rate,
+            'retryAfter': self.retry_after
+        }
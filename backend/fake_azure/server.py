@@ -0,0 +1,625 @@
+"""
+A local stand-in for the parts of Azure that AzureServices and BlobStorageService
+use: Azure OpenAI chat completions (including streaming) and image generation,
+the Speech text-to-speech REST API (MP3, Ogg/Opus and WebM/Opus), and Blob
+Storage (containers, single-shot and block uploads, downloads, listing and
+deletes). Responses are shaped like the real services closely enough for the
+openai and azure-storage-blob SDKs, with latency and failures drawn from a
+FakeAzureProfile.
+
+    python -m fake_azure.server --port 7070 --latency gpt=lognormal:3,0.4 --throttle-rate dalle=0.05
+"""
+import re
+import sys
+import json
+import time
+import uuid
+import zlib
+import random
+import struct
+import base64
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import unquote
+
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+from fake_azure.audio import silent_ogg_opus, silent_webm_opus
+from fake_azure.keepalive import KeepAliveWSGIServer
+from fake_azure.profile import FakeAzureProfile
+
+# Azurite's well-known development account, accepted by the storage SDK
+ACCOUNT_NAME = 'devstoreaccount1'
+ACCOUNT_KEY = 'Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=='
+
+
+WORDS = (
+    'brave little curious friendly bright gentle happy tiny giant sparkling '
+    'forest river castle moon star garden ocean mountain cloud rainbow '
+    'laughed danced explored discovered shared wondered helped whispered'
+).split()
+
+# One silent MPEG-2 Layer III frame: 16 kHz mono at 32 kbps is 144 bytes and 36 ms
+MP3_FRAME = bytes([0xFF, 0xF3, 0x48, 0xC0]) + bytes(140)
+MP3_FRAME_SECONDS = 576 / 16000
+
+
+def silent_mp3(seconds):
+    return MP3_FRAME * max(1, int(seconds / MP3_FRAME_SECONDS))
+
+
+_fake_png = None
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def fake_png(size=1024, tag=None):
+    """
+    A noisy RGB PNG about as large as a real DALL-E 1024x1024 image (~3 MB).
+    With a `tag` (the generated image's id) a text chunk makes the bytes
+    differ between generations, as real ones would, without re-encoding.
+    """
+    global _fake_png
+    if _fake_png is None:
+        rng = random.Random(size)
+        rows = b''.join(b'\x00' + rng.randbytes(size * 3) for _ in range(size))
+        _fake_png = (
+            b'\x89PNG\r\n\x1a\n'
+            + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+            + _png_chunk(b'IDAT', zlib.compress(rows, 1))
+            + _png_chunk(b'IEND', b'')
+        )
+    if tag is None:
+        return _fake_png
+    iend = len(_fake_png) - 12
+    return _fake_png[:iend] + _png_chunk(b'tEXt', b'Comment\x00' + tag.encode('ascii')) + _fake_png[iend:]
+
+
+def http_date(when=None):
+    return format_datetime(when or datetime.now(timezone.utc), usegmt=True)
+
+
+class FakeBlobStore:
+    """
+    In-memory containers and blobs, including uncommitted blocks
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.containers = {}
+
+    def container(self, name):
+        return self.containers.get(name)
+
+    def create_container(self, name):
+        with self.lock:
+            if name in self.containers:
+                return False
+            self.containers[name] = {'public_access': None, 'blobs': {}, 'blocks': {}, 'created': datetime.now(timezone.utc)}
+            return True
+
+    def put_blob(self, container, name, data, content_type):
+        blob = {
+            'data': data,
+            'content_type': content_type or 'application/octet-stream',
+            'etag': f'"0x{uuid.uuid4().hex[:16].upper()}"',
+            'last_modified': datetime.now(timezone.utc),
+            'md5': base64.b64encode(hashlib.md5(data).digest()).decode()
+        }
+        with self.lock:
+            container['blobs'][name] = blob
+            container['blocks'].pop(name, None)
+        return blob
+
+    def touch(self, container, name):
+        """
+        Set Blob Metadata: a new ETag and Last-Modified for the same content, or None if there is no such blob
+        """
+        with self.lock:
+            blob = container['blobs'].get(name)
+            if blob is not None:
+                blob['etag'] = f'"0x{uuid.uuid4().hex[:16].upper()}"'
+                blob['last_modified'] = datetime.now(timezone.utc)
+            return blob
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {
+                    'blobs': len(c['blobs']),
+                    'bytes': sum(len(b['data']) for b in c['blobs'].values())
+                }
+                for name, c in self.containers.items()
+            }
+
+
+def create_fake_azure(profile=None):
+    profile = profile or FakeAzureProfile()
+    app = Flask(__name__)
+    app.config['FAKE_AZURE_PROFILE'] = profile
+    store = app.config['FAKE_AZURE_BLOBS'] = FakeBlobStore()
+    counters = {'requests': {}, 'errors': {}, 'throttled': {}, 'uploadedBytes': {}}
+    counters_lock = threading.Lock()
+
+    def count(kind, upstream, amount=1):
+        with counters_lock:
+            counters[kind][upstream] = counters[kind].get(upstream, 0) + amount
+
+    def simulate(upstream, deployment=None, error_body=None):
+        """
+        Sleep for the sampled latency and return an error response if this request should fail
+        """
+        count('requests', upstream)
+        time.sleep(profile.sample_latency(upstream, deployment))
+        outcome = profile.outcome(upstream)
+        if outcome == 'ok':
+            return None
+        if outcome == 'throttled':
+            count('throttled', upstream)
+            status, message = 429, 'Rate limit exceeded (simulated)'
+        else:
+            count('errors', upstream)
+            status, message = 500, 'Internal server error (simulated)'
+        if error_body:
+            response = error_body(status, message)
+        else:
+            response = jsonify({'error': {'code': str(status), 'message': message}})
+            response.status_code = status
+        if status == 429:
+            response.headers['Retry-After'] = f"{profile.retry_after:g}"
+            response.headers['retry-after-ms'] = str(int(profile.retry_after * 1000))
+        return response
+
+    # -- Azure OpenAI -------------------------------------------------------
+
+    def story_text(messages, max_tokens):
+        prompt = messages[-1]['content'] if messages else ''
+        theme = re.search(r'theme: ([^.]+)\.', prompt)
+        theme = theme.group(1).strip() if theme else 'Magical'
+        words = [profile.rng.choice(WORDS) for _ in range(max(20, int(max_tokens * 0.6)))]
+        sentences = [' '.join(words[i:i + 12]).capitalize() + '.' for i in range(0, len(words), 12)]
+        paragraphs = [' '.join(sentences[i:i + 4]) for i in range(0, len(sentences), 4)]
+        return f"**The {theme} Adventure**\n\nOnce upon a time. " + '\n\n'.join(paragraphs)
+
+    @app.route('/openai/deployments/<deployment>/chat/completions', methods=['POST'])
+    def chat_completions(deployment):
+        body = request.get_json(force=True)
+        stream = bool(body.get('stream'))
+        # For streams the sampled latency is time to first token; the rest trickles out
+        failure = simulate('gpt', deployment)
+        if failure is not None:
+            return failure
+        content = story_text(body.get('messages', []), body.get('max_tokens') or 600)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+        completion_tokens = len(content) // 4
+
+        if not stream:
+            return jsonify({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': deployment,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens
+                }
+            })
+
+        token_delay = profile.sample_latency('gpt.token', deployment)
+
+        def chunks():
+            def chunk(delta, finish_reason=None):
+                return 'data: ' + json.dumps({
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': created,
+                    'model': deployment,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+                }) + '\n\n'
+
+            yield chunk({'role': 'assistant', 'content': ''})
+            for piece in re.findall(r'\S+\s*', content):
+                time.sleep(token_delay)
+                yield chunk({'content': piece})
+            yield chunk({}, 'stop')
+            yield 'data: [DONE]\n\n'
+
+        return Response(stream_with_context(chunks()), mimetype='text/event-stream')
+
+    @app.route('/openai/deployments/<deployment>/images/generations', methods=['POST'])
+    def image_generations(deployment):
+        body = request.get_json(force=True)
+        failure = simulate('dalle', deployment)
+        if failure is not None:
+            return failure
+        return jsonify({
+            'created': int(time.time()),
+            'data': [
+                {
+                    'url': f"{request.host_url}fake-images/{uuid.uuid4().hex}.png",
+                    'revised_prompt': body.get('prompt', '')
+                }
+                for _ in range(int(body.get('n') or 1))
+            ]
+        })
+
+    @app.route('/fake-images/<name>', methods=['GET'])
+    def fake_image(name):
+        # Generated images are served from the "DALL-E CDN" with blob-like latency
+        failure = simulate('blob')
+        if failure is not None:
+            return failure
+        return Response(fake_png(tag=name), mimetype='image/png')
+
+    # -- Speech -------------------------------------------------------------
+
+    @app.route('/cognitiveservices/v1', methods=['POST'])
+    def synthesize():
+        ssml = request.get_data(as_text=True)
+        text = re.sub(r'<[^>]+>', '', ssml)
+        failure = simulate('speech')
+        if failure is not None:
+            return failure
+        output_format = request.headers.get('X-Microsoft-OutputFormat', 'audio-16khz-32kbitrate-mono-mp3')
+        if output_format.endswith('mp3'):
+            encode, mimetype = silent_mp3, 'audio/mpeg'
+        elif output_format.startswith('ogg-') and output_format.endswith('opus'):
+            encode, mimetype = silent_ogg_opus, 'audio/ogg'
+        elif output_format.startswith('webm-') and output_format.endswith('opus'):
+            encode, mimetype = silent_webm_opus, 'audio/webm'
+        else:
+            return jsonify({'error': {'code': '400', 'message': f"Unsupported output format {output_format}"}}), 400
+        # About 15 characters of narration per second, streamed out as it is "synthesized"
+        audio = encode(len(text) / 15.0)
+        pieces = 20
+        piece_size = max(1, -(-len(audio) // pieces // len(MP3_FRAME)) * len(MP3_FRAME))
+        piece_delay = len(text) * profile.sample_latency('speech.char') / pieces
+
+        def stream():
+            for offset in range(0, len(audio), piece_size):
+                time.sleep(piece_delay)
+                yield audio[offset:offset + piece_size]
+
+        return Response(stream(), mimetype=mimetype)
+
+    # -- Blob Storage -------------------------------------------------------
+
+    def blob_error(status, code, message=None):
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<Error><Code>{code}</Code><Message>{escape(message or code)}</Message></Error>'
+        )
+        return Response(body, status=status, mimetype='application/xml', headers={'x-ms-error-code': code})
+
+    def storage_failure(status, message):
+        code = 'ServerBusy' if status == 429 else 'InternalError'
+        # Storage reports throttling as 503 Server Busy
+        return blob_error(503 if status == 429 else status, code, message)
+
+    @app.after_request
+    def storage_headers(response):
+        response.headers.setdefault('x-ms-request-id', str(uuid.uuid4()))
+        response.headers.setdefault('x-ms-version', '2023-11-03')
+        response.headers.setdefault('Date', http_date())
+        return response
+
+    def blob_headers(blob):
+        return {
+            'ETag': blob['etag'],
+            'Last-Modified': http_date(blob['last_modified']),
+            'Content-Type': blob['content_type'],
+            'Content-MD5': blob['md5'],
+            'x-ms-blob-type': 'BlockBlob',
+            'x-ms-server-encrypted': 'true',
+            'Accept-Ranges': 'bytes'
+        }
+
+    @app.route('/<account>/<container_name>', methods=['GET', 'PUT', 'DELETE', 'HEAD', 'POST'])
+    def container_op(account, container_name):
+        failure = simulate('blob', error_body=storage_failure)
+        if failure is not None:
+            return failure
+        args = request.args
+        if args.get('restype') != 'container':
+            return blob_error(400, 'InvalidQueryParameterValue')
+        container = store.container(container_name)
+        comp = args.get('comp')
+
+        if request.method == 'PUT' and comp is None:
+            if not store.create_container(container_name):
+                return blob_error(409, 'ContainerAlreadyExists')
+            return Response(status=201, headers={'ETag': f'"0x{uuid.uuid4().hex[:16].upper()}"', 'Last-Modified': http_date()})
+        if container is None:
+            return blob_error(404, 'ContainerNotFound')
+        if request.method == 'DELETE':
+            with store.lock:
+                store.containers.pop(container_name, None)
+            return Response(status=202)
+        if comp == 'acl':
+            if request.method == 'PUT':
+                container['public_access'] = request.headers.get('x-ms-blob-public-access')
+                return Response(status=200, headers={'ETag': '"0x1"', 'Last-Modified': http_date()})
+            headers = {'ETag': '"0x1"', 'Last-Modified': http_date(container['created'])}
+            if container['public_access']:
+                headers['x-ms-blob-public-access'] = container['public_access']
+            body = '<?xml version="1.0" encoding="utf-8"?><SignedIdentifiers />'
+            return Response(body, mimetype='application/xml', headers=headers)
+        if comp == 'list':
+            return list_blobs(account, container_name, container)
+        if comp == 'batch' and request.method == 'POST':
+            return blob_batch(container)
+        # Container properties (used by ContainerClient.exists)
+        return Response(status=200, headers={
+            'ETag': '"0x1"',
+            'Last-Modified': http_date(container['created']),
+            'x-ms-has-immutability-policy': 'false',
+            'x-ms-has-legal-hold': 'false'
+        })
+
+    def blob_batch(container):
+        """
+        Blob Batch: a multipart/mixed body of up to 256 Delete Blob sub-requests,
+        answered with one sub-response each
+        """
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            return blob_error(400, 'InvalidInput')
+        parts = [
+            part for part in request.get_data(as_text=True).split(f'--{boundary}')
+            if part.strip() and part.strip() != '--'
+        ]
+        if len(parts) > 256:
+            return blob_error(400, 'ExceedsMaxBatchRequestCount')
+        response_boundary = f'batchresponse_{uuid.uuid4()}'
+        responses = []
+        for index, part in enumerate(parts):
+            content_id = re.search(r'Content-ID:\s*(\S+)', part)
+            request_line = re.search(r'^(\w+) (\S+) HTTP/1\.1', part, re.MULTILINE)
+            if request_line is None or request_line.group(1) != 'DELETE':
+                status, code = '400 Bad Request', 'InvalidInput'
+            else:
+                blob_name = unquote(request_line.group(2).split('?', 1)[0].rsplit('/', 1)[-1])
+                condition = re.search(r'^If-Unmodified-Since:\s*(.+?)\s*$', part, re.MULTILINE | re.IGNORECASE)
+                unmodified_since = parsedate_to_datetime(condition.group(1)) if condition else None
+                with store.lock:
+                    blob = container['blobs'].get(blob_name)
+                    # Last-Modified only has whole seconds, and so does the comparison
+                    modified = (blob is not None and unmodified_since is not None
+                                and blob['last_modified'].replace(microsecond=0) > unmodified_since)
+                    if not modified:
+                        container['blobs'].pop(blob_name, None)
+                        container['blocks'].pop(blob_name, None)
+                if modified:
+                    status, code = '412 The condition specified is not met.', 'ConditionNotMet'
+                elif blob is not None:
+                    status, code = '202 Accepted', None
+                else:
+                    status, code = '404 The specified blob does not exist.', 'BlobNotFound'
+            responses.append(
+                f'--{response_boundary}\r\n'
+                'Content-Type: application/http\r\n'
+                f'Content-ID: {content_id.group(1) if content_id else index}\r\n\r\n'
+                f'HTTP/1.1 {status}\r\n'
+                + (f'x-ms-error-code: {code}\r\n' if code else 'x-ms-delete-type-permanent: true\r\n')
+                + f'x-ms-request-id: {uuid.uuid4()}\r\n'
+                'x-ms-version: 2023-08-03\r\n'
+                'Content-Length: 0\r\n\r\n'
+            )
+        body = ''.join(responses) + f'--{response_boundary}--\r\n'
+        return Response(body, status=202, content_type=f'multipart/mixed; boundary={response_boundary}')
+
+    def list_blobs(account, container_name, container):
+        prefix = request.args.get('prefix', '')
+        marker = request.args.get('marker', '')
+        max_results = int(request.args.get('maxresults', 5000))
+        with store.lock:
+            names = sorted(n for n in container['blobs'] if n.startswith(prefix) and n >= marker)
+        page, rest = names[:max_results], names[max_results:]
+        items = []
+        for name in page:
+            blob = container['blobs'].get(name)
+            if blob is None:
+                continue
+            items.append(
+                f'<Blob><Name>{escape(name)}</Name><Properties>'
+                f'<Creation-Time>{http_date(blob["last_modified"])}</Creation-Time>'
+                f'<Last-Modified>{http_date(blob["last_modified"])}</Last-Modified>'
+                f'<Etag>{blob["etag"]}</Etag>'
+                f'<Content-Length>{len(blob["data"])}</Content-Length>'
+                f'<Content-Type>{blob["content_type"]}</Content-Type>'
+                f'<Content-MD5>{blob["md5"]}</Content-MD5>'
+                '<BlobType>BlockBlob</BlobType><AccessTier>Hot</AccessTier>'
+                '<LeaseStatus>unlocked</LeaseStatus><LeaseState>available</LeaseState>'
+                '<ServerEncrypted>true</ServerEncrypted>'
+                '</Properties></Blob>'
+            )
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<EnumerationResults ServiceEndpoint="{escape(request.host_url + account)}/" ContainerName="{escape(container_name)}">'
+            f'<Prefix>{escape(prefix)}</Prefix><Marker>{escape(marker)}</Marker><MaxResults>{max_results}</MaxResults>'
+            f'<Blobs>{"".join(items)}</Blobs>'
+            f'<NextMarker>{escape(rest[0]) if rest else ""}</NextMarker>'
+            '</EnumerationResults>'
+        )
+        return Response(body, mimetype='application/xml')
+
+    @app.route('/<account>/<container_name>/<path:blob_name>', methods=['GET', 'PUT', 'DELETE', 'HEAD'])
+    def blob_op(account, container_name, blob_name):
+        failure = simulate('blob', error_body=storage_failure)
+        if failure is not None:
+            return failure
+        container = store.container(container_name)
+        if container is None:
+            return blob_error(404, 'ContainerNotFound')
+        comp = request.args.get('comp')
+
+        if request.method == 'PUT' and comp == 'metadata':
+            blob = store.touch(container, blob_name)
+            if blob is None:
+                return blob_error(404, 'BlobNotFound')
+            return Response(status=200, headers={'ETag': blob['etag'], 'Last-Modified': http_date(blob['last_modified'])})
+        if request.method == 'PUT':
+            # Each connection uploads at 1 / blob.mb MB/s; parallel blocks use several
+            time.sleep((request.content_length or 0) / (1024 * 1024) * profile.sample_latency('blob.mb'))
+            if comp != 'blocklist':
+                count('uploadedBytes', container_name, request.content_length or 0)
+            if comp == 'block':
+                block_id = request.args['blockid']
+                with store.lock:
+                    container['blocks'].setdefault(blob_name, {})[block_id] = request.get_data()
+                return Response(status=201)
+            if comp == 'blocklist':
+                ids = re.findall(r'<(?:Latest|Uncommitted|Committed)>([^<]*)</', request.get_data(as_text=True))
+                staged = container['blocks'].get(blob_name, {})
+                missing = [block_id for block_id in ids if block_id not in staged]
+                if missing:
+                    return blob_error(400, 'InvalidBlockList')
+                data = b''.join(staged[block_id] for block_id in ids)
+                blob = store.put_blob(container, blob_name, data, request.headers.get('x-ms-blob-content-type'))
+                return Response(status=201, headers={'ETag': blob['etag'], 'Last-Modified': http_date(blob['last_modified'])})
+            content_type = request.headers.get('x-ms-blob-content-type') or request.headers.get('Content-Type')
+            blob = store.put_blob(container, blob_name, request.get_data(), content_type)
+            return Response(status=201, headers={
+                'ETag': blob['etag'],
+                'Last-Modified': http_date(blob['last_modified']),
+                'Content-MD5': blob['md5'],
+                'x-ms-request-server-encrypted': 'true'
+            })
+
+        blob = container['blobs'].get(blob_name)
+        if blob is None:
+            return blob_error(404, 'BlobNotFound')
+        if request.method == 'DELETE':
+            with store.lock:
+                container['blobs'].pop(blob_name, None)
+            return Response(status=202, headers={'x-ms-delete-type-permanent': 'true'})
+
+        headers = blob_headers(blob)
+        data = blob['data']
+        requested = request.headers.get('x-ms-range') or request.headers.get('Range')
+        if request.method == 'HEAD':
+            headers['Content-Length'] = str(len(data))
+            return Response(status=200, headers=headers)
+        if requested:
+            if not data:
+                return blob_error(416, 'InvalidRange')
+            start, _, end = requested.replace('bytes=', '').partition('-')
+            start = int(start)
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+            return Response(data[start:end + 1], status=206, headers=headers)
+        return Response(data, status=200, headers=headers)
+
+    @app.route('/_fake/stats', methods=['GET'])
+    def fake_stats():
+        with counters_lock:
+            snapshot = json.loads(json.dumps(counters))
+        return jsonify({**snapshot, 'blobs': store.stats(), 'profile': profile.describe()})
+
+    return app
+
+
+def fake_azure_env(base_url):
+    """
+    Environment variables that point AzureServices and BlobStorageService at a fake server
+    """
+    base_url = base_url.rstrip('/')
+    return {
+        'AZURE_OPENAI_ENDPOINT': base_url,
+        'AZURE_OPENAI_API_KEY': 'fake-openai-key',
+        'AZURE_OPENAI_DEPLOYMENT_NAME': 'gpt-fake',
+        'AZURE_OPENAI_API_VERSION': '2024-02-01',
+        'AZURE_DALLE_ENDPOINT': base_url,
+        'AZURE_DALLE_API_KEY': 'fake-dalle-key',
+        'AZURE_DALLE_DEPLOYMENT_NAME': 'dalle-fake',
+        'AZURE_DALLE_API_VERSION': '2024-02-01',
+        'AZURE_SPEECH_KEY': 'fake-speech-key',
+        'AZURE_SPEECH_REGION': 'local',
+        'AZURE_SPEECH_ENDPOINT': base_url,
+        'AZURE_STORAGE_CONNECTION_STRING': (
+            f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT_NAME};AccountKey={ACCOUNT_KEY};"
+            f"BlobEndpoint={base_url}/{ACCOUNT_NAME};"
+        )
+    }
+
+
+class FakeAzureServer:
+    """
+    Runs the fake server on a background thread, e.g. inside a benchmark
+    """
+    def __init__(self, profile=None, host='127.0.0.1', port=0, quiet=False):
+        self.app = create_fake_azure(profile)
+        # Keeps connections open like the real endpoints, so connection reuse can be measured
+        self.server = KeepAliveWSGIServer(host, port, self.app, quiet=quiet)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='fake-azure')
+
+    @property
+    def url(self):
+        return f"http://{self.server.host}:{self.server.port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--latency', action='append', default=[], metavar='UPSTREAM=DIST',
+                        help="e.g. gpt=lognormal:4,0.35, gpt.gpt-fake-2=fixed:10, dalle=uniform:5,12, blob=fixed:0.02")
+    parser.add_argument('--error-rate', action='append', default=[], metavar='UPSTREAM=RATE',
+                        help="fraction of requests failing with 500, e.g. speech=0.02")
+    parser.add_argument('--throttle-rate', action='append', default=[], metavar='UPSTREAM=RATE',
+                        help="fraction of requests throttled with 429/503 and Retry-After, e.g. dalle=0.1")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds sent with throttled responses")
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def profile_from_args(args):
+    return FakeAzureProfile.from_specs(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local fake Azure OpenAI, Speech and Blob Storage server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7070)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = FakeAzureServer(profile_from_args(args), args.host, args.port)
+    print(f"Fake Azure listening on {server.url}", file=sys.stderr)
+    print("Point the backend at it with:", file=sys.stderr)
+    for name, value in fake_azure_env(server.url).items():
+        print(f"  export {name}='{value}'", file=sys.stderr)
+    server.server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
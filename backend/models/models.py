@@ -1,5 +1,10 @@
+import json
 from datetime import datetime
+from sqlalchemy import event, inspect, case, select, update, insert
+from config.config import Config
 from extensions import db
+from services.image_variants import variant_fields, dump_variants
+from services.storage_backend import blob_from_url
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -23,5 +28,222 @@ class Story(db.Model):
     age_group = db.Column(db.String(20), nullable=False)
     is_favorite = db.Column(db.Boolean, default=False)
     image_url = db.Column(db.String(500), nullable=True)  # URL for the AI-generated illustration
+    image_variants = db.Column(db.Text, nullable=True)  # JSON list of thumbnails and WebP/AVIF copies
     audio_url = db.Column(db.String(500), nullable=True)  # URL for the AI-generated audio
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    content_url = db.Column(db.String(500), nullable=True)  # URL of the story text in blob storage
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    def to_dict(self):
+        try:
+            characters = json.loads(self.characters) if self.characters else []
+        except ValueError:
+            characters = []
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': self.content,
+            'theme': self.theme,
+            'characters': characters,
+            'ageGroup': self.age_group,
+            'isFavorite': self.is_favorite,
+            'imageUrl': self.image_url,
+            **self.image_fields(),
+            'audioUrl': self.audio_url,
+            'createdAt': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def image_fields(self):
+        """
+        thumbnailUrl, srcset and imageSources for the illustration's smaller copies
+        """
+        return variant_fields(self.image_variants)
+
+    def set_illustration(self, image_url, variants=None):
+        """
+        Point the story at a new illustration. Both columns change in the same
+        UPDATE, so readers never see the new image with the old variants.
+        """
+        self.image_url = image_url
+        self.image_variants = dump_variants(variants)
+
+class StoryJob(db.Model):
+    """
+    A queued background generation job. Jobs live in the database so they
+    survive a worker restart and can be polled from any gunicorn worker.
+    """
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(30), nullable=False, default='story')
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, succeeded, failed
+    payload = db.Column(db.Text, nullable=False)  # Store as JSON string
+    stages = db.Column(db.Text, nullable=True)  # JSON: {stage: {status, seconds, error}}
+    result = db.Column(db.Text, nullable=True)  # JSON result for jobs that don't produce a story
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    story_id = db.Column(db.Integer, db.ForeignKey('story.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    story = db.relationship('Story')
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stages': json.loads(self.stages) if self.stages else {},
+            'error': self.error,
+            'attempts': self.attempts,
+            'storyId': self.story_id,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.result:
+            data['result'] = json.loads(self.result)
+        if self.story is not None:
+            data['story'] = self.story.to_dict()
+        return data
+
+class WarmStory(db.Model):
+    """
+    A pre-generated story waiting in the warm pool for a matching request
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.String(64), nullable=False, index=True)  # hash of theme, age group and characters
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    theme = db.Column(db.String(50), nullable=False)
+    characters = db.Column(db.String(500), nullable=False)  # Store as JSON string
+    age_group = db.Column(db.String(20), nullable=False)
+    image_url = db.Column(db.String(500), nullable=True)
+    image_variants = db.Column(db.Text, nullable=True)
+    audio_url = db.Column(db.String(500), nullable=True)
+    content_url = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class BlobRef(db.Model):
+    """
+    How many stories and pooled warm stories point at a blob. Content-addressed
+    blobs are shared between stories, so a blob is only unused once its count
+    is back to zero. Counts are kept by the before_flush listener below from
+    the rows' URL columns, so routes and jobs never touch this table.
+    """
+    __tablename__ = 'blob_ref'
+    container = db.Column(db.String(63), primary_key=True)
+    name = db.Column(db.String(255), primary_key=True)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @classmethod
+    def stats(cls):
+        blobs, references, unreferenced = db.session.query(
+            db.func.count(), db.func.coalesce(db.func.sum(cls.refcount), 0),
+            db.func.count(case((cls.refcount == 0, 1)))
+        ).one()
+        return {'blobs': blobs, 'references': references, 'unreferenced': unreferenced}
+
+    @classmethod
+    def adjust(cls, session, deltas):
+        """
+        Add {(container, name): delta} to the counts (never below zero), creating missing rows
+        """
+        table = cls.__table__
+        now = datetime.utcnow()
+        dialect = session.connection().dialect.name
+        for (container, name), delta in deltas.items():
+            if not delta:
+                continue
+            refcount = case((table.c.refcount + delta < 0, 0), else_=table.c.refcount + delta)
+            values = {'container': container, 'name': name, 'refcount': max(delta, 0), 'created_at': now, 'updated_at': now}
+            if dialect in ('sqlite', 'postgresql'):
+                # A single upsert, so two workers sharing a new blob can't both insert it
+                if dialect == 'sqlite':
+                    from sqlalchemy.dialects.sqlite import insert as upsert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert as upsert
+                session.execute(upsert(table).values(**values).on_conflict_do_update(
+                    index_elements=['container', 'name'], set_={'refcount': refcount, 'updated_at': now}
+                ))
+            elif not session.execute(
+                update(table).where(table.c.container == container, table.c.name == name)
+                .values(refcount=refcount, updated_at=now)
+            ).rowcount:
+                session.execute(insert(table).values(**values))
+
+
+BLOB_URL_COLUMNS = ('image_url', 'audio_url', 'content_url')
+
+_BLOB_CONTAINERS = {
+    Config.AZURE_STORAGE_CONTAINER_STORIES, Config.AZURE_STORAGE_CONTAINER_AUDIO, Config.AZURE_STORAGE_CONTAINER_IMAGES
+}
+
+
+def referenced_blobs(image_url=None, audio_url=None, content_url=None, image_variants=None):
+    """
+    (container, name) of every stored blob a story's columns point at. URLs
+    outside our containers, like the placeholder image, are left out.
+    """
+    urls = [image_url, audio_url, content_url]
+    if image_variants:
+        try:
+            urls.extend(variant.get('url') for variant in json.loads(image_variants))
+        except (ValueError, TypeError, AttributeError):
+            pass
+    blobs = (blob_from_url(url) for url in urls)
+    return [blob for blob in blobs if blob is not None and blob[0] in _BLOB_CONTAINERS]
+
+
+def row_blobs(row):
+    return referenced_blobs(**{column: getattr(row, column) for column in (*BLOB_URL_COLUMNS, 'image_variants')})
+
+
+def _previous_blobs(session, row):
+    """
+    The blobs a row pointed at before this flush, or None if its blob columns
+    are unchanged. Read from the database, as the ORM does not keep the old
+    value of a column that was expired (e.g. by a commit) before being set.
+    """
+    columns = (*BLOB_URL_COLUMNS, 'image_variants')
+    state = inspect(row)
+    if not any(state.attrs[column].history.has_changes() for column in columns):
+        return None
+    table = row.__table__
+    previous = session.execute(
+        select(*(table.c[column] for column in columns)).where(table.c.id == row.id)
+    ).first()
+    return referenced_blobs(**previous._asdict()) if previous is not None else []
+
+
+def release_blob_refs(session, row):
+    """
+    Drop a row's references when it is removed with a bulk DELETE, which the listener below never sees
+    """
+    deltas = {}
+    for blob in row_blobs(row):
+        deltas[blob] = deltas.get(blob, 0) - 1
+    BlobRef.adjust(session, deltas)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _count_blob_refs(session, flush_context, instances):
+    deltas = {}
+
+    def count(blobs, delta):
+        for blob in blobs:
+            deltas[blob] = deltas.get(blob, 0) + delta
+
+    for row in session.new:
+        if isinstance(row, (Story, WarmStory)):
+            count(row_blobs(row), 1)
+    for row in session.deleted:
+        if isinstance(row, (Story, WarmStory)):
+            count(row_blobs(row), -1)
+    for row in session.dirty:
+        if isinstance(row, (Story, WarmStory)):
+            previous = _previous_blobs(session, row)
+            if previous is not None:
+                count(previous, -1)
+                count(row_blobs(row), 1)
+    BlobRef.adjust(session, deltas)
@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+from flask_cors import CORS, cross_origin
+from models.models import StoryJob
+from extensions import db
+
+bp = Blueprint('jobs', __name__)
+CORS(bp, origins=["http://localhost:5173", "http://localhost:5174"])  # Enable CORS for frontend
+
+@bp.route('/jobs/<job_id>', methods=['GET', 'OPTIONS'])
+@cross_origin(origins=['https://proud-water-076db370f.6.azurestaticapps.net'], methods=['GET', 'OPTIONS'])
+def get_job(job_id):
+    job = db.session.get(StoryJob, job_id)
+    if not job:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    return jsonify(job.to_dict())
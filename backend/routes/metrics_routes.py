@@ -0,0 +1,48 @@
+import hmac
+
+from flask import Blueprint, jsonify, request, current_app
+from extensions import warm_pool, service_registry, blob_collector
+from config.config import Config
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Operational counters for sizing and tuning the generation path. Needs
+    `Authorization: Bearer <METRICS_TOKEN>`; without METRICS_TOKEN it is off.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    supplied = request.headers.get('Authorization', '').encode('utf-8')
+    if not hmac.compare_digest(supplied, f"Bearer {token}".encode('utf-8')):
+        return jsonify({'error': 'Invalid metrics token'}), 401, {'WWW-Authenticate': 'Bearer'}
+
+    # Imported here so booting a worker doesn't load the OpenAI and Speech SDKs
+    from services.rate_limiter import UpstreamRateLimiter
+    from services.openai_router import DeploymentRouter
+    from services.speech_pool import SynthesizerPool
+    from services.http_clients import HttpClients
+    from services.image_variants import ImageVariants
+    from models.models import BlobRef
+
+    cache = service_registry.generation_cache
+    audio_cache = service_registry.audio_cache
+    # Upload counters live on the storage backend; a worker that hasn't stored anything yet has none
+    storage = service_registry.built('storage')
+    return jsonify({
+        'services': service_registry.stats(),
+        'generationCache': cache.stats() if cache is not None else None,
+        'singleFlight': service_registry.single_flight.stats(),
+        'audioCache': audio_cache.stats() if audio_cache is not None else None,
+        'audioFormats': audio_cache.variant_stats() if audio_cache is not None else None,
+        'warmPool': warm_pool.levels() if warm_pool.enabled else [],
+        'rateLimits': UpstreamRateLimiter.shared(Config).metrics(),
+        'gptRouting': DeploymentRouter.shared(Config).metrics(),
+        'speechPool': SynthesizerPool.shared(Config).stats(),
+        'http': HttpClients.shared(Config).stats(),
+        'imageVariants': ImageVariants.shared(Config).stats(),
+        'blobContent': {**(storage.content_stats() if storage is not None else {}), 'refs': BlobRef.stats()},
+        'blobGc': blob_collector.stats()
+    })
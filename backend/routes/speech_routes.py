@@ -1,12 +1,29 @@
-from flask import Blueprint, request, send_file
-from services.azure_services import AzureServices
+from flask import Blueprint, request, send_file, Response, redirect
+from services.audio_formats import negotiate
+from config.config import Config
+from extensions import service_registry
 from flask_cors import CORS, cross_origin
 import io
 
 bp = Blueprint('speech', __name__)
 # Enable CORS for the speech blueprint
 CORS(bp, origins=["http://localhost:5173", "http://localhost:5174", "https://proud-water-076db370f.6.azurestaticapps.net"])
-azure_services = AzureServices()
+
+def _voice_error(voice):
+    if voice and voice != Config.AZURE_SPEECH_VOICE and voice not in Config.SPEECH_VOICES:
+        print(f"[Speech API] Error: Unsupported voice {voice}")
+        return {'error': f"Unsupported voice. Choose one of: {', '.join(Config.SPEECH_VOICES)}"}, 400
+    return None
+
+def _audio_format(data, accept=None):
+    """
+    The negotiated narration format, or an error response for an unknown `format`
+    """
+    try:
+        return negotiate(accept, data.get('format'), Config.SPEECH_AUDIO_FORMATS), None
+    except ValueError as e:
+        print(f"[Speech API] Error: {str(e)}")
+        return None, ({'error': f"{str(e)}. Choose one of: {', '.join(Config.SPEECH_AUDIO_FORMATS)}"}, 400)
 
 @bp.route('/speech', methods=['POST', 'OPTIONS'])
 @cross_origin(origins=['http://localhost:5173', 'http://localhost:5174', 'https://proud-water-076db370f.6.azurestaticapps.net'], methods=['POST', 'OPTIONS'])
@@ -21,16 +38,86 @@ def text_to_speech():
     if not data or not data.get('text'):
         print("[Speech API] Error: Text is required")
         return {'error': 'Text is required'}, 400
+    voice_error = _voice_error(data.get('voice'))
+    if voice_error:
+        return voice_error
+    # The response itself is JSON, so only an explicit `format` picks the audio format
+    audio_format, format_error = _audio_format(data)
+    if format_error:
+        return format_error
     
     try:
-        print(f"[Speech API] Converting text to speech, length: {len(data['text'])}")
-        audio_data = azure_services.text_to_speech(data['text'])
+        print(f"[Speech API] Converting text to speech, length: {len(data['text'])}, format: {audio_format.name}")
+        audio_data = service_registry.speech_services.text_to_speech(data['text'], data.get('voice'), audio_format.name)
         # Save audio to Azure Blob Storage
         title = data.get('title', 'story_audio')
-        audio_url = azure_services.save_audio(audio_data, title)
+        audio_url = service_registry.speech_services.save_audio(audio_data, title, audio_format.name)
         print(f"[Speech API] Successfully generated and saved speech. audioUrl: {audio_url}")
-        return {'audioUrl': audio_url}, 200
+        return {'audioUrl': audio_url, 'format': audio_format.name, 'contentType': audio_format.content_type}, 200
         
     except Exception as e:
         print(f"[Speech API] Error: {str(e)}")
-        return {'error': str(e)}, 500
\ No newline at end of file
+        return {'error': str(e)}, 500
+
+@bp.route('/speech/stream', methods=['GET', 'POST', 'OPTIONS'])
+@cross_origin(origins=['http://localhost:5173', 'http://localhost:5174', 'https://proud-water-076db370f.6.azurestaticapps.net'], methods=['GET', 'POST', 'OPTIONS'], expose_headers=['X-Audio-Url', 'X-Audio-Format'])
+def stream_speech():
+    """
+    Stream narration as audio/mpeg while it is being synthesized, so playback can
+    start straight away. GET (?text=...&title=...&voice=...) works as an <audio> src. The
+    same audio is saved to blob storage; its URL is in the X-Audio-Url header.
+    The format comes from `format` (mp3, ogg-opus, webm-opus) or the Accept header.
+    """
+    if request.method == 'OPTIONS':
+        return {'success': True}, 200
+
+    data = request.args if request.method == 'GET' else (request.get_json(silent=True) or {})
+    if not data.get('text'):
+        print("[Speech API] Error: Text is required")
+        return {'error': 'Text is required'}, 400
+    voice_error = _voice_error(data.get('voice'))
+    if voice_error:
+        return voice_error
+    audio_format, format_error = _audio_format(data, request.headers.get('Accept'))
+    if format_error:
+        return format_error
+
+    cached_url = service_registry.speech_services.cached_audio_url(data['text'], data.get('voice'), audio_format.name)
+    if cached_url is not None:
+        print(f"[Speech API] Serving stored {audio_format.name} audio for {len(data['text'])} characters")
+        response = redirect(cached_url, code=302)
+        response.headers['X-Audio-Url'] = cached_url
+        response.headers['X-Audio-Format'] = audio_format.name
+        response.headers['Vary'] = 'Accept'
+        return response
+
+    try:
+        print(f"[Speech API] Streaming text to speech, length: {len(data['text'])}, format: {audio_format.name}")
+        audio_url, chunks = service_registry.speech_services.stream_audio(
+            data['text'], data.get('title', 'story_audio'), voice=data.get('voice'), audio_format=audio_format.name
+        )
+        # Wait for the first audio so that failures to start still get a proper error response
+        first = next(chunks, b'')
+    except Exception as e:
+        print(f"[Speech API] Error: {str(e)}")
+        return {'error': str(e)}, 500
+
+    def body():
+        try:
+            yield first
+            yield from chunks
+        finally:
+            # Closing the generator when the client disconnects lets the upload finish on its own
+            chunks.close()
+
+    return Response(
+        body(),
+        content_type=audio_format.content_type,
+        headers={
+            'X-Audio-Url': audio_url,
+            'X-Audio-Format': audio_format.name,
+            'Vary': 'Accept',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
+    )
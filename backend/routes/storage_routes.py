@@ -0,0 +1,27 @@
+import os
+from flask import Blueprint, jsonify, request, send_file
+from extensions import service_registry
+from services.local_storage import LocalStorageBackend
+
+bp = Blueprint('storage', __name__)
+
+
+@bp.route('/storage/<container_name>/<blob_name>', methods=['GET', 'HEAD'])
+def get_blob(container_name, blob_name):
+    """
+    Serve a blob from the local storage backend to whoever holds its signed URL
+    """
+    storage = service_registry.storage
+    if not isinstance(storage, LocalStorageBackend):
+        return jsonify({'error': 'Not found'}), 404
+    if not storage.verify(container_name, blob_name, request.args.get('expires'), request.args.get('sig')):
+        return jsonify({'error': 'Invalid or expired signature'}), 403
+    try:
+        path = storage.path(container_name, blob_name)
+    except ValueError:
+        return jsonify({'error': 'Not found'}), 404
+    if not os.path.isfile(path):
+        return jsonify({'error': 'Not found'}), 404
+    # A path lets the WSGI server's file_wrapper use sendfile(2); Range and
+    # If-None-Match requests are answered from the file's size and mtime
+    return send_file(path, mimetype=storage.content_type(blob_name), conditional=True, etag=True)
@@ -1,14 +1,24 @@
-from flask import Blueprint, request, jsonify
-from models.models import Story, User
-from services.azure_services import AzureServices
-from extensions import db
+from flask import Blueprint, request, jsonify, current_app, url_for, Response, stream_with_context
+from models.models import Story, StoryJob, User, row_blobs
+from services.story_pipeline import StoryPipeline, derive_title
+from services.image_variants import dump_variants
+from extensions import db, job_queue, warm_pool, service_registry, blob_collector
 import json
+import time
 import traceback as tb
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from flask_cors import CORS, cross_origin
 
 bp = Blueprint('stories', __name__)
 CORS(bp, origins=["http://localhost:5173", "http://localhost:5174"])  # Enable CORS for frontend
-azure_services = AzureServices()
+
+def generation_services(data):
+    """
+    Services to generate a story with; `"fresh": true` in the request skips cached results
+    """
+    if data.get('fresh') or request.headers.get('Cache-Control', '') == 'no-cache':
+        return service_registry.story_services.with_fresh()
+    return service_registry.story_services
 
 def safe_json_loads(val):
     import json
@@ -32,6 +42,7 @@ def get_stories():
         'ageGroup': story.age_group,
         'isFavorite': story.is_favorite,
         'imageUrl': story.image_url,
+        **story.image_fields(),
         'audioUrl': getattr(story, 'audio_url', None),
         'createdAt': story.created_at.isoformat()
     } for story in stories])
@@ -50,63 +61,32 @@ def create_story():
         print("[ERROR] Missing required fields in request data", file=sys.stderr)
         return jsonify({'error': 'Missing required fields'}), 400
     try:
-        # Generate story content
-        story_content = azure_services.generate_story(
-            data['theme'],
-            json.dumps(data['characters']),
-            data['age_group']
+        # Preset requests are served straight from the warm pool when a story is ready
+        story = warm_pool.claim(data)
+        if story is not None:
+            response = jsonify(story.to_dict())
+            response.headers['X-Warm-Pool'] = 'hit'
+            return response, 201
+        if current_app.config.get('STORY_ASYNC_JOBS') or 'respond-async' in request.headers.get('Prefer', ''):
+            # Hand the generation to the background workers and let the client poll the job
+            job = job_queue.enqueue('story', data)
+            status_url = url_for('jobs.get_job', job_id=job.id)
+            response = jsonify({'jobId': job.id, 'status': job.status, 'statusUrl': status_url})
+            response.headers['Location'] = status_url
+            return response, 202
+        pipeline = StoryPipeline(
+            generation_services(data),
+            concurrent=current_app.config.get('STORY_PIPELINE_CONCURRENT', True),
+            max_workers=current_app.config.get('STORY_PIPELINE_MAX_WORKERS', 4)
         )
-        
-        # Extract title from the first line of the story content
-        title = data.get('title', '')
-        if not title:
-            # If no title provided, extract from first line or generate based on theme
-            if '**' in story_content and '**\n' in story_content:
-                # Extract title from markdown format if present
-                title = story_content.split('**')[1].strip()
-            else:
-                # Generate a simple title based on theme and characters
-                characters_str = ', '.join(data['characters'][:2]) if data['characters'] else ''
-                title = f"{data['theme']} Adventure with {characters_str}"
-        
+        result = pipeline.run(data)
+        story_content = result['story']
+        title = result['title']
+        image_url = result['save_image']
+        audio_url = result['save_audio']
         print(f"[DEBUG] Using title: {title}", file=sys.stderr)
-        
-        # Save story content to storage
-        try:
-            story_url = azure_services.save_story_content(story_content, title)
-            print(f"[DEBUG] Story content saved to: {story_url}", file=sys.stderr)
-        except Exception as e:
-            print(f"[ERROR] Failed to save story content: {str(e)}", file=sys.stderr)
-            tb.print_exc(file=sys.stderr)
-            story_url = None
-        
-        # Generate illustration and save to storage
-        print(f"[DEBUG] Generating illustration for title: {title}", file=sys.stderr)
-        try:
-            image_data = azure_services.generate_illustration(
-                title,
-                data['theme'],
-                json.dumps(data['characters']),
-                data['age_group']
-            )
-            image_url = azure_services.save_image(image_data, title)
-            print(f"[DEBUG] Successfully saved illustration: {image_url}", file=sys.stderr)
-        except Exception as illustration_error:
-            print(f"[ERROR] Failed to save illustration: {str(illustration_error)}", file=sys.stderr)
-            tb.print_exc(file=sys.stderr)
-            # Use a placeholder image instead of failing the whole request
-            image_url = "/static/placeholder.png"
-        
-        # Generate and save audio to blob storage
-        print(f"[DEBUG] Generating and saving audio for title: {title}", file=sys.stderr)
-        try:
-            audio_data = azure_services.text_to_speech(story_content)
-            audio_url = azure_services.save_audio(audio_data, title)
-            print(f"[DEBUG] Successfully saved audio: {audio_url}", file=sys.stderr)
-        except Exception as audio_error:
-            print(f"[ERROR] Failed to save audio: {str(audio_error)}", file=sys.stderr)
-            tb.print_exc(file=sys.stderr)
-            audio_url = None
+        print(f"[DEBUG] Story content saved to: {result['save_story']}", file=sys.stderr)
+        print(f"[DEBUG] Illustration: {image_url}, audio: {audio_url}", file=sys.stderr)
         
         # Create story - handle case where audio_url column might not exist yet
         try:
@@ -118,7 +98,9 @@ def create_story():
                 characters=json.dumps(data['characters']),
                 age_group=data['age_group'],
                 image_url=image_url,
-                audio_url=audio_url
+                image_variants=dump_variants(result.get('image_variants')),
+                audio_url=audio_url,
+                content_url=result['save_story']
             )
         except TypeError as e:
             # If 'audio_url' is an invalid keyword argument, create without it
@@ -145,6 +127,7 @@ def create_story():
             'characters': safe_json_loads(story.characters),
             'ageGroup': story.age_group,
             'imageUrl': story.image_url,
+            **story.image_fields(),
             'createdAt': story.created_at.isoformat()
         }
         
@@ -154,13 +137,204 @@ def create_story():
         elif audio_url:  # If we have audio_url from generation but couldn't store it in the model
             response_data['audioUrl'] = audio_url
             
-        return jsonify(response_data), 201
+        response = jsonify(response_data)
+        response.headers['Server-Timing'] = result.server_timing()
+        return response, 201
     except Exception as e:
         print("[ERROR] Exception in create_story:", str(e), file=sys.stderr)
         tb.print_exc(file=sys.stderr)
+        db.session.rollback()
         # Return error and stack trace in response for easier debugging (remove in production)
         return jsonify({'error': str(e), 'traceback': tb.format_exc()}), 500
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@bp.route('/stories/stream', methods=['GET', 'POST', 'OPTIONS'])
+@cross_origin(origins=['https://proud-water-076db370f.6.azurestaticapps.net'], methods=['GET', 'POST', 'OPTIONS'])
+def stream_story():
+    """
+    Stream the story text to the browser as Server-Sent Events while GPT writes it.
+    Once the text is complete the story is saved and illustration/audio are
+    generated by a background job; the final 'story' event carries its id.
+    """
+    import sys
+    if request.method == 'OPTIONS':
+        return {'success': True}, 200
+
+    if request.method == 'GET':
+        # EventSource can only send GET, so accept the fields as query parameters
+        characters = request.args.getlist('characters')
+        if len(characters) == 1 and ',' in characters[0]:
+            characters = [c.strip() for c in characters[0].split(',') if c.strip()]
+        data = {
+            'theme': request.args.get('theme'),
+            'characters': characters,
+            'age_group': request.args.get('age_group'),
+            'title': request.args.get('title', '')
+        }
+    else:
+        data = request.json or {}
+    if not data.get('theme') or not data.get('age_group') or 'characters' not in data:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    services = generation_services(data)
+
+    def generate():
+        parts = []
+        yield _sse('start', {'theme': data['theme']})
+        try:
+            for delta in services.stream_story(data['theme'], json.dumps(data['characters']), data['age_group']):
+                parts.append(delta)
+                yield _sse('delta', {'text': delta})
+
+            story_content = ''.join(parts)
+            story = Story(
+                title=derive_title(story_content, data),
+                content=story_content,
+                theme=data['theme'],
+                characters=json.dumps(data['characters']),
+                age_group=data['age_group']
+            )
+            db.session.add(story)
+            db.session.commit()
+            job = job_queue.enqueue('media', data, story_id=story.id)
+            payload = story.to_dict()
+            payload['jobId'] = job.id
+            payload['statusUrl'] = url_for('jobs.get_job', job_id=job.id)
+            yield _sse('story', payload)
+        except Exception as e:
+            print("[ERROR] Exception in stream_story:", str(e), file=sys.stderr)
+            tb.print_exc(file=sys.stderr)
+            db.session.rollback()
+            yield _sse('error', {'error': str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@bp.route('/stories/batch', methods=['POST', 'OPTIONS'])
+@cross_origin(origins=['https://proud-water-076db370f.6.azurestaticapps.net'], methods=['POST', 'OPTIONS'])
+def create_stories_batch():
+    """
+    Generate many stories in one request. Body: {"stories": [{theme, characters, age_group, ...}, ...]}.
+    Results are streamed back as NDJSON, one line per story as it completes, followed by a summary line.
+    Stories that finish close together are committed in a single transaction.
+    """
+    import sys
+    if request.method == 'OPTIONS':
+        return {'success': True}, 200
+
+    specs = (request.json or {}).get('stories')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'A non-empty "stories" list is required'}), 400
+    max_items = current_app.config.get('BATCH_MAX_ITEMS', 100)
+    if len(specs) > max_items:
+        return jsonify({'error': f'At most {max_items} stories per batch'}), 400
+
+    required_fields = ['theme', 'characters', 'age_group']
+    config = current_app.config
+    commit_size = config.get('BATCH_COMMIT_SIZE', 10)
+    commit_interval = config.get('BATCH_COMMIT_INTERVAL', 2.0)
+    batch_services = service_registry.batch_services
+
+    def run_item(spec):
+        services = batch_services.with_fresh() if spec.get('fresh') else batch_services
+        pipeline = StoryPipeline(
+            services,
+            concurrent=config.get('STORY_PIPELINE_CONCURRENT', True),
+            max_workers=config.get('STORY_PIPELINE_MAX_WORKERS', 4)
+        )
+        return pipeline.run(spec)
+
+    def line(payload):
+        return json.dumps(payload) + '\n'
+
+    def generate():
+        start = time.perf_counter()
+        created = failed = 0
+        pool = ThreadPoolExecutor(max_workers=config.get('BATCH_MAX_CONCURRENT_ITEMS', 8), thread_name_prefix='story-batch')
+        futures = {}
+        try:
+            for index, spec in enumerate(specs):
+                if not isinstance(spec, dict) or not all(field in spec for field in required_fields):
+                    failed += 1
+                    yield line({'index': index, 'status': 'failed', 'error': 'Missing required fields'})
+                    continue
+                futures[pool.submit(run_item, spec)] = index
+
+            pending = set(futures)
+            finished = []  # (index, spec, result) waiting for the next bulk commit
+            first_finished_at = None
+            while pending or finished:
+                if pending:
+                    done, pending = wait(pending, timeout=commit_interval, return_when=FIRST_COMPLETED)
+                else:
+                    done = set()
+                for future in done:
+                    index = futures[future]
+                    try:
+                        finished.append((index, specs[index], future.result()))
+                        first_finished_at = first_finished_at or time.perf_counter()
+                    except Exception as e:
+                        failed += 1
+                        print(f"[BATCH ERROR] Story {index} failed: {str(e)}", file=sys.stderr)
+                        yield line({'index': index, 'status': 'failed', 'error': str(e)})
+
+                flush_due = finished and (
+                    not pending
+                    or len(finished) >= commit_size
+                    or time.perf_counter() - first_finished_at >= commit_interval
+                )
+                if not flush_due:
+                    continue
+                stories = [
+                    Story(
+                        title=result['title'],
+                        content=result['story'],
+                        theme=spec['theme'],
+                        characters=json.dumps(spec['characters']),
+                        age_group=spec['age_group'],
+                        image_url=result['save_image'],
+                        image_variants=dump_variants(result.get('image_variants')),
+                        audio_url=result['save_audio'],
+                        content_url=result['save_story']
+                    )
+                    for _, spec, result in finished
+                ]
+                db.session.add_all(stories)
+                db.session.commit()
+                print(f"[BATCH] Committed {len(stories)} stories", file=sys.stderr)
+                for (index, _, result), story in zip(finished, stories):
+                    created += 1
+                    yield line({
+                        'index': index,
+                        'status': 'created',
+                        'story': story.to_dict(),
+                        'timings': {name: round(seconds, 3) for name, seconds in result.timings.items()}
+                    })
+                finished = []
+                first_finished_at = None
+
+            yield line({
+                'status': 'done',
+                'created': created,
+                'failed': failed,
+                'elapsed': round(time.perf_counter() - start, 3)
+            })
+        except Exception as e:
+            print("[ERROR] Exception in create_stories_batch:", str(e), file=sys.stderr)
+            tb.print_exc(file=sys.stderr)
+            db.session.rollback()
+            yield line({'status': 'error', 'error': str(e)})
+        finally:
+            # Stop queued items if the client went away
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @bp.route('/stories/<int:story_id>/favorite', methods=['POST', 'OPTIONS'])
 @cross_origin(origins=['https://proud-water-076db370f.6.azurestaticapps.net'], methods=['POST', 'OPTIONS'])
 def toggle_favorite(story_id):
@@ -188,9 +362,12 @@ def delete_story(story_id):
             print(f"[ERROR] Story with ID {story_id} not found", file=sys.stderr)
             return jsonify({'error': f'Story with ID {story_id} not found'}), 404
         
+        blobs = row_blobs(story)
         db.session.delete(story)
         db.session.commit()
         print(f"[DEBUG] Successfully deleted story with ID: {story_id}", file=sys.stderr)
+        # Its media goes once no other story shares it; the job re-checks the reference counts
+        blob_collector.release(blobs)
         return '', 204
     except Exception as e:
         print(f"[ERROR] Failed to delete story with ID {story_id}: {str(e)}", file=sys.stderr)
@@ -201,23 +378,59 @@ def delete_story(story_id):
 @bp.route('/stories/<int:story_id>/regenerate-illustration', methods=['POST', 'OPTIONS'])
 @cross_origin(origins=['https://proud-water-076db370f.6.azurestaticapps.net'], methods=['POST', 'OPTIONS'])
 def regenerate_illustration(story_id):
+    """
+    Queue a new illustration for the story and return 202 with the job to poll.
+    `{"candidates": n}` asks for several images to choose from; the story keeps
+    its current illustration until one is saved (or chosen).
+    """
     if request.method == 'OPTIONS':
         return {'success': True}, 200
     
     story = Story.query.get_or_404(story_id)
+    data = request.get_json(silent=True) or {}
+    max_candidates = current_app.config.get('ILLUSTRATION_MAX_CANDIDATES', 4)
+    try:
+        candidates = int(data.get('candidates', 1))
+    except (TypeError, ValueError):
+        candidates = 0
+    if not 1 <= candidates <= max_candidates:
+        return jsonify({'error': f'candidates must be between 1 and {max_candidates}'}), 400
     
     try:
-        image_url = azure_services.generate_illustration(
-            story.title,
-            story.theme,
-            story.characters,
-            story.age_group
-        )
-        
-        story.image_url = image_url
-        db.session.commit()
-        
-        return jsonify({'imageUrl': image_url})
+        job = job_queue.enqueue('illustration', {'candidates': candidates}, story_id=story.id)
+        status_url = url_for('jobs.get_job', job_id=job.id)
+        response = jsonify({'jobId': job.id, 'status': job.status, 'statusUrl': status_url})
+        response.headers['Location'] = status_url
+        return response, 202
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stories/<int:story_id>/illustration', methods=['POST', 'OPTIONS'])
+@cross_origin(origins=['https://proud-water-076db370f.6.azurestaticapps.net'], methods=['POST', 'OPTIONS'])
+def choose_illustration(story_id):
+    """
+    Use one of the candidates of a finished regeneration job:
+    `{"jobId": "...", "candidate": 0}`
+    """
+    if request.method == 'OPTIONS':
+        return {'success': True}, 200
+
+    story = Story.query.get_or_404(story_id)
+    data = request.get_json(silent=True) or {}
+    job = db.session.get(StoryJob, data.get('jobId') or '')
+    if job is None or job.kind != 'illustration' or job.story_id != story.id:
+        return jsonify({'error': 'No illustration job for this story'}), 404
+    if job.status != 'succeeded':
+        return jsonify({'error': f'Illustration job is {job.status}'}), 409
+    result = json.loads(job.result)
+    index = data.get('candidate')
+    # bool is an int subclass, but true/false are not candidate numbers
+    if type(index) is not int or not 0 <= index < len(result['candidates']):
+        return jsonify({'error': f"candidate must be between 0 and {len(result['candidates']) - 1}"}), 400
+    candidate = result['candidates'][index]
+    story.set_illustration(candidate['imageUrl'], candidate['imageVariants'])
+    result['selected'] = index
+    job.result = json.dumps(result)
+    db.session.commit()
+    return jsonify(story.to_dict())
@@ -0,0 +1,113 @@
+import sys
+import atexit
+import asyncio
+import threading
+
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+
+
+class AsyncBlobStorage:
+    """
+    Blob uploads on azure.storage.blob.aio, run on one background event loop
+    per process. Large blobs go up as `block_size` blocks, `max_concurrency`
+    at a time, and any number of uploads can be in flight together: the
+    request threads only wait on futures, not on sockets.
+
+    Flask views are synchronous, so uploads are started with submit() (a
+    concurrent.futures.Future) or upload_many(); coroutines running on the
+    loop can await upload() directly.
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, account_url, account_key, block_size=4 * 1024 * 1024, max_concurrency=4,
+                 single_put_size=4 * 1024 * 1024):
+        self.account_url = account_url
+        self.account_key = account_key
+        self.block_size = block_size
+        self.max_concurrency = max_concurrency
+        self.single_put_size = single_put_size
+        self._loop = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, account_url, account_key, config):
+        with cls._shared_lock:
+            storage = cls._shared.get(account_url)
+            if storage is None:
+                storage = cls._shared[account_url] = cls(
+                    account_url, account_key,
+                    block_size=config.BLOB_BLOCK_SIZE,
+                    max_concurrency=config.BLOB_MAX_CONCURRENCY,
+                    single_put_size=config.BLOB_SINGLE_PUT_SIZE
+                )
+            return storage
+
+    def _start(self):
+        # The loop and its aiohttp session are created on the first upload, not at import
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='blob-aio', daemon=True).start()
+                self._client = asyncio.run_coroutine_threadsafe(self._create_client(), loop).result()
+                self._loop = loop
+                # Close the aiohttp session while the loop thread is still running
+                atexit.register(self.close)
+                print(f"[BLOB AIO] Started upload loop (block size {self.block_size}, "
+                      f"concurrency {self.max_concurrency})", file=sys.stderr)
+            return self._loop
+
+    async def _create_client(self):
+        return AsyncBlobServiceClient(
+            account_url=self.account_url,
+            credential=self.account_key,
+            max_block_size=self.block_size,
+            max_single_put_size=self.single_put_size
+        )
+
+    async def upload(self, container_name, blob_name, data, content_type):
+        """
+        Upload on the loop; must be awaited from a coroutine running on it
+        """
+        blob_client = self._client.get_blob_client(container=container_name, blob=blob_name)
+        await blob_client.upload_blob(
+            data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=content_type),
+            max_concurrency=self.max_concurrency
+        )
+        return blob_name
+
+    def submit(self, coroutine_function, *args):
+        """
+        Run `coroutine_function(*args)` on the loop and return a concurrent.futures.Future
+        """
+        loop = self._start()
+        return asyncio.run_coroutine_threadsafe(coroutine_function(*args), loop)
+
+    def upload_blob(self, container_name, blob_name, data, content_type):
+        return self.submit(self.upload, container_name, blob_name, data, content_type).result()
+
+    def upload_many(self, uploads):
+        """
+        Upload (container, blob name, data, content type) tuples concurrently.
+        Returns the blob names in order; raises the first failure once all have finished.
+        """
+        async def gather():
+            return await asyncio.gather(*(self.upload(*upload) for upload in uploads), return_exceptions=True)
+
+        results = self.submit(gather).result()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._loop is not None:
+                asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout=10)
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+                self._client = None
@@ -0,0 +1,347 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlparse, unquote
+
+
+def audio_key(text, voice, output_format):
+    return hashlib.sha256(
+        '\x1f'.join((hashlib.sha256(text.encode('utf-8')).hexdigest(), voice, output_format)).encode('utf-8')
+    ).hexdigest()
+
+
+def narration_key(text, voice):
+    """
+    Identifies narration of a text in a voice, whatever its format, so format variants can be grouped
+    """
+    return hashlib.sha256(
+        '\x1f'.join((hashlib.sha256(text.encode('utf-8')).hexdigest(), voice)).encode('utf-8')
+    ).hexdigest()
+
+
+def blob_name_from_url(url):
+    return unquote(urlparse(url).path.rsplit('/', 1)[-1])
+
+
+class CachedAudio(bytes):
+    """
+    Returned by text_to_speech when narration for the text is already stored:
+    carries no audio, only the stored blob's URL, which save_audio hands back
+    """
+    def __new__(cls, url):
+        instance = super().__new__(cls, b'')
+        instance.url = url
+        return instance
+
+
+class SynthesizedAudio(bytes):
+    """
+    Freshly synthesized audio, tagged with what it narrates so save_audio can record where it was stored
+    """
+    def __new__(cls, data, text, voice, audio_format):
+        instance = super().__new__(cls, data)
+        instance.text = text
+        instance.voice = voice
+        instance.audio_format = audio_format
+        return instance
+
+
+class AudioCache:
+    """
+    Content-addressed index of narration already in blob storage, keyed on
+    hash(text, voice, output format), so repeated synthesis of the same text
+    becomes a lookup instead of a Speech call and a new upload. Kept in SQLite
+    (shared by all workers on the host) with LRU eviction and a TTL below the
+    one-year SAS expiry of the stored URLs.
+
+    The same file also records every format variant of a narration (blob
+    name, byte size and duration), which is not evicted, to quantify what
+    Opus saves over MP3. New audio is never written to a name recorded here.
+    """
+    def __init__(self, path, max_entries=5000, ttl_seconds=180 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._create_tables()
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.AUDIO_CACHE_ENABLED:
+            return None
+        return cls(
+            config.AUDIO_CACHE_PATH,
+            max_entries=config.AUDIO_CACHE_MAX_ENTRIES,
+            ttl_seconds=config.AUDIO_CACHE_TTL_SECONDS
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audio_cache_entry (
+                key TEXT PRIMARY KEY,
+                voice TEXT NOT NULL,
+                output_format TEXT NOT NULL,
+                url TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                text_length INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_audio_cache_entry_accessed_at ON audio_cache_entry (accessed_at)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audio_cache_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                characters_saved INTEGER NOT NULL DEFAULT 0,
+                bytes_saved INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO audio_cache_stats (id) VALUES (1)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audio_variant (
+                narration_key TEXT NOT NULL,
+                output_format TEXT NOT NULL,
+                voice TEXT NOT NULL,
+                blob_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                duration_seconds REAL NOT NULL,
+                text_length INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (narration_key, output_format)
+            )
+        ''')
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT url, size, text_length, created_at FROM audio_cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is not None and now - row[3] > self.ttl_seconds:
+            conn.execute('DELETE FROM audio_cache_entry WHERE key = ?', (key,))
+            row = None
+        if row is None:
+            conn.execute('UPDATE audio_cache_stats SET misses = misses + 1 WHERE id = 1')
+            return None
+        url, size, text_length, _ = row
+        conn.execute('UPDATE audio_cache_entry SET accessed_at = ?, hits = hits + 1 WHERE key = ?', (now, key))
+        conn.execute(
+            'UPDATE audio_cache_stats SET hits = hits + 1, characters_saved = characters_saved + ?, '
+            'bytes_saved = bytes_saved + ? WHERE id = 1',
+            (text_length, size)
+        )
+        return url
+
+    def set(self, key, url, voice, output_format, size, text_length):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO audio_cache_entry '
+            '(key, voice, output_format, url, size, text_length, created_at, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, voice, output_format, url, size, text_length, now, now)
+        )
+        self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute('DELETE FROM audio_cache_entry WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        count = conn.execute('SELECT COUNT(*) FROM audio_cache_entry').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # Only the index entry goes: the blob may still be referenced by stories
+        conn.execute(
+            'DELETE FROM audio_cache_entry WHERE key IN '
+            '(SELECT key FROM audio_cache_entry ORDER BY accessed_at ASC LIMIT ?)',
+            (count - self.max_entries,)
+        )
+        print(f"[AUDIO CACHE] Evicted {count - self.max_entries} least recently used entries", file=sys.stderr)
+
+    def invalidate(self, voice=None, output_format=None, keep_voices=None):
+        """
+        Drop entries for a voice and/or format, or for every voice not in
+        `keep_voices`. Returns the number of entries removed.
+        """
+        conditions, params = [], []
+        if voice is not None:
+            conditions.append('voice = ?')
+            params.append(voice)
+        if output_format is not None:
+            conditions.append('output_format = ?')
+            params.append(output_format)
+        if keep_voices:
+            conditions.append(f"voice NOT IN ({', '.join('?' * len(keep_voices))})")
+            params.extend(keep_voices)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self._connect().execute(f'DELETE FROM audio_cache_entry{where}', params).rowcount
+
+    def blob_names(self):
+        """
+        Names of every audio blob the cache can hand out, which must not be garbage collected
+        """
+        conn = self._connect()
+        names = {
+            blob_name_from_url(url) for (url,) in conn.execute(
+                'SELECT url FROM audio_cache_entry WHERE created_at >= ?', (time.time() - self.ttl_seconds,)
+            )
+        }
+        names.update(blob_name for (blob_name,) in conn.execute('SELECT blob_name FROM audio_variant'))
+        return names
+
+    def record_variant(self, narration, output_format, voice, blob_name, size, duration_seconds, text_length):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO audio_variant '
+            '(narration_key, output_format, voice, blob_name, size, duration_seconds, text_length, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (narration, output_format, voice, blob_name, size, duration_seconds, text_length, time.time())
+        )
+
+    def variant_stats(self, baseline='mp3'):
+        """
+        Bytes and playing time per format, and for narration stored both in a
+        format and in the baseline, how many bytes the format saves
+        """
+        conn = self._connect()
+        formats = {
+            output_format: {
+                'variants': count,
+                'bytes': size,
+                'seconds': round(seconds, 1),
+                'bytesPerSecond': round(size / seconds) if seconds else None
+            }
+            for output_format, count, size, seconds in conn.execute(
+                'SELECT output_format, COUNT(*), SUM(size), SUM(duration_seconds) FROM audio_variant GROUP BY output_format'
+            )
+        }
+        for output_format, count, size, baseline_size in conn.execute(
+            'SELECT v.output_format, COUNT(*), SUM(v.size), SUM(b.size) FROM audio_variant v '
+            'JOIN audio_variant b ON b.narration_key = v.narration_key AND b.output_format = ? '
+            'WHERE v.output_format != ? GROUP BY v.output_format',
+            (baseline, baseline)
+        ):
+            formats[output_format]['comparedWith'] = {
+                'baseline': baseline,
+                'narrations': count,
+                'bytesSaved': baseline_size - size,
+                'savingRate': round(1 - size / baseline_size, 3) if baseline_size else None
+            }
+        return formats
+
+    def stats(self):
+        conn = self._connect()
+        hits, misses, characters_saved, bytes_saved = conn.execute(
+            'SELECT hits, misses, characters_saved, bytes_saved FROM audio_cache_stats WHERE id = 1'
+        ).fetchone()
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM audio_cache_entry').fetchone()
+        voices = {
+            f"{voice}/{output_format}": count
+            for voice, output_format, count in conn.execute(
+                'SELECT voice, output_format, COUNT(*) FROM audio_cache_entry GROUP BY voice, output_format'
+            )
+        }
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hitRate': round(hits / lookups, 3) if lookups else None,
+            'entries': entries,
+            'bytes': size,
+            'charactersSaved': characters_saved,
+            'uploadBytesSaved': bytes_saved,
+            'byVoice': voices
+        }
+
+
+class AudioCachingServices:
+    """
+    Wraps the story services so that text_to_speech + save_audio for text whose
+    narration is already stored returns the stored blob's URL without calling
+    Speech or uploading again. Everything else is delegated unchanged.
+    """
+    def __init__(self, services, cache):
+        self.services = services
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.services, name)
+
+    def with_fresh(self):
+        # Narration is keyed on the exact text, so fresh stories can still share it
+        return AudioCachingServices(self.services.with_fresh(), self.cache)
+
+    def _voice(self, voice=None, audio_format=None):
+        return voice or self.services.speech_voice, self.services.speech_audio_format(audio_format)
+
+    def audio_key(self, text, voice=None, audio_format=None):
+        voice, audio_format = self._voice(voice, audio_format)
+        return audio_key(text, voice, audio_format.sdk_format.name)
+
+    def cached_audio_url(self, text, voice=None, audio_format=None):
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(self.audio_key(text, voice, audio_format))
+        except sqlite3.Error as e:
+            print(f"[AUDIO CACHE ERROR] Lookup failed: {str(e)}", file=sys.stderr)
+            return None
+
+    def remember_audio(self, text, url, size, duration_seconds, voice=None, audio_format=None):
+        if self.cache is None:
+            return
+        voice, audio_format = self._voice(voice, audio_format)
+        try:
+            self.cache.set(
+                audio_key(text, voice, audio_format.sdk_format.name), url, voice, audio_format.sdk_format.name,
+                size=size, text_length=len(text)
+            )
+            self.cache.record_variant(
+                narration_key(text, voice), audio_format.name, voice, blob_name_from_url(url),
+                size, duration_seconds, len(text)
+            )
+        except sqlite3.Error as e:
+            print(f"[AUDIO CACHE ERROR] Store failed: {str(e)}", file=sys.stderr)
+
+    def text_to_speech(self, text, voice=None, audio_format=None):
+        url = self.cached_audio_url(text, voice, audio_format)
+        if url is not None:
+            print(f"[AUDIO CACHE] Hit for {len(text)} characters", file=sys.stderr)
+            return CachedAudio(url)
+        return SynthesizedAudio(self.services.text_to_speech(text, voice, audio_format), text, voice, audio_format)
+
+    def save_audio(self, audio_data, title, audio_format=None):
+        if isinstance(audio_data, CachedAudio):
+            return audio_data.url
+        if not isinstance(audio_data, SynthesizedAudio):
+            return self.services.save_audio(audio_data, title, audio_format)
+        audio_format = audio_format or audio_data.audio_format
+        # Always stored under a name of its own (the content hash), never one recorded in the
+        # cache: after eviction that blob may still belong to stories and must not be overwritten
+        url = self.services.save_audio(audio_data, title, audio_format)
+        duration = self.services.speech_audio_format(audio_format).duration(bytes(audio_data))
+        self.remember_audio(audio_data.text, url, len(audio_data), duration, audio_data.voice, audio_format)
+        return url
+
+    def stream_audio(self, text, title, voice=None, audio_format=None):
+        """
+        Like AzureServices.stream_audio, recording the stored audio once the upload is committed
+        """
+        return self.services.stream_audio(
+            text, title, voice=voice, audio_format=audio_format,
+            on_saved=lambda url, size, duration: self.remember_audio(text, url, size, duration, voice, audio_format)
+        )
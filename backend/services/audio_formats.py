@@ -0,0 +1,167 @@
+"""
+Narration output formats clients can negotiate, and just enough Ogg and WebM
+parsing to measure how long a synthesized file plays for.
+"""
+import struct
+
+import azure.cognitiveservices.speech as speechsdk
+
+from services import mp3
+
+
+class AudioFormat:
+    def __init__(self, name, sdk_format, rest_name, content_type, extension, duration, concatenable=False):
+        self.name = name
+        # Speech SDK output format and its X-Microsoft-OutputFormat name for the REST API
+        self.sdk_format = sdk_format
+        self.rest_name = rest_name
+        self.content_type = content_type
+        self.extension = extension
+        self.duration = duration
+        # Whether separately synthesized files can be joined (for chunked synthesis)
+        self.concatenable = concatenable
+
+    @property
+    def mime_type(self):
+        return self.content_type.split(';')[0].strip()
+
+
+def _read_vint(data, offset, keep_marker=False):
+    first = data[offset]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or offset + length > len(data):
+        raise ValueError("Invalid EBML variable-length integer")
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, unknown
+
+
+# WebM element IDs
+_SEGMENT, _CLUSTER, _BLOCK_GROUP, _INFO = 0x18538067, 0x1F43B675, 0xA0, 0x1549A966
+_TIMECODE, _SIMPLE_BLOCK, _BLOCK = 0xE7, 0xA3, 0xA1
+_TIMECODE_SCALE, _DURATION = 0x2AD7B1, 0x4489
+_OPUS_FRAME_SECONDS = 0.02
+
+
+def webm_duration(data):
+    """
+    Duration of a WebM file: the Info Duration if present, otherwise the last
+    block's timestamp plus one Opus frame (streamed WebM has no Duration)
+    """
+    scale = 1000000
+    duration = None
+    cluster_time = 0
+    last_block = None
+    offset = 0
+    ends = [len(data)]
+    while offset < len(data):
+        while offset >= ends[-1] and len(ends) > 1:
+            ends.pop()
+        try:
+            element, id_length, _ = _read_vint(data, offset, keep_marker=True)
+            size, size_length, unknown = _read_vint(data, offset + id_length)
+        except (ValueError, IndexError):
+            break
+        body = offset + id_length + size_length
+        end = ends[-1] if unknown else min(body + size, ends[-1])
+        if element in (_SEGMENT, _CLUSTER, _BLOCK_GROUP, _INFO):
+            # Descend. Live WebM uses unknown sizes; the next Cluster is then
+            # simply read as nested, which only updates the cluster timestamp
+            ends.append(end)
+            offset = body
+            continue
+        if element == _TIMECODE_SCALE:
+            scale = int.from_bytes(data[body:end], 'big')
+        elif element == _DURATION:
+            duration = struct.unpack('>f' if end - body == 4 else '>d', data[body:end])[0]
+        elif element == _TIMECODE:
+            cluster_time = int.from_bytes(data[body:end], 'big')
+        elif element in (_SIMPLE_BLOCK, _BLOCK):
+            _, track_length, _ = _read_vint(data, body)
+            relative = struct.unpack('>h', data[body + track_length:body + track_length + 2])[0]
+            last_block = max(last_block or 0, cluster_time + relative)
+        offset = end
+    if duration is not None:
+        return duration * scale / 1e9
+    if last_block is None:
+        return 0.0
+    return last_block * scale / 1e9 + _OPUS_FRAME_SECONDS
+
+
+def ogg_opus_duration(data):
+    """
+    Duration of an Ogg Opus file from the last page's granule position (always
+    counted at 48 kHz) less the pre-skip in the OpusHead header
+    """
+    head = data.find(b'OpusHead')
+    pre_skip = struct.unpack('<H', data[head + 10:head + 12])[0] if head >= 0 else 0
+    last_page = data.rfind(b'OggS')
+    while last_page >= 0:
+        granule = struct.unpack('<q', data[last_page + 6:last_page + 14])[0] if last_page + 14 <= len(data) else -1
+        if granule >= 0:
+            return max(0, granule - pre_skip) / 48000
+        last_page = data.rfind(b'OggS', 0, last_page)
+    return 0.0
+
+
+AUDIO_FORMATS = {
+    audio_format.name: audio_format
+    for audio_format in (
+        AudioFormat(
+            'mp3', speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3,
+            'audio-16khz-32kbitrate-mono-mp3', 'audio/mpeg', 'mp3', mp3.duration, concatenable=True
+        ),
+        AudioFormat(
+            'ogg-opus', speechsdk.SpeechSynthesisOutputFormat.Ogg16Khz16BitMonoOpus,
+            'ogg-16khz-16bit-mono-opus', 'audio/ogg; codecs=opus', 'ogg', ogg_opus_duration
+        ),
+        AudioFormat(
+            'webm-opus', speechsdk.SpeechSynthesisOutputFormat.Webm16Khz16BitMonoOpus,
+            'webm-16khz-16bit-mono-opus', 'audio/webm; codecs=opus', 'webm', webm_duration
+        ),
+    )
+}
+DEFAULT_AUDIO_FORMAT = 'mp3'
+
+
+def get_audio_format(name=None, allowed=None):
+    """
+    The AudioFormat called `name` (the default if None). Raises ValueError for
+    unknown formats and ones not in `allowed`.
+    """
+    name = name or DEFAULT_AUDIO_FORMAT
+    if name not in AUDIO_FORMATS or (allowed is not None and name not in allowed and name != DEFAULT_AUDIO_FORMAT):
+        raise ValueError(f"Unsupported audio format: {name}")
+    return AUDIO_FORMATS[name]
+
+
+def negotiate(accept=None, requested=None, allowed=None):
+    """
+    Pick the narration format for a request: an explicit `format` parameter
+    wins, then the best audio type in the Accept header. Wildcards and
+    anything we can't serve fall back to the default (MP3 plays everywhere).
+    """
+    if requested:
+        return get_audio_format(requested, allowed)
+    candidates = [
+        audio_format for name, audio_format in AUDIO_FORMATS.items()
+        if allowed is None or name in allowed or name == DEFAULT_AUDIO_FORMAT
+    ]
+    best, best_quality = None, 0.0
+    for item in (accept or '').split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        for audio_format in candidates:
+            if media_type.lower() == audio_format.mime_type and quality > best_quality:
+                best, best_quality = audio_format, quality
+    return best or AUDIO_FORMATS[DEFAULT_AUDIO_FORMAT]
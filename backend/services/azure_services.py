@@ -1,16 +1,44 @@
 import openai
 import azure.cognitiveservices.speech as speechsdk
 import os
+import time
+import queue
+import threading
+import uuid
+from xml.sax.saxutils import escape
 from config.config import Config
-from openai import AzureOpenAI
-from services.blob_storage import BlobStorageService
+from services.storage_backend import create_storage_backend
+from services.rate_limiter import UpstreamRateLimiter, ThrottledError
+from services.openai_router import DeploymentRouter
+from services.speech_chunks import synthesize_chunks
+from services.speech_pool import SynthesizerPool
+from services.audio_formats import get_audio_format
+from services.http_clients import HttpClients
+from services.image_variants import ImageVariants, IMAGE_FORMATS
+from services.audio_cache import blob_name_from_url
+from services.story_pipeline import PLACEHOLDER_IMAGE_URL
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+def speech_throttled(result):
+    """
+    A ThrottledError if Speech canceled the synthesis because we sent too many
+    requests, so UpstreamRateLimiter.call backs off and retries it, else None.
+    The SDK does not pass on Retry-After, so the limiter's backoff applies.
+    """
+    if result is None or result.reason != speechsdk.ResultReason.Canceled:
+        return None
+    details = result.cancellation_details
+    if details.error_code != speechsdk.CancellationErrorCode.TooManyRequests:
+        return None
+    return ThrottledError(f"Speech synthesis throttled: {details.error_details}", retry_after=None)
+
+
 class AzureServices:
-    def __init__(self):
-        # Initialize Blob Storage
+    def __init__(self, storage=None):
+        # Blob Storage, or whichever backend STORAGE_BACKEND selects
         self.config = Config()
-        self.blob_storage = BlobStorageService()
+        self.blob_storage = storage or create_storage_backend(self.config)
         
         # GPT (text) configuration
         self.openai_api_key = os.getenv("AZURE_OPENAI_API_KEY")
@@ -18,22 +46,35 @@ class AzureServices:
         self.openai_deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
         self.openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
         
-        # Initialize Azure OpenAI client for text generation
-        self.text_client = AzureOpenAI(
-            api_key=self.openai_api_key,
-            api_version=self.openai_api_version,
-            azure_endpoint=self.openai_endpoint
-        )
+        # Story generation settings (also part of the generation cache key)
+        self.story_max_tokens = 600
+        self.story_temperature = 0.8
+        
+        # Client-side rate limits shared by every AzureServices instance in the process.
+        # The limiter does the retrying, so the OpenAI clients must not retry on their own
+        self.rate_limiter = UpstreamRateLimiter.shared(self.config)
+        # Keep-alive connection pools per upstream, also shared by the whole process
+        self.http = HttpClients.shared(self.config)
+        
+        # GPT calls are routed across AZURE_OPENAI_DEPLOYMENTS (or the single
+        # deployment above), with failover, circuit breakers and optional hedging
+        self.text_router = DeploymentRouter.shared(self.config)
         
         # Speech Services configuration
         self.speech_key = os.getenv("AZURE_SPEECH_KEY")
         self.speech_region = os.getenv("AZURE_SPEECH_REGION")
-        self.speech_config = speechsdk.SpeechConfig(
-            subscription=self.speech_key,
-            region=self.speech_region
-        )
-        # Set speech synthesis voice
-        self.speech_config.speech_synthesis_voice_name = "en-US-JennyNeural"
+        # Default voice; requests may pick another one from SPEECH_VOICES
+        self.speech_voice = self.config.AZURE_SPEECH_VOICE
+        # Optional REST endpoint (e.g. https://eastus.tts.speech.microsoft.com) used instead of
+        # the SDK's websocket connection, which also lets us point Speech at a local fake server
+        self.speech_endpoint = os.getenv("AZURE_SPEECH_ENDPOINT")
+        # MP3 by default for browser compatibility; clients may negotiate Opus (SPEECH_AUDIO_FORMATS)
+        self.audio_format = get_audio_format()
+        # SDK synthesizers are pooled per (voice, format) with their connections
+        # already open, instead of being built for every call
+        self.speech_pool = SynthesizerPool.shared(self.config)
+        if not self.speech_endpoint:
+            self.speech_pool.warm_in_background(self.speech_voice, self.audio_format.sdk_format, self.config.SPEECH_POOL_WARM)
         
         # Initialize container names from config
         self.container_names = {
@@ -48,6 +89,16 @@ class AzureServices:
         self.dalle_deployment_name = os.getenv("AZURE_DALLE_DEPLOYMENT_NAME")
         self.dalle_api_version = os.getenv("AZURE_DALLE_API_VERSION")
         self.dalle_model = self.dalle_deployment_name  # Use deployment name as model
+        self.illustration_size = "1024x1024"
+        # Thumbnails and WebP/AVIF copies of saved illustrations for the library grid
+        self.image_variants = ImageVariants.shared(self.config)
+        self.dalle_client = openai.AzureOpenAI(
+            api_key=self.dalle_api_key,
+            api_version=self.dalle_api_version,
+            azure_endpoint=self.dalle_endpoint,
+            max_retries=0,
+            http_client=self.http.client('dalle')
+        )
         
         # Debug prints for env vars (mask sensitive parts)
         print("[AzureServices] AZURE_OPENAI_API_KEY:", (self.openai_api_key[:4] + "..." + self.openai_api_key[-4:]) if self.openai_api_key else None)
@@ -61,20 +112,33 @@ class AzureServices:
         print("[AzureServices] AZURE_SPEECH_KEY:", (self.speech_key[:4] + "..." + self.speech_key[-4:]) if self.speech_key else None)
         print("[AzureServices] AZURE_SPEECH_REGION:", self.speech_region)
 
+    def _story_messages(self, theme, characters, age_group):
+        prompt = f"Write a children's story for the following theme: {theme}. Characters: {', '.join(characters)}. Age group: {age_group}. Make it fun, imaginative, and age-appropriate."
+        print(f"[GPT] Generating story with prompt: {prompt}")
+        return [{"role": "system", "content": "You are a creative children's storyteller."},
+                {"role": "user", "content": prompt}]
+
+    def _estimate_tokens(self, messages):
+        # Roughly 4 characters per token for the prompt, plus the completion budget
+        return sum(len(message['content']) for message in messages) // 4 + self.story_max_tokens
+
     def generate_story(self, theme, characters, age_group):
         """
         Generate a story using GPT based on the provided theme, characters, and age group.
         """
         try:
-            prompt = f"Write a children's story for the following theme: {theme}. Characters: {', '.join(characters)}. Age group: {age_group}. Make it fun, imaginative, and age-appropriate."
-            print(f"[GPT] Generating story with prompt: {prompt}")
-            response = self.text_client.chat.completions.create(
-                model=self.openai_deployment_name,
-                messages=[{"role": "system", "content": "You are a creative children's storyteller."},
-                          {"role": "user", "content": prompt}],
-                max_tokens=600,
-                temperature=0.8
-            )
+            messages = self._story_messages(theme, characters, age_group)
+            estimated_tokens = self._estimate_tokens(messages)
+            cost = {'requests': 1, 'tokens': estimated_tokens}
+            # Failover and hedged attempts are extra upstream requests, so each pays for itself
+            response = self.rate_limiter.call('gpt', lambda: self.text_router.chat_completion(
+                charge=lambda wait: self.rate_limiter.acquire('gpt', cost, wait=wait),
+                messages=messages,
+                max_tokens=self.story_max_tokens,
+                temperature=self.story_temperature
+            ), cost=cost)
+            if getattr(response, 'usage', None):
+                self.rate_limiter.refund('gpt', 'tokens', estimated_tokens - response.usage.total_tokens)
             story_content = response.choices[0].message.content
             print(f"[GPT] Story generated successfully.")
             return story_content
@@ -82,13 +146,55 @@ class AzureServices:
             print(f"[GPT ERROR] Failed to generate story: {str(e)}")
             raise Exception(f"Error generating story: {str(e)}")
 
+    def stream_story(self, theme, characters, age_group):
+        """
+        Generate a story like generate_story, yielding text deltas as GPT produces them.
+        """
+        try:
+            start = time.perf_counter()
+            messages = self._story_messages(theme, characters, age_group)
+            # Streams fail over but are never hedged: the first deployment to answer owns the stream
+            cost = {'requests': 1, 'tokens': self._estimate_tokens(messages)}
+            response = self.rate_limiter.call('gpt', lambda: self.text_router.chat_completion(
+                charge=lambda wait: self.rate_limiter.acquire('gpt', cost, wait=wait),
+                messages=messages,
+                max_tokens=self.story_max_tokens,
+                temperature=self.story_temperature,
+                stream=True
+            ), cost=cost)
+            first_token = True
+            for chunk in response:
+                # Azure sends content filter results in chunks without choices
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token:
+                    print(f"[GPT] First token after {time.perf_counter() - start:.2f}s")
+                    first_token = False
+                yield delta
+            print(f"[GPT] Story streamed successfully in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            print(f"[GPT ERROR] Failed to stream story: {str(e)}")
+            raise Exception(f"Error generating story: {str(e)}")
+
     def generate_illustration(self, title, theme, characters, age_group):
         """
         Generate an illustration using DALL-E
         """
+        return self.generate_illustrations(title, theme, characters, age_group)[0]
+
+    def generate_illustrations(self, title, theme, characters, age_group, count=1):
+        """
+        Generate `count` candidate illustrations using DALL-E. Up to
+        DALLE_IMAGES_PER_CALL of them come from a single request; DALL-E 3
+        only accepts n=1, so with the default of 1 each candidate is a
+        separate request, made in parallel.
+        """
         try:
             import sys
-            print(f"[DALLE] Starting illustration generation for title: '{title}'", file=sys.stderr)
+            print(f"[DALLE] Starting generation of {count} illustration(s) for title: '{title}'", file=sys.stderr)
             print(f"[DALLE] Using API key: {self.dalle_api_key[:4]}...{self.dalle_api_key[-4:] if self.dalle_api_key else None}", file=sys.stderr)
             print(f"[DALLE] Using endpoint: {self.dalle_endpoint}", file=sys.stderr)
             print(f"[DALLE] Using deployment: {self.dalle_deployment_name}", file=sys.stderr)
@@ -102,27 +208,28 @@ class AzureServices:
             
             print(f"[DALLE] Using prompt: \n{prompt}")
 
-            # Initialize DALL-E client
-            client = openai.AzureOpenAI(
-                api_key=self.dalle_api_key,
-                api_version=self.dalle_api_version,
-                azure_endpoint=self.dalle_endpoint
-            )
-
-            # Generate image
-            response = client.images.generate(
-                model=self.dalle_model,
-                prompt=prompt,
-                n=1,
-                size="1024x1024",
-                response_format="url"
-            )
+            def generate(n):
+                response = self.rate_limiter.call('dalle', lambda: self.dalle_client.images.generate(
+                    model=self.dalle_model,
+                    prompt=prompt,
+                    n=n,
+                    size=self.illustration_size,
+                    response_format="url"
+                ), cost={'images': n})
+                return [image.url for image in response.data]
 
-            # Get image URL
-            image_url = response.data[0].url
-            print(f"[DALLE] Successfully generated image URL: {image_url}")
+            per_call = max(1, self.config.DALLE_IMAGES_PER_CALL)
+            batches = [min(per_call, count - first) for first in range(0, count, per_call)]
+            if len(batches) == 1:
+                image_urls = generate(batches[0])
+            else:
+                with ThreadPoolExecutor(max_workers=len(batches), thread_name_prefix='dalle') as executor:
+                    image_urls = [url for urls in executor.map(generate, batches) for url in urls]
+            if not image_urls:
+                raise ValueError("DALL-E returned no images")
+            print(f"[DALLE] Successfully generated {len(image_urls)} image URL(s): {image_urls[0]}")
 
-            return image_url
+            return image_urls
 
         except Exception as e:
             print(f"[DALLE ERROR] Failed to generate illustration: {str(e)}")
@@ -137,15 +244,10 @@ class AzureServices:
             content_bytes = story_content.encode('utf-8')
             
             # Generate a unique filename
-            filename = f"story_{title.replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.txt"
+            filename = self._story_filename(title)
             
             # Upload to blob storage
-            url = self.blob_storage.upload_blob(
-                self.container_names['stories'],
-                filename,
-                content_bytes,
-                content_type='text/plain'
-            )
+            url = self._save_blob(self.container_names['stories'], filename, content_bytes, 'text/plain')
             
             print(f"Successfully saved story content to: {url}")
             return url
@@ -156,18 +258,36 @@ class AzureServices:
             print(traceback.format_exc())
             raise
 
-    def save_audio(self, audio_data, title):
+    def _save_blob(self, container, filename, data, content_type):
+        """
+        Upload under the content's SHA-256 (BLOB_CONTENT_ADDRESSING), skipping
+        the upload when that blob already exists, or else under `filename`
+        """
+        if self.config.BLOB_CONTENT_ADDRESSING:
+            return self.blob_storage.upload_content(container, data, filename.rsplit('.', 1)[-1], content_type)
+        return self.blob_storage.upload_blob(container, filename, data, content_type=content_type)
+
+    def _story_filename(self, title):
+        return f"story_{title.replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.txt"
+
+    def _image_filename(self, title):
+        # The suffix keeps candidates saved in the same second apart
+        return f"{title.replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.png"
+
+    def _audio_filename(self, title, audio_format):
+        # As for images, the suffix keeps streams of the same title started in the same second apart
+        return (f"{title.replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+                f".{audio_format.extension}")
+
+    def save_audio(self, audio_data, title, audio_format=None):
         """
         Save audio to Azure Blob Storage with proper SAS token handling
         """
         try:
-            # Use MP3 extension and content type for better browser compatibility
-            filename = f"{title.replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp3"
-            url = self.blob_storage.upload_blob(
-                self.container_names['audio'],
-                filename,
-                audio_data,
-                content_type='audio/mpeg'
+            audio_format = self.speech_audio_format(audio_format)
+            url = self._save_blob(
+                self.container_names['audio'], self._audio_filename(title, audio_format), audio_data,
+                audio_format.content_type
             )
             print(f"Successfully saved audio to: {url}")
             return url
@@ -183,24 +303,15 @@ class AzureServices:
         Save image to Azure Blob Storage with proper SAS token handling
         """
         try:
-            # Ensure image data is in bytes
-            if isinstance(image_data, str):
-                # If it's a URL, download the image
-                import requests
-                from io import BytesIO
-                response = requests.get(image_data)
-                image_data = BytesIO(response.content).getvalue()
-            
             # Generate a unique filename
-            filename = f"{title.replace(' ', '_')}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.png"
+            filename = self._image_filename(title)
+
+            # A URL (fresh from DALL-E) is piped straight into the blob
+            if isinstance(image_data, str):
+                return self._stream_image(image_data, filename)
             
             # Upload to blob storage
-            url = self.blob_storage.upload_blob(
-                self.container_names['images'],
-                filename,
-                image_data,
-                content_type='image/png'
-            )
+            url = self._save_blob(self.container_names['images'], filename, image_data, 'image/png')
             
             print(f"Successfully saved image to: {url}")
             return url
@@ -211,39 +322,291 @@ class AzureServices:
             print(traceback.format_exc())
             raise
 
-    def text_to_speech(self, text):
+    def _stream_image(self, image_url, filename):
         """
-        Convert text to speech using Azure Speech Services
+        Download an image and upload it as a block blob at the same time: each
+        IMAGE_STREAM_BLOCK_SIZE bytes received are staged as a block while the
+        rest is still downloading, so only a few blocks are ever in memory
         """
-        try:
-            # Set output format to MP3 for better browser compatibility
-            self.speech_config.set_speech_synthesis_output_format(
-                speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3
+        container = self.container_names['images']
+        block_size = self.config.IMAGE_STREAM_BLOCK_SIZE
+        with self.http.client('images').stream('GET', image_url) as response:
+            response.raise_for_status()
+            length = int(response.headers.get('content-length') or 0)
+            if 0 < length <= block_size:
+                # Fits in one block: a single Put Blob is cheaper than block + commit
+                url = self.blob_storage.upload_blob(container, filename, response.read(), content_type='image/png')
+                print(f"Successfully saved image to: {url}")
+                return url
+            upload = self.blob_storage.start_staged_upload(
+                container, filename, content_type='image/png', block_size=block_size
             )
-            
-            # Create audio configuration for file output
-            temp_filename = f"temp_audio_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp3"
-            audio_config = speechsdk.audio.AudioOutputConfig(filename=temp_filename)
-            
-            # Create speech synthesizer
-            synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=self.speech_config,
-                audio_config=audio_config
+            try:
+                for chunk in response.iter_bytes(chunk_size=64 * 1024):
+                    upload.write(chunk)
+                url = upload.commit()
+            except Exception:
+                upload.abort()
+                raise
+        print(f"Successfully streamed image to: {url}")
+        return url
+
+    def create_image_variants(self, image_url):
+        """
+        Render thumbnails and WebP/AVIF copies of a saved illustration and
+        upload them next to it (Title_..._256.webp). Returns a list of
+        {width, height, format, contentType, bytes, url}, or None when variants
+        are disabled or the story only has the placeholder image.
+        """
+        if not self.image_variants.enabled or not image_url or image_url == PLACEHOLDER_IMAGE_URL:
+            return None
+        # Read back through the storage backend: a local backend's URLs point at this app
+        original = self.blob_storage.read_blob(self.container_names['images'], blob_name_from_url(image_url))
+        base = blob_name_from_url(image_url).rsplit('.', 1)[0]
+        variants = []
+        for width, height, name, data in self.image_variants.render(original):
+            image_format = IMAGE_FORMATS[name]
+            url = self._save_blob(
+                self.container_names['images'],
+                f"{base}_{width}.{image_format['extension']}",
+                data,
+                image_format['content_type']
             )
-            
-            # Synthesize speech
-            result = synthesizer.speak_text_async(text).get()
+            variants.append({
+                'width': width,
+                'height': height,
+                'format': name,
+                'contentType': image_format['content_type'],
+                'bytes': len(data),
+                'url': url
+            })
+        print(f"Saved {len(variants)} image variants for {base} ({len(original)} byte original)")
+        return variants
+
+    def _speech_voice(self, voice=None):
+        """
+        The voice to narrate with: the requested one if it is allowed, otherwise the default
+        """
+        voice = voice or self.speech_voice
+        if voice != self.speech_voice and voice not in self.config.SPEECH_VOICES:
+            raise ValueError(f"Unsupported voice: {voice}")
+        return voice
+
+    def speech_audio_format(self, audio_format=None):
+        """
+        The AudioFormat for a format name (or AudioFormat), if it is one of SPEECH_AUDIO_FORMATS
+        """
+        if audio_format is None:
+            return self.audio_format
+        if not isinstance(audio_format, str):
+            audio_format = audio_format.name
+        return get_audio_format(audio_format, self.config.SPEECH_AUDIO_FORMATS)
+
+    def _rest_speech_request(self, text, voice, audio_format, stream=False):
+        """
+        POST text to the Speech REST API at AZURE_SPEECH_ENDPOINT, through the rate limiter
+        """
+        language = '-'.join(voice.split('-')[:2])
+        ssml = (
+            f"<speak version='1.0' xml:lang='{escape(language)}'>"
+            f"<voice name='{escape(voice)}'>{escape(text)}</voice>"
+            "</speak>"
+        )
+
+        client = self.http.client('speech')
+
+        def synthesize():
+            request = client.build_request(
+                'POST',
+                f"{self.speech_endpoint.rstrip('/')}/cognitiveservices/v1",
+                content=ssml.encode('utf-8'),
+                headers={
+                    'Ocp-Apim-Subscription-Key': self.speech_key,
+                    'Content-Type': 'application/ssml+xml',
+                    'X-Microsoft-OutputFormat': audio_format.rest_name,
+                    'User-Agent': 'ai-storyteller'
+                }
+            )
+            response = client.send(request, stream=stream)
+            if response.is_error:
+                response.close()
+            # 429s surface as HTTPStatusError, which the rate limiter retries
+            response.raise_for_status()
+            return response
+
+        return self.rate_limiter.call('speech', synthesize, cost={'characters': len(text)})
+
+    def _rest_text_to_speech(self, text, voice, audio_format):
+        """
+        Convert text to speech with the Speech REST API at AZURE_SPEECH_ENDPOINT
+        """
+        audio_data = self._rest_speech_request(text, voice, audio_format).content
+        print("Speech synthesis completed successfully")
+        return audio_data
+
+    def stream_speech(self, text, voice=None, audio_format=None):
+        """
+        Convert text to speech, yielding audio bytes as soon as the service produces them
+        """
+        voice = self._speech_voice(voice)
+        audio_format = self.speech_audio_format(audio_format)
+        if self.speech_endpoint:
+            response = self._rest_speech_request(text, voice, audio_format, stream=True)
+            try:
+                for chunk in response.iter_bytes(chunk_size=16 * 1024):
+                    yield chunk
+            finally:
+                response.close()
+            print("Speech synthesis streamed successfully")
+            return
+
+        chunks = queue.Queue()
+        outcome = {}
+
+        def synthesize():
+            streamed = []
+
+            def on_synthesizing(event):
+                streamed.append(True)
+                chunks.put(bytes(event.result.audio_data))
+
+            # A pooled synthesizer has no audio output; each synthesizing event carries the next piece
+            with self.speech_pool.synthesizer(voice, audio_format.sdk_format) as pooled:
+                pooled.synthesizer.synthesizing.connect(on_synthesizing)
+                result = pooled.synthesizer.speak_text_async(text).get()
+                throttled = speech_throttled(result)
+                if result.reason == speechsdk.ResultReason.Canceled and throttled is None:
+                    pooled.healthy = False
+            # Retrying restarts the narration, so only when none of it reached the listener yet
+            if throttled is not None and not streamed:
+                raise throttled
+            return result
+
+        def run():
+            try:
+                outcome['result'] = self.rate_limiter.call('speech', synthesize, cost={'characters': len(text)})
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                chunks.put(None)
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+
+        if 'error' in outcome:
+            raise outcome['error']
+        result = outcome.get('result')
+        throttled = speech_throttled(result)
+        if throttled is not None:
+            raise throttled
+        if result is None or result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+            reason = result.reason if result is not None else 'no result'
+            if result is not None and result.reason == speechsdk.ResultReason.Canceled:
+                print(f"Speech synthesis canceled: {result.cancellation_details.error_details}")
+            raise Exception(f"Speech synthesis failed: {reason}")
+        print("Speech synthesis streamed successfully")
+
+    def stream_audio(self, text, title, on_saved=None, voice=None, audio_format=None):
+        """
+        Stream narration while saving the same bytes to blob storage. Returns
+        (audio URL, iterator of audio chunks); the upload is committed in the
+        background once synthesis finishes, even if the client stops listening,
+        and then on_saved(url, size, duration in seconds) is called.
+        """
+        audio_format = self.speech_audio_format(audio_format)
+        filename = self._audio_filename(title, audio_format)
+        upload = self.blob_storage.start_staged_upload(
+            self.container_names['audio'], filename, content_type=audio_format.content_type
+        )
+        audio_url = self.blob_storage.signed_url(self.container_names['audio'], filename)
+        audio = self.stream_speech(text, voice, audio_format)
+        # Kept to measure the duration once the whole file is there
+        received = bytearray()
+
+        def finish(drain):
+            try:
+                if drain:
+                    for chunk in audio:
+                        received.extend(chunk)
+                        upload.write(chunk)
+                upload.commit()
+                print(f"Successfully saved streamed audio to: {audio_url}")
+                if on_saved is not None:
+                    on_saved(audio_url, upload.size, audio_format.duration(bytes(received)))
+            except Exception as e:
+                upload.abort()
+                print(f"Error saving streamed audio: {str(e)}")
+
+        def tee():
+            try:
+                for chunk in audio:
+                    received.extend(chunk)
+                    upload.write(chunk)
+                    yield chunk
+            except GeneratorExit:
+                # The client went away: finish synthesis and the upload without it
+                threading.Thread(target=finish, args=(True,), daemon=True).start()
+                raise
+            except Exception:
+                upload.abort()
+                raise
+            threading.Thread(target=finish, args=(False,), daemon=True).start()
+
+        return audio_url, tee()
+
+    def text_to_speech(self, text, voice=None, audio_format=None):
+        """
+        Convert text to speech using Azure Speech Services. Long MP3 narration is
+        split into chunks that are synthesized in parallel and joined frame by
+        frame; Ogg and WebM files can't be joined that way, so they are one call.
+        """
+        audio_format = self.speech_audio_format(audio_format)
+        if (self.config.SPEECH_CHUNKED and audio_format.concatenable
+                and len(text) > self.config.SPEECH_CHUNK_CHARS):
+            audio_data, _ = synthesize_chunks(
+                lambda chunk: self.synthesize_speech(chunk, voice, audio_format),
+                text,
+                max_chars=self.config.SPEECH_CHUNK_CHARS,
+                max_workers=self.config.SPEECH_CHUNK_WORKERS,
+                max_attempts=self.config.SPEECH_CHUNK_ATTEMPTS
+            )
+            return audio_data
+        return self.synthesize_speech(text, voice, audio_format)
+
+    def synthesize_speech(self, text, voice=None, audio_format=None):
+        """
+        Convert text to speech in a single Speech call
+        """
+        try:
+            voice = self._speech_voice(voice)
+            audio_format = self.speech_audio_format(audio_format)
+            if self.speech_endpoint:
+                return self._rest_text_to_speech(text, voice, audio_format)
+
+            # Pooled synthesizers have no audio output config: the synthesized audio
+            # stays in memory as result.audio_data instead of going through a temp file
+            def synthesize():
+                with self.speech_pool.synthesizer(voice, audio_format.sdk_format) as pooled:
+                    result = pooled.synthesizer.speak_text_async(text).get()
+                    throttled = speech_throttled(result)
+                    if result.reason == speechsdk.ResultReason.Canceled and throttled is None:
+                        # May be a broken connection: don't hand this synthesizer out again
+                        pooled.healthy = False
+                if throttled is not None:
+                    raise throttled
+                return result
+            result = self.rate_limiter.call('speech', synthesize, cost={'characters': len(text)})
             
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
                 print("Speech synthesis completed successfully")
-                # Read the file data
-                with open(temp_filename, 'rb') as audio_file:
-                    audio_data = audio_file.read()
-                # Clean up the temporary file
-                import os
-                os.remove(temp_filename)
-                return audio_data
+                return result.audio_data
             else:
+                if result.reason == speechsdk.ResultReason.Canceled:
+                    print(f"Speech synthesis canceled: {result.cancellation_details.error_details}")
                 print(f"Speech synthesis failed: {result.reason}")
                 raise Exception(f"Speech synthesis failed: {result.reason}")
                 
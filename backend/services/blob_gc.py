@@ -0,0 +1,279 @@
+import sys
+import json
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+class BlobCollector:
+    """
+    Deletes stored media that no story points at any more.
+
+    When a story is deleted its blobs are handed to a 'blob_gc' background
+    job, which deletes the ones whose blob_ref count is now zero (content-
+    addressed blobs may still be shared by other stories) with Blob Batch
+    requests of up to GC_BATCH_SIZE deletes. A sweep pages through each
+    container with List Blobs and deletes the blobs that no story or
+    warm-pool story row, blob_ref count or audio cache entry references:
+    swapped-out illustrations, unchosen candidates, uploads of failed jobs
+    and blobs from before reference counting.
+
+    Both only delete blobs not modified recently, as a condition of the
+    delete request itself. That keeps blobs a pipeline has uploaded, or
+    reused and touched (upload_contents, cached illustrations), for a story
+    that is not committed yet. A delete job only needs to wait out such a
+    pipeline (GC_PENDING_SECONDS), since its blobs are already known to be
+    released; a sweep finds blobs nobody released, so it waits for
+    GC_GRACE_SECONDS. Blobs a delete job kept are left to a later sweep.
+
+    Sweeps run every GC_SWEEP_INTERVAL_SECONDS on a background thread in
+    each worker, or from `flask gc-blobs` (e.g. in cron) with the thread off.
+    GC_DRY_RUN (or --dry-run) only counts and logs what would be deleted.
+    """
+    def __init__(self, app=None, job_queue=None, registry=None):
+        self.app = None
+        self._stats = {
+            'deleteJobs': 0, 'sweeps': 0, 'listed': 0, 'listSeconds': 0.0, 'candidates': 0,
+            'deleted': 0, 'missing': 0, 'failed': 0, 'recentlyUsed': 0, 'wouldDelete': 0, 'wouldFreeBytes': 0,
+            'batches': 0, 'bytesFreed': 0, 'deleteSeconds': 0.0
+        }
+        self._last_sweep = None
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stopping = threading.Event()
+        if app is not None:
+            self.init_app(app, job_queue, registry)
+
+    def init_app(self, app, job_queue, registry):
+        self.app = app
+        self.job_queue = job_queue
+        self.registry = registry
+        self.on_delete = app.config.get('GC_ON_DELETE', True)
+        self.batch_size = max(1, min(app.config.get('GC_BATCH_SIZE', 256), 256))
+        self.page_size = app.config.get('GC_PAGE_SIZE', 1000)
+        self.grace_seconds = app.config.get('GC_GRACE_SECONDS', 24 * 3600)
+        self.pending_seconds = app.config.get('GC_PENDING_SECONDS', 900)
+        self.dry_run = app.config.get('GC_DRY_RUN', False)
+        self.sweep_interval = app.config.get('GC_SWEEP_INTERVAL_SECONDS', 0)
+        self.containers = [
+            app.config.get('AZURE_STORAGE_CONTAINER_STORIES', 'stories'),
+            app.config.get('AZURE_STORAGE_CONTAINER_AUDIO', 'audio'),
+            app.config.get('AZURE_STORAGE_CONTAINER_IMAGES', 'images')
+        ]
+        job_queue.register_handler('blob_gc', self._run_delete_job)
+        app.extensions['blob_gc'] = self
+
+        if self.sweep_interval > 0:
+            # Like the job workers, start with the first request rather than in scripts
+            @app.before_request
+            def _start_blob_sweeper():
+                self.start_sweeper()
+
+    def release(self, blobs):
+        """
+        Queue the (container, name) blobs of a deleted story for deletion.
+        Called after the delete is committed; the sweeper catches anything
+        this misses.
+        """
+        if not self.on_delete or not blobs:
+            return None
+        try:
+            return self.job_queue.enqueue('blob_gc', {'blobs': [list(blob) for blob in sorted(set(blobs))]})
+        except Exception as e:
+            print(f"[BLOB GC ERROR] Failed to queue {len(blobs)} blobs: {str(e)}", file=sys.stderr)
+            return None
+
+    def _run_delete_job(self, queue, job, services):
+        payload = json.loads(job.payload)
+        result = self.collect([tuple(blob) for blob in payload['blobs']], dry_run=payload.get('dryRun'))
+        job.result = json.dumps(result)
+
+    def collect(self, blobs, dry_run=None):
+        """
+        Delete those of the (container, name) blobs nothing references any
+        more and that no pending pipeline touched within GC_PENDING_SECONDS
+        """
+        dry_run = self.dry_run if dry_run is None else dry_run
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.pending_seconds)
+        by_container = {}
+        for container, name in blobs:
+            by_container.setdefault(container, set()).add(name)
+        protected = self._protected()
+        result = self._empty_result(dry_run)
+        for container, names in by_container.items():
+            orphans = sorted(self._unreferenced(container, names, protected))
+            result['candidates'] += len(orphans)
+            self._delete(container, orphans, result, dry_run, cutoff)
+        with self._lock:
+            self._stats['deleteJobs'] += 1
+            self._add(result)
+        print(f"[BLOB GC] {self._describe(result)}", file=sys.stderr)
+        return result
+
+    def sweep(self, grace_seconds=None, dry_run=None):
+        """
+        Page through every container and delete unreferenced blobs older than
+        the grace period. Returns counts and timings for the sweep.
+        """
+        dry_run = self.dry_run if dry_run is None else dry_run
+        grace_seconds = self.grace_seconds if grace_seconds is None else grace_seconds
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+        storage = self.registry.storage
+        protected = self._protected() | self._story_blobs()
+        result = {**self._empty_result(dry_run), 'listed': 0, 'listSeconds': 0.0, 'graceSeconds': grace_seconds}
+        start = time.perf_counter()
+        for container in self.containers:
+            pages = storage.list_blob_pages(container, page_size=self.page_size)
+            while True:
+                list_start = time.perf_counter()
+                page = next(pages, None)
+                result['listSeconds'] += time.perf_counter() - list_start
+                if page is None:
+                    break
+                result['listed'] += len(page)
+                old = {blob.name: blob for blob in page if blob.last_modified <= cutoff}
+                orphans = sorted(self._unreferenced(container, old, protected))
+                result['candidates'] += len(orphans)
+                sizes = {name: old[name].size for name in orphans}
+                self._delete(container, orphans, result, dry_run, cutoff, sizes=sizes)
+        result['seconds'] = time.perf_counter() - start
+        result['listedPerSecond'] = result['listed'] / result['listSeconds'] if result['listSeconds'] else None
+        result['finishedAt'] = datetime.utcnow().isoformat()
+        with self._lock:
+            self._stats['sweeps'] += 1
+            self._stats['listed'] += result['listed']
+            self._stats['listSeconds'] += result['listSeconds']
+            self._add(result)
+            self._last_sweep = result
+        print(f"[BLOB GC] Sweep listed {result['listed']} blobs in {result['seconds']:.2f}s: "
+              f"{self._describe(result)}", file=sys.stderr)
+        return result
+
+    def _protected(self):
+        """
+        Audio blobs the narration cache may still hand out without a story
+        """
+        audio_cache = self.registry.audio_cache
+        return {(self.containers[1], name) for name in audio_cache.blob_names()} if audio_cache is not None else set()
+
+    def _story_blobs(self):
+        """
+        Every blob the story and warm_story rows point at right now. The sweep
+        checks these as well as blob_ref, so a count that drifted (e.g. rows
+        written around the ORM) can never cost a live story its media.
+        """
+        from extensions import db
+        from models.models import Story, WarmStory, BLOB_URL_COLUMNS, referenced_blobs
+
+        columns = (*BLOB_URL_COLUMNS, 'image_variants')
+        blobs = set()
+        for model in (Story, WarmStory):
+            rows = db.session.query(*(getattr(model, column) for column in columns)).yield_per(1000)
+            for row in rows:
+                blobs.update(referenced_blobs(**dict(zip(columns, row))))
+        db.session.commit()
+        return blobs
+
+    def _unreferenced(self, container, names, protected):
+        from extensions import db
+        from models.models import BlobRef
+
+        names = [name for name in names if (container, name) not in protected]
+        referenced = set()
+        # Chunked to stay under the database's bound parameter limit
+        for offset in range(0, len(names), 500):
+            chunk = names[offset:offset + 500]
+            referenced.update(name for (name,) in db.session.query(BlobRef.name).filter(
+                BlobRef.container == container, BlobRef.name.in_(chunk), BlobRef.refcount > 0
+            ))
+        db.session.commit()
+        return [name for name in names if name not in referenced]
+
+    def _delete(self, container, names, result, dry_run, cutoff, sizes=None):
+        from extensions import db
+        from models.models import BlobRef
+
+        if dry_run:
+            result['wouldDelete'] += len(names)
+            result['wouldFreeBytes'] += sum((sizes or {}).get(name) or 0 for name in names)
+            for name in names[:20]:
+                print(f"[BLOB GC] Would delete {container}/{name}", file=sys.stderr)
+            return
+        storage = self.registry.storage
+        for offset in range(0, len(names), self.batch_size):
+            batch = names[offset:offset + self.batch_size]
+            start = time.perf_counter()
+            try:
+                # Conditional, so a blob uploaded or touched since it was checked is kept
+                deleted, missing, failed, modified = storage.delete_blobs(container, batch, unmodified_since=cutoff)
+            except Exception as e:
+                print(f"[BLOB GC ERROR] Batch delete of {len(batch)} blobs in {container} failed: {str(e)}",
+                      file=sys.stderr)
+                deleted, missing, failed, modified = [], [], batch, []
+            result['deleteSeconds'] += time.perf_counter() - start
+            result['batches'] += 1
+            result['deleted'] += len(deleted)
+            result['missing'] += len(missing)
+            result['failed'] += len(failed)
+            result['recentlyUsed'] += len(modified)
+            result['bytesFreed'] += sum((sizes or {}).get(name) or 0 for name in deleted)
+            gone = deleted + missing
+            if gone:
+                # A story may have picked the blob up again since it was checked; keep its count then
+                BlobRef.query.filter(
+                    BlobRef.container == container, BlobRef.name.in_(gone), BlobRef.refcount == 0
+                ).delete(synchronize_session=False)
+                db.session.commit()
+
+    def _empty_result(self, dry_run):
+        return {
+            'dryRun': dry_run, 'candidates': 0, 'deleted': 0, 'missing': 0, 'failed': 0, 'recentlyUsed': 0,
+            'wouldDelete': 0, 'wouldFreeBytes': 0, 'batches': 0, 'bytesFreed': 0, 'deleteSeconds': 0.0
+        }
+
+    def _add(self, result):
+        for key in ('candidates', 'deleted', 'missing', 'failed', 'recentlyUsed', 'wouldDelete', 'wouldFreeBytes',
+                    'batches', 'bytesFreed', 'deleteSeconds'):
+            self._stats[key] += result[key]
+
+    def _describe(self, result):
+        if result['dryRun']:
+            return f"would delete {result['wouldDelete']} of {result['candidates']} unreferenced blobs (dry run)"
+        rate = result['deleted'] / result['deleteSeconds'] if result['deleteSeconds'] else 0
+        return (f"deleted {result['deleted']} blobs ({result['bytesFreed']} bytes) in {result['batches']} batches, "
+                f"{rate:.0f}/s; {result['missing']} already gone, {result['recentlyUsed']} recently used, "
+                f"{result['failed']} failed")
+
+    def start_sweeper(self):
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='blob-gc', daemon=True)
+            self._sweeper.start()
+        print(f"[BLOB GC] Sweeping every {self.sweep_interval}s", file=sys.stderr)
+
+    def _sweep_loop(self):
+        while not self._stopping.wait(self.sweep_interval):
+            try:
+                with self.app.app_context():
+                    self.sweep()
+            except Exception as e:
+                print(f"[BLOB GC ERROR] Sweep failed: {str(e)}", file=sys.stderr)
+
+    def stop(self):
+        self._stopping.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            last_sweep = dict(self._last_sweep) if self._last_sweep else None
+        stats['deletesPerSecond'] = stats['deleted'] / stats['deleteSeconds'] if stats['deleteSeconds'] else None
+        stats['listedPerSecond'] = stats['listed'] / stats['listSeconds'] if stats['listSeconds'] else None
+        return {
+            'dryRun': self.dry_run if self.app is not None else None,
+            'batchSize': getattr(self, 'batch_size', None),
+            'graceSeconds': getattr(self, 'grace_seconds', None),
+            'pendingSeconds': getattr(self, 'pending_seconds', None),
+            **stats,
+            'lastSweep': last_sweep
+        }
@@ -1,10 +1,84 @@
 import os
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient, generate_blob_sas, BlobSasPermissions
+from azure.storage.blob import BlobBlock, ContentSettings
+from azure.core.exceptions import ResourceNotFoundError
 from config.config import Config
+from services.async_blob_storage import AsyncBlobStorage
+from services.storage_backend import StorageBackend, BlobInfo
 from datetime import datetime, timedelta
 
-class BlobStorageService:
+class StagedBlobUpload:
+    """
+    Uploads a block blob from data that arrives in pieces: every `block_size`
+    bytes are staged as a block on a background thread while more data is
+    still arriving, and commit() writes the block list. Only about two blocks
+    per upload are held in memory.
+    """
+    def __init__(self, blob_client, content_type, block_size, url):
+        self.blob_client = blob_client
+        self.content_type = content_type
+        self.block_size = block_size
+        self._url = url
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._staging = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='blob-stage')
+        self.size = 0
+
+    def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.block_size:
+            # Copy the block out once, without an intermediate bytearray slice
+            with memoryview(self._buffer) as view:
+                block = bytes(view[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._stage(block)
+
+    def _stage(self, block):
+        block_id = base64.b64encode(f"{len(self._block_ids):08d}".encode()).decode()
+        self._block_ids.append(block_id)
+        self._staging.append(self._executor.submit(self.blob_client.stage_block, block_id, block))
+        # Don't let staging fall more than a block behind the writer, which
+        # bounds memory to about two blocks per upload
+        pending = [future for future in self._staging if not future.done()]
+        if len(pending) > 1:
+            pending[0].result()
+
+    def commit(self):
+        """
+        Stage what is left, commit the block list and return the blob's SAS URL
+        """
+        try:
+            if self._buffer or not self._block_ids:
+                self._stage(bytes(self._buffer))
+                self._buffer = bytearray()
+            for future in self._staging:
+                future.result()
+            self.blob_client.commit_block_list(
+                [BlobBlock(block_id=block_id) for block_id in self._block_ids],
+                content_settings=ContentSettings(content_type=self.content_type)
+            )
+        finally:
+            self._executor.shutdown(wait=False)
+        print(f"Committed {len(self._block_ids)} blocks ({self.size} bytes) to {self.blob_client.blob_name}")
+        return self._url()
+
+    def abort(self):
+        # Uncommitted blocks are discarded by the service after a week
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BlobStorageService(StorageBackend):
+    """
+    Storage on Azure Blob Storage (or the fake server / an emulator given by
+    AZURE_STORAGE_CONNECTION_STRING), with SAS-signed read URLs
+    """
     def __init__(self):
+        super().__init__()
         self.config = Config()
         self.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
         
@@ -12,17 +86,40 @@ class BlobStorageService:
         if self.connection_string:
             self.account_name = self.connection_string.split("AccountName=")[1].split(";")[0]
             self.account_key = self.connection_string.split("AccountKey=")[1].split(";")[0]
+            # Emulators and the local fake server give an explicit endpoint
+            self.account_url = f"https://{self.account_name}.blob.core.windows.net"
+            if "BlobEndpoint=" in self.connection_string:
+                self.account_url = self.connection_string.split("BlobEndpoint=")[1].split(";")[0]
         else:
             raise ValueError("AZURE_STORAGE_CONNECTION_STRING environment variable is not set")
         
         # Initialize BlobServiceClient with account name and key
         self.blob_service_client = BlobServiceClient(
-            account_url=f"https://{self.account_name}.blob.core.windows.net",
-            credential=self.account_key
+            account_url=self.account_url,
+            credential=self.account_key,
+            max_block_size=self.config.BLOB_BLOCK_SIZE,
+            max_single_put_size=self.config.BLOB_SINGLE_PUT_SIZE
         )
+        # Uploads go through one aio client and event loop per process unless turned off
+        self.async_storage = None
+        if self.config.BLOB_ASYNC_UPLOADS:
+            self.async_storage = AsyncBlobStorage.shared(self.account_url, self.account_key, self.config)
         
-        # Create containers if they don't exist
-        self._initialize_containers()
+        # Containers are checked (and created if missing) before the first
+        # upload instead of here, so building the service does no network I/O
+        self._containers_ready = not self.config.BLOB_VERIFY_CONTAINERS
+        self._containers_lock = threading.Lock()
+
+    def ensure_containers(self, force=False):
+        """
+        Check the containers once per process (every time with `force`)
+        """
+        if self._containers_ready and not force:
+            return
+        with self._containers_lock:
+            if force or not self._containers_ready:
+                self._initialize_containers()
+                self._containers_ready = True
 
     def _initialize_containers(self):
         """
@@ -30,7 +127,7 @@ class BlobStorageService:
         """
         try:
             # Get or create containers
-            for container_name in ['stories', 'audio', 'images']:
+            for container_name in self.CONTAINERS:
                 container_client = self.blob_service_client.get_container_client(container_name)
                 if not container_client.exists():
                     container_client.create_container()
@@ -55,64 +152,77 @@ class BlobStorageService:
             print(f"Error initializing containers: {str(e)}")
             raise
 
+    def signed_url(self, container_name, blob_name):
+        """
+        Blob URL with a read-only SAS token valid for a year
+        """
+        blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+        print(f"Generating SAS token with: account_name={self.account_name}, container={container_name}, blob={blob_name}")
+        try:
+            # Always use generate_blob_sas from azure.storage.blob
+            sas_token = generate_blob_sas(
+                account_name=self.account_name,
+                container_name=container_name,
+                blob_name=blob_name,
+                account_key=self.account_key,
+                permission=BlobSasPermissions(read=True),
+                expiry=datetime.utcnow() + timedelta(days=365)
+            )
+            print(f"SAS token generated successfully: {sas_token[:10]}...")
+        except Exception as sas_error:
+            print(f"Error generating SAS token: {str(sas_error)}")
+            import traceback
+            print(traceback.format_exc())
+            raise
+        return f"{blob_client.url}?{sas_token}"
+
+    def start_staged_upload(self, container_name, blob_name, content_type=None, block_size=1024 * 1024):
+        """
+        Begin an upload that is fed incrementally with write() and finished with commit()
+        """
+        self.ensure_containers()
+        blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+        return StagedBlobUpload(
+            blob_client, self._content_type(container_name, content_type), block_size,
+            url=lambda: self.signed_url(container_name, blob_name)
+        )
+
     def upload_blob(self, container_name, blob_name, data, content_type=None):
         """
         Upload data to a specific container with proper content type and SAS token
         """
+        self.ensure_containers()
         try:
             print(f"\n=== Starting blob upload ===")
             print(f"Container: {container_name}")
             print(f"Blob name: {blob_name}")
             
             # Set content type based on container or provided type
-            if content_type is None:
-                content_type_map = {
-                    'images': 'image/png',
-                    'audio': 'audio/mpeg',
-                    'stories': 'text/plain'
-                }
-                content_type = content_type_map.get(container_name, 'application/octet-stream')
+            content_type = self._content_type(container_name, content_type)
             
             print(f"Content type: {content_type}")
             print(f"Data length: {len(data)} bytes")
             
-            # Get blob client
-            blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-            print(f"Blob client URL: {blob_client.url}")
-            
-            # Create proper content settings object
-            from azure.storage.blob import ContentSettings
-            
-            # Upload blob with content settings
-            blob_client.upload_blob(
-                data, 
-                overwrite=True,
-                content_settings=ContentSettings(
-                    content_type=content_type
+            if self.async_storage is not None:
+                self.async_storage.upload_blob(container_name, blob_name, data, content_type)
+            else:
+                # Get blob client
+                blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+                print(f"Blob client URL: {blob_client.url}")
+
+                # Upload blob with content settings
+                blob_client.upload_blob(
+                    data,
+                    overwrite=True,
+                    content_settings=ContentSettings(
+                        content_type=content_type
+                    ),
+                    max_concurrency=self.config.BLOB_MAX_CONCURRENCY
                 )
-            )
             print(f"Successfully uploaded blob")
             
-            # Generate SAS token for the blob
-            print(f"Generating SAS token with: account_name={self.account_name}, container={container_name}, blob={blob_name}")
-            try:
-                # Always use generate_blob_sas from azure.storage.blob
-                sas_token = generate_blob_sas(
-                    account_name=self.account_name,
-                    container_name=container_name,
-                    blob_name=blob_name,
-                    account_key=self.account_key,
-                    permission=BlobSasPermissions(read=True),
-                    expiry=datetime.utcnow() + timedelta(days=365)
-                )
-                print(f"SAS token generated successfully: {sas_token[:10]}...")
-            except Exception as sas_error:
-                print(f"Error generating SAS token: {str(sas_error)}")
-                import traceback
-                print(traceback.format_exc())
-                raise
             # Return URL with SAS token
-            url = f"{blob_client.url}?{sas_token}"
+            url = self.signed_url(container_name, blob_name)
             print(f"Generated URL with SAS: {url}")
             return url
         except Exception as e:
@@ -123,6 +233,49 @@ class BlobStorageService:
             print(traceback.format_exc())
             raise
 
+    def upload_blobs(self, uploads):
+        """
+        Upload several (container, blob name, data, content type) tuples at once
+        and return their SAS URLs in order. With the async backend they all
+        upload concurrently; otherwise one after another.
+        """
+        self.ensure_containers()
+        uploads = [
+            (container_name, blob_name, data, self._content_type(container_name, content_type))
+            for container_name, blob_name, data, content_type in uploads
+        ]
+        print(f"Uploading {len(uploads)} blobs ({sum(len(upload[2]) for upload in uploads)} bytes)")
+        if self.async_storage is not None:
+            self.async_storage.upload_many(uploads)
+        else:
+            for container_name, blob_name, data, content_type in uploads:
+                self.blob_service_client.get_blob_client(container=container_name, blob=blob_name).upload_blob(
+                    data,
+                    overwrite=True,
+                    content_settings=ContentSettings(content_type=content_type),
+                    max_concurrency=self.config.BLOB_MAX_CONCURRENCY
+                )
+        return [self.signed_url(container_name, blob_name) for container_name, blob_name, _, _ in uploads]
+
+    def exists(self, container_name, blob_name):
+        return self.blob_service_client.get_blob_client(container=container_name, blob=blob_name).exists()
+
+    def touch(self, container_name, blob_name):
+        blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+        try:
+            # Set Blob Metadata updates Last-Modified without rewriting the content (our blobs carry no metadata)
+            blob_client.set_blob_metadata({})
+        except ResourceNotFoundError:
+            return False
+        return True
+
+    def stream_blob(self, container_name, blob_name, chunk_size=1024 * 1024):
+        blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+        # The SDK downloads in max_chunk_get_size pieces (4 MiB); hand them out smaller
+        for chunk in blob_client.download_blob().chunks():
+            for offset in range(0, len(chunk), chunk_size):
+                yield chunk[offset:offset + chunk_size]
+
     def get_blob_url(self, container_name, blob_name):
         """
         Get the URL for a specific blob
@@ -156,6 +309,39 @@ class BlobStorageService:
             print(f"Error listing blobs: {str(e)}")
             raise
 
+    def list_blob_pages(self, container_name, page_size=1000):
+        container_client = self.blob_service_client.get_container_client(container_name)
+        # One List Blobs call per page, following the continuation marker
+        for page in container_client.list_blobs(results_per_page=page_size).by_page():
+            yield [BlobInfo(blob.name, blob.last_modified, blob.size) for blob in page]
+
+    def delete_blobs(self, container_name, blob_names, unmodified_since=None):
+        """
+        Delete the blobs with a single Blob Batch request. `unmodified_since`
+        is sent as If-Unmodified-Since, so Storage itself skips a blob touched
+        after the caller decided to delete it.
+        """
+        if len(blob_names) > self.MAX_BATCH_DELETE:
+            raise ValueError(f"At most {self.MAX_BATCH_DELETE} blobs per batch, got {len(blob_names)}")
+        if not blob_names:
+            return [], [], [], []
+        container_client = self.blob_service_client.get_container_client(container_name)
+        deleted, missing, failed, modified = [], [], [], []
+        conditions = {'if_unmodified_since': unmodified_since} if unmodified_since is not None else {}
+        responses = container_client.delete_blobs(*blob_names, raise_on_any_failure=False, **conditions)
+        for blob_name, response in zip(blob_names, responses):
+            if response.status_code == 202:
+                deleted.append(blob_name)
+            elif response.status_code == 404:
+                missing.append(blob_name)
+            elif response.status_code == 412:
+                modified.append(blob_name)
+            else:
+                print(f"Error deleting blob {blob_name}: {response.status_code} "
+                      f"{response.headers.get('x-ms-error-code')}")
+                failed.append(blob_name)
+        return deleted, missing, failed, modified
+
 # Add to services/__init__.py
 from .blob_storage import BlobStorageService
 
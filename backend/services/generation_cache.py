@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from services.storage_backend import blob_from_url
+
+
+
+def canonical_characters(characters):
+    """
+    Normalize characters for cache keys: accepts a list or the JSON string the
+    routes pass around, and returns a sorted, case-folded list
+    """
+    if isinstance(characters, str):
+        try:
+            characters = json.loads(characters)
+        except ValueError:
+            characters = characters.split(',')
+        if isinstance(characters, str):
+            characters = [characters]
+    return sorted(str(c).strip().casefold() for c in characters if str(c).strip())
+
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def story_key(services, theme, characters, age_group):
+    return make_key(
+        'story',
+        str(theme).strip().casefold(),
+        canonical_characters(characters),
+        str(age_group).strip().casefold(),
+        services.openai_deployment_name,
+        services.story_temperature,
+        services.story_max_tokens
+    )
+
+
+def illustration_key(services, theme, characters):
+    # The DALL-E prompt only depends on theme and characters
+    return make_key(
+        'illustration',
+        str(theme).strip().casefold(),
+        canonical_characters(characters),
+        services.dalle_deployment_name,
+        services.illustration_size
+    )
+
+
+def speech_key(services, text, voice=None, audio_format=None):
+    return make_key(
+        'speech',
+        hashlib.sha256(text.encode('utf-8')).hexdigest(),
+        voice or services.speech_voice,
+        services.speech_audio_format(audio_format).sdk_format.name
+    )
+
+
+class GenerationCache:
+    """
+    Size-bounded LRU cache with a TTL for generated stories and illustrations,
+    stored in SQLite so it is shared by all gunicorn workers on the
+    host and survives restarts. Hit/miss counters are kept in the same file.
+    """
+    def __init__(self, path, max_entries=1000, max_bytes=512 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._create_tables()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.GENERATION_CACHE_PATH,
+            max_entries=config.GENERATION_CACHE_MAX_ENTRIES,
+            max_bytes=config.GENERATION_CACHE_MAX_BYTES,
+            ttl_seconds=config.GENERATION_CACHE_TTL_SECONDS
+        )
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entry (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value BLOB NOT NULL,
+                is_text INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at ON cache_entry (accessed_at)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                namespace TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # Narration used to be cached here as well; it now lives in the AudioCache
+        conn.execute("DELETE FROM cache_entry WHERE namespace = 'speech'")
+        conn.execute("DELETE FROM cache_stats WHERE namespace = 'speech'")
+
+    def _count(self, conn, namespace, column):
+        conn.execute(
+            f'INSERT INTO cache_stats (namespace, {column}) VALUES (?, 1) '
+            f'ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + 1',
+            (namespace,)
+        )
+
+    def get(self, namespace, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, is_text, created_at FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is not None and now - row[2] > self.ttl_seconds:
+            conn.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+            row = None
+        if row is None:
+            self._count(conn, namespace, 'misses')
+            return None
+        conn.execute('UPDATE cache_entry SET accessed_at = ? WHERE key = ?', (now, key))
+        self._count(conn, namespace, 'hits')
+        value, is_text, _ = row
+        return value.decode('utf-8') if is_text else bytes(value)
+
+    def set(self, namespace, key, value):
+        is_text = isinstance(value, str)
+        blob = value.encode('utf-8') if is_text else bytes(value)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entry (key, namespace, value, is_text, size, created_at, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, namespace, blob, int(is_text), len(blob), now, now)
+        )
+        self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute('DELETE FROM cache_entry WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entry').fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from the least recently used entry until both limits are met again
+        evicted = []
+        for key, size in conn.execute('SELECT key, size FROM cache_entry ORDER BY accessed_at ASC'):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany('DELETE FROM cache_entry WHERE key = ?', evicted)
+        print(f"[CACHE] Evicted {len(evicted)} least recently used entries", file=sys.stderr)
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM cache_entry')
+        conn.execute('DELETE FROM cache_stats')
+
+    def stats(self):
+        conn = self._connect()
+        stats = {}
+        for namespace, hits, misses in conn.execute('SELECT namespace, hits, misses FROM cache_stats'):
+            stats[namespace] = {'hits': hits, 'misses': misses, 'entries': 0, 'bytes': 0}
+        for namespace, entries, size in conn.execute(
+            'SELECT namespace, COUNT(*), SUM(size) FROM cache_entry GROUP BY namespace'
+        ):
+            entry = stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+            entry['entries'] = entries
+            entry['bytes'] = size
+        for entry in stats.values():
+            lookups = entry['hits'] + entry['misses']
+            entry['hitRate'] = round(entry['hits'] / lookups, 3) if lookups else None
+        return stats
+
+
+class CachedIllustration(str):
+    """
+    Returned by generate_illustration when the illustration for the prompt is
+    already stored: the stored blob's URL, which save_image hands back
+    """
+
+
+class GeneratedIllustration(str):
+    """
+    A fresh DALL-E URL, tagged with its cache key so save_image can record where the image was stored
+    """
+    def __new__(cls, url, key):
+        instance = super().__new__(cls, url)
+        instance.key = key
+        return instance
+
+
+class CachingAzureServices:
+    """
+    Wraps AzureServices so story text and illustrations are looked up in a
+    GenerationCache before paying for GPT or DALL-E. Everything else is
+    delegated to the wrapped services unchanged; narration is reused by the
+    AudioCache, which keeps the stored blob's URL instead of the MP3 bytes.
+
+    Illustrations are cached as the URL of the image save_image stored, not as
+    the image: a miss still pipes DALL-E's image straight into blob storage,
+    and a hit reuses the stored blob without downloading or uploading anything.
+
+    A `fresh` view skips cache reads (but still refreshes the stored entry), for
+    requests that always want a new story.
+    """
+    def __init__(self, services, cache, fresh=False):
+        self.services = services
+        self.cache = cache
+        self.fresh = fresh
+
+    def __getattr__(self, name):
+        return getattr(self.services, name)
+
+    def with_fresh(self):
+        return CachingAzureServices(self.services, self.cache, fresh=True)
+
+    def _lookup(self, namespace, key):
+        """
+        The cached value, or None on a miss, in a fresh view or if the cache can't be read
+        """
+        if self.cache is None or self.fresh:
+            return None
+        try:
+            value = self.cache.get(namespace, key)
+        except sqlite3.Error as e:
+            print(f"[CACHE ERROR] Lookup failed: {str(e)}", file=sys.stderr)
+            return None
+        if value is not None:
+            print(f"[CACHE] {namespace} hit", file=sys.stderr)
+        return value
+
+    def _store(self, namespace, key, value):
+        if self.cache is None:
+            return
+        try:
+            self.cache.set(namespace, key, value)
+        except sqlite3.Error as e:
+            print(f"[CACHE ERROR] Store failed: {str(e)}", file=sys.stderr)
+
+    def _cached(self, namespace, key, produce):
+        value = self._lookup(namespace, key)
+        if value is not None:
+            return value
+        value = produce()
+        self._store(namespace, key, value)
+        return value
+
+    def generate_story(self, theme, characters, age_group):
+        key = story_key(self.services, theme, characters, age_group)
+        return self._cached('story', key, lambda: self.services.generate_story(theme, characters, age_group))
+
+    def stream_story(self, theme, characters, age_group):
+        key = story_key(self.services, theme, characters, age_group)
+        story_content = self._lookup('story', key)
+        if story_content is not None:
+            yield story_content
+            return
+        parts = []
+        for delta in self.services.stream_story(theme, characters, age_group):
+            parts.append(delta)
+            yield delta
+        self._store('story', key, ''.join(parts))
+
+    def generate_illustration(self, title, theme, characters, age_group):
+        key = illustration_key(self.services, theme, characters)
+        cached = self._lookup('illustration', key)
+        if isinstance(cached, bytes):
+            # Entries written before the cache kept URLs hold the image itself; save_image accepts bytes
+            return cached
+        if cached is not None and self._image_stored(cached):
+            return CachedIllustration(cached)
+        # DALL-E URLs expire, so the URL of the stored copy is cached once save_image made it
+        return GeneratedIllustration(self.services.generate_illustration(title, theme, characters, age_group), key)
+
+    def _image_stored(self, url):
+        """
+        Whether a cached illustration's blob is still there (the stories using
+        it may have been deleted). It is touched, so garbage collection keeps
+        it until the story reusing it is committed.
+        """
+        blob = blob_from_url(url)
+        if blob is None:
+            return False
+        try:
+            return self.services.blob_storage.touch(*blob)
+        except Exception as e:
+            print(f"[CACHE ERROR] Checking {url} failed: {str(e)}", file=sys.stderr)
+            return False
+
+    def save_image(self, image_data, title):
+        if isinstance(image_data, CachedIllustration):
+            return str(image_data)
+        url = self.services.save_image(image_data, title)
+        if isinstance(image_data, GeneratedIllustration):
+            self._store('illustration', image_data.key, url)
+        return url
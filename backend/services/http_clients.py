@@ -0,0 +1,125 @@
+import sys
+import threading
+import importlib.util
+
+import httpx
+
+class _PoolStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.connects = 0
+        self.tls_handshakes = 0
+        self.by_http_version = {}
+
+
+class HttpClients:
+    """
+    Process-wide keep-alive httpx clients, one per upstream, so GPT, DALL-E,
+    image downloads and Speech REST calls reuse connections instead of paying
+    DNS, TCP and TLS setup on every request. New connections and TLS
+    handshakes are counted through httpcore's trace hook, which shows how
+    well keep-alive is working.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, pool_sizes, keepalive_seconds=60.0, connect_timeout=5.0, read_timeout=120.0, http2=True):
+        self.pool_sizes = pool_sizes
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        # HTTP/2 needs the optional h2 package (pip install httpx[http2])
+        self.http2 = http2 and importlib.util.find_spec('h2') is not None
+        if http2 and not self.http2:
+            print("[HTTP] h2 is not installed, using HTTP/1.1 keep-alive only", file=sys.stderr)
+        self._clients = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    {
+                        'gpt': config.HTTP_POOL_GPT,
+                        'dalle': config.HTTP_POOL_DALLE,
+                        'images': config.HTTP_POOL_IMAGES,
+                        'speech': config.HTTP_POOL_SPEECH
+                    },
+                    keepalive_seconds=config.HTTP_KEEPALIVE_SECONDS,
+                    connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+                    read_timeout=config.HTTP_READ_TIMEOUT,
+                    http2=config.HTTP2_ENABLED
+                )
+            return cls._shared
+
+    def client(self, upstream):
+        """
+        The pooled httpx.Client for an upstream, created on first use
+        """
+        with self._lock:
+            client = self._clients.get(upstream)
+            if client is None:
+                client = self._create(upstream)
+                self._clients[upstream] = client
+            return client
+
+    def _create(self, upstream):
+        stats = self._stats[upstream] = _PoolStats()
+        size = self.pool_sizes.get(upstream, 10)
+
+        def trace(event, info):
+            if event == 'connection.connect_tcp.complete':
+                with self._lock:
+                    stats.connects += 1
+            elif event == 'connection.start_tls.complete':
+                with self._lock:
+                    stats.tls_handshakes += 1
+
+        def on_request(request):
+            request.extensions['trace'] = trace
+            with self._lock:
+                stats.requests += 1
+
+        def on_response(response):
+            with self._lock:
+                stats.by_http_version[response.http_version] = stats.by_http_version.get(response.http_version, 0) + 1
+                if response.status_code >= 400:
+                    stats.errors += 1
+
+        return httpx.Client(
+            http2=self.http2,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=size,
+                max_keepalive_connections=size,
+                keepalive_expiry=self.keepalive_seconds
+            ),
+            event_hooks={'request': [on_request], 'response': [on_response]}
+        )
+
+    def stats(self):
+        with self._lock:
+            upstreams = list(self._clients)
+            stats = dict(self._stats)
+        pools = {}
+        for upstream in upstreams:
+            counters = stats[upstream]
+            # httpx has no public view of the pool's open connections, so only the hook counters are reported
+            pools[upstream] = {
+                'maxConnections': self.pool_sizes.get(upstream, 10),
+                'requests': counters.requests,
+                'errors': counters.errors,
+                'newConnections': counters.connects,
+                'tlsHandshakes': counters.tls_handshakes,
+                'connectionReuse': round(1 - counters.connects / counters.requests, 3) if counters.requests else None,
+                'httpVersions': dict(counters.by_http_version)
+            }
+        return {'http2': self.http2, 'pools': pools}
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
@@ -0,0 +1,201 @@
+"""
+Thumbnails and WebP/AVIF copies of stored illustrations, so the library grid
+can download a few kilobytes per card instead of the 1024x1024 PNG. Decoding
+and encoding are CPU bound, so they run in a process pool rather than on the
+request and pipeline threads.
+"""
+import io
+import sys
+import json
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, features
+except ImportError:
+    # Pillow is optional: without it stories only have the original image
+    Image = None
+    features = None
+
+IMAGE_FORMATS = {
+    'webp': {'pil_format': 'WEBP', 'content_type': 'image/webp', 'extension': 'webp'},
+    'avif': {'pil_format': 'AVIF', 'content_type': 'image/avif', 'extension': 'avif'}
+}
+# Browsers pick the first <source> they support, so the smallest encoding goes first
+_SOURCE_ORDER = ('avif', 'webp')
+
+
+def render_variants(image_data, widths, formats, quality):
+    """
+    Decode an image once and encode it at each width in each format. Widths
+    larger than the image are skipped (never upscaled). Runs in a worker
+    process; returns [(width, height, format, bytes)].
+    """
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.mode in ('LA', 'PA') or 'transparency' in image.info else 'RGB')
+    fitting = [width for width in widths if width <= image.width] or [image.width]
+    variants = []
+    for width in fitting:
+        if width == image.width:
+            resized = image
+        else:
+            resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        for name in formats:
+            output = io.BytesIO()
+            resized.save(output, IMAGE_FORMATS[name]['pil_format'], quality=quality)
+            variants.append((width, resized.height, name, output.getvalue()))
+    return variants
+
+
+def dump_variants(variants):
+    """
+    Variants as stored in the image_variants column (None when there are none)
+    """
+    return json.dumps(variants) if variants else None
+
+
+def _srcset(variants):
+    return ', '.join(f"{variant['url']} {variant['width']}w" for variant in variants)
+
+
+def variant_fields(stored):
+    """
+    thumbnailUrl, srcset and imageSources (one srcset per type, for <picture>)
+    from a story's stored image variants
+    """
+    try:
+        variants = json.loads(stored) if stored else []
+    except ValueError:
+        variants = []
+    by_format = {}
+    for variant in sorted(variants, key=lambda variant: variant['width']):
+        by_format.setdefault(variant['format'], []).append(variant)
+    if not by_format:
+        return {'thumbnailUrl': None, 'srcset': None, 'imageSources': []}
+    # WebP decodes in every current browser, so it backs the plain <img srcset>
+    default = by_format.get('webp') or next(iter(by_format.values()))
+    names = [name for name in _SOURCE_ORDER if name in by_format] + [
+        name for name in by_format if name not in _SOURCE_ORDER
+    ]
+    return {
+        'thumbnailUrl': default[0]['url'],
+        'srcset': _srcset(default),
+        'imageSources': [
+            {'type': by_format[name][0]['contentType'], 'srcset': _srcset(by_format[name])} for name in names
+        ]
+    }
+
+
+class ImageVariants:
+    """
+    Renders image variants in a process pool shared by the whole process.
+    Formats the installed Pillow can't encode (AVIF needs Pillow 11.2+ or
+    pillow-avif-plugin) are dropped with a warning at startup.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, widths, formats, quality=75, workers=2, enabled=True):
+        self.widths = sorted(set(widths))
+        self.quality = quality
+        self.workers = workers
+        self.formats = []
+        if enabled and Image is None:
+            print("[IMAGES] Pillow is not installed, image variants are disabled", file=sys.stderr)
+        elif enabled:
+            self.formats = self._supported(formats)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._images = 0
+        self._failed = 0
+        self._seconds = 0.0
+        self._original_bytes = 0
+        self._variant_bytes = {}
+
+    @classmethod
+    def shared(cls, config):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    config.IMAGE_VARIANT_WIDTHS,
+                    config.IMAGE_VARIANT_FORMATS,
+                    quality=config.IMAGE_VARIANT_QUALITY,
+                    workers=config.IMAGE_VARIANT_WORKERS,
+                    enabled=config.IMAGE_VARIANTS_ENABLED
+                )
+            return cls._shared
+
+    @staticmethod
+    def _supported(formats):
+        supported = []
+        for name in formats:
+            if name not in IMAGE_FORMATS:
+                raise ValueError(f"Unsupported image variant format: {name}")
+            try:
+                available = features.check(name)
+            except ValueError:
+                available = False
+            if available:
+                supported.append(name)
+            else:
+                print(f"[IMAGES] This Pillow build can't encode {name}, skipping {name} variants", file=sys.stderr)
+        return supported
+
+    @property
+    def enabled(self):
+        return bool(self.formats and self.widths)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the parent has sockets and SDK threads that must not be copied
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def render(self, image_data):
+        """
+        [(width, height, format, bytes)] for an image, rendered in the process pool
+        """
+        start = time.perf_counter()
+        try:
+            variants = self._pool().submit(
+                render_variants, image_data, self.widths, self.formats, self.quality
+            ).result()
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        with self._lock:
+            self._images += 1
+            self._seconds += time.perf_counter() - start
+            self._original_bytes += len(image_data)
+            for width, _, name, data in variants:
+                key = f"{name}@{width}"
+                self._variant_bytes[key] = self._variant_bytes.get(key, 0) + len(data)
+        return variants
+
+    def stats(self):
+        with self._lock:
+            images = self._images
+            return {
+                'enabled': self.enabled,
+                'formats': list(self.formats),
+                'widths': list(self.widths),
+                'images': images,
+                'failed': self._failed,
+                'avgSeconds': round(self._seconds / images, 3) if images else None,
+                'avgOriginalBytes': round(self._original_bytes / images) if images else None,
+                'avgVariantBytes': {key: round(total / images) for key, total in self._variant_bytes.items()}
+            }
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
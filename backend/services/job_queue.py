@@ -0,0 +1,338 @@
+import sys
+import json
+import time
+import uuid
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from services.story_pipeline import StoryPipeline, illustration_stages
+from services.image_variants import dump_variants, variant_fields
+
+
+class StoryJobQueue:
+    """
+    Database-backed queue for story generation jobs.
+
+    Requests enqueue a StoryJob row and return straight away; a bounded pool of
+    daemon threads in each worker process claims queued jobs with a conditional
+    UPDATE, so several gunicorn workers can share the same queue without running
+    a job twice. Jobs left in 'running' by a worker that died are picked up
+    again once their heartbeat is older than STORY_JOB_STALE_SECONDS; idle
+    workers look for them every STORY_JOB_STALE_CHECK_SECONDS.
+
+    `services_factory` returns the AzureServices-like object jobs should use,
+    which lets tests run the queue against a fake.
+    """
+    def __init__(self, app=None, services_factory=None):
+        self.app = None
+        self.services_factory = services_factory
+        self.handlers = {'story': run_story_job, 'media': run_media_job, 'illustration': run_illustration_job}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._last_stale_check = None
+        if app is not None:
+            self.init_app(app, services_factory)
+
+    def init_app(self, app, services_factory=None):
+        self.app = app
+        if services_factory is not None:
+            self.services_factory = services_factory
+        self.workers = app.config.get('STORY_JOB_WORKERS', 2)
+        self.poll_interval = app.config.get('STORY_JOB_POLL_INTERVAL', 1.0)
+        self.stale_after = timedelta(seconds=app.config.get('STORY_JOB_STALE_SECONDS', 900))
+        self.stale_check_interval = app.config.get('STORY_JOB_STALE_CHECK_SECONDS', 60)
+        self.max_attempts = app.config.get('STORY_JOB_MAX_ATTEMPTS', 3)
+        app.extensions['story_job_queue'] = self
+
+        # Start the workers with the first request, so that scripts calling
+        # create_app() (migrations, init_db) don't spin up background threads
+        @app.before_request
+        def _start_story_job_workers():
+            self.start()
+
+    def register_handler(self, kind, handler):
+        """
+        Register `handler(queue, job, services)` for jobs of the given kind
+        """
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload, story_id=None):
+        from extensions import db
+        from models.models import StoryJob
+
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = StoryJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status='queued',
+            payload=json.dumps(payload),
+            stages=json.dumps({}),
+            attempts=0,
+            story_id=story_id
+        )
+        db.session.add(job)
+        db.session.commit()
+        print(f"[JOBS] Enqueued {kind} job {job.id}", file=sys.stderr)
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def start(self):
+        if self._threads or self.workers <= 0:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            self._requeue_stale_jobs()
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f'story-job-worker-{index}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            print(f"[JOBS] Started {self.workers} story job workers", file=sys.stderr)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_pending(self):
+        """
+        Run queued jobs on the calling thread until the queue is empty.
+        Useful for tests and one-off scripts.
+        """
+        count = 0
+        while True:
+            job_id = self._claim_next()
+            if job_id is None:
+                return count
+            self._run(job_id)
+            count += 1
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job_id = self._claim_next()
+            except Exception as e:
+                print(f"[JOBS ERROR] Failed to claim a job: {str(e)}", file=sys.stderr)
+                job_id = None
+            if job_id is None:
+                self._check_stale_jobs()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job_id)
+
+    def _check_stale_jobs(self):
+        """
+        Re-queue abandoned jobs, at most once per stale check interval across the worker threads
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._last_stale_check is not None and now - self._last_stale_check < self.stale_check_interval:
+                return
+            self._last_stale_check = now
+        self._requeue_stale_jobs()
+
+    def _requeue_stale_jobs(self):
+        from extensions import db
+        from models.models import StoryJob
+
+        self._last_stale_check = time.monotonic()
+        try:
+            with self.app.app_context():
+                cutoff = datetime.utcnow() - self.stale_after
+                stale = db.and_(
+                    StoryJob.status == 'running',
+                    db.or_(StoryJob.heartbeat_at == None, StoryJob.heartbeat_at < cutoff)  # noqa: E711
+                )
+                # A job that keeps taking its worker down must not be retried forever
+                failed = StoryJob.query.filter(stale, StoryJob.attempts >= self.max_attempts).update({
+                    'status': 'failed',
+                    'error': 'Worker stopped responding',
+                    'finished_at': datetime.utcnow()
+                }, synchronize_session=False)
+                count = StoryJob.query.filter(stale).update({'status': 'queued'}, synchronize_session=False)
+                db.session.commit()
+                if count:
+                    print(f"[JOBS] Re-queued {count} jobs abandoned by a dead worker", file=sys.stderr)
+                if failed:
+                    print(f"[JOBS] Failed {failed} abandoned jobs that ran out of attempts", file=sys.stderr)
+        except Exception as e:
+            print(f"[JOBS ERROR] Failed to re-queue stale jobs: {str(e)}", file=sys.stderr)
+
+    def _claim_next(self):
+        from extensions import db
+        from models.models import StoryJob
+
+        with self.app.app_context():
+            candidates = db.session.query(StoryJob.id).filter_by(status='queued') \
+                .order_by(StoryJob.created_at).limit(5).all()
+            for (job_id,) in candidates:
+                now = datetime.utcnow()
+                claimed = StoryJob.query.filter_by(id=job_id, status='queued').update({
+                    'status': 'running',
+                    'started_at': now,
+                    'heartbeat_at': now,
+                    'attempts': StoryJob.attempts + 1
+                }, synchronize_session=False)
+                db.session.commit()
+                if claimed:
+                    return job_id
+            return None
+
+    def _run(self, job_id):
+        from extensions import db
+        from models.models import StoryJob
+
+        with self.app.app_context():
+            job = db.session.get(StoryJob, job_id)
+            print(f"[JOBS] Running {job.kind} job {job.id} (attempt {job.attempts})", file=sys.stderr)
+            try:
+                handler = self.handlers[job.kind]
+                handler(self, job, self.services_factory())
+                job.status = 'succeeded'
+            except Exception as e:
+                db.session.rollback()
+                print(f"[JOBS ERROR] Job {job.id} failed: {str(e)}", file=sys.stderr)
+                traceback.print_exc(file=sys.stderr)
+                job.error = str(e)
+                # Retry transient failures until the attempt budget is spent
+                job.status = 'queued' if job.attempts < self.max_attempts else 'failed'
+            job.finished_at = datetime.utcnow() if job.status != 'queued' else None
+            db.session.commit()
+
+    def stage_recorder(self, job, names=()):
+        """
+        Build an on_stage callback that stores stage progress on the job row
+        """
+        from extensions import db
+
+        stages = json.loads(job.stages) if job.stages else {}
+        for name in names:
+            stages.setdefault(name, {'status': 'pending'})
+        job.stages = json.dumps(stages)
+        db.session.commit()
+
+        def record(name, status, seconds=None, error=None):
+            entry = {'status': status}
+            if seconds is not None:
+                entry['seconds'] = round(seconds, 3)
+            if error:
+                entry['error'] = error
+            stages[name] = entry
+            job.stages = json.dumps(stages)
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+        return record
+
+
+def run_job_pipeline(queue, job, services, data, seed=None, stages=None):
+    """
+    Run the story pipeline (or the given stages) for a job, recording stage
+    progress on the job row
+    """
+    if data.get('fresh') and hasattr(services, 'with_fresh'):
+        services = services.with_fresh()
+    pipeline = StoryPipeline(
+        services,
+        concurrent=queue.app.config.get('STORY_PIPELINE_CONCURRENT', True),
+        max_workers=queue.app.config.get('STORY_PIPELINE_MAX_WORKERS', 4)
+    )
+    stages = [stage for stage in (stages or pipeline.build_stages(data)) if stage.name not in (seed or {})]
+    pipeline.on_stage = queue.stage_recorder(job, [stage.name for stage in stages])
+    return pipeline.run(data, stages, seed=seed)
+
+
+def run_story_job(queue, job, services):
+    """
+    Generate a full story (text, illustration, audio) for a queued job
+    """
+    from extensions import db
+    from models.models import Story
+
+    data = json.loads(job.payload)
+    result = run_job_pipeline(queue, job, services, data)
+    story = Story(
+        title=result['title'],
+        content=result['story'],
+        theme=data['theme'],
+        characters=json.dumps(data['characters']),
+        age_group=data['age_group'],
+        image_url=result['save_image'],
+        image_variants=dump_variants(result.get('image_variants')),
+        audio_url=result['save_audio'],
+        content_url=result['save_story']
+    )
+    db.session.add(story)
+    db.session.flush()
+    job.story_id = story.id
+    return story
+
+
+def run_media_job(queue, job, services):
+    """
+    Illustrate, narrate and upload an already written story (e.g. one streamed to the client)
+    """
+    from extensions import db
+    from models.models import Story
+
+    story = db.session.get(Story, job.story_id)
+    if story is None:
+        raise ValueError(f"Story {job.story_id} no longer exists")
+    seed = {'story': story.content, 'title': story.title}
+    result = run_job_pipeline(queue, job, services, json.loads(job.payload), seed=seed)
+    story.image_url = result['save_image']
+    story.image_variants = dump_variants(result.get('image_variants'))
+    story.audio_url = result['save_audio']
+    story.content_url = result['save_story']
+    return story
+
+
+def run_illustration_job(queue, job, services):
+    """
+    Regenerate a story's illustration in the background. All candidates come
+    from one DALL-E call where the deployment allows it and are saved with
+    their variants. A single candidate replaces the story's illustration when
+    the job finishes; several are listed in the job result for the client to
+    choose from (POST /api/stories/<id>/illustration).
+    """
+    from extensions import db
+    from models.models import Story
+
+    story = db.session.get(Story, job.story_id)
+    if story is None:
+        raise ValueError(f"Story {job.story_id} no longer exists")
+    payload = json.loads(job.payload)
+    count = payload.get('candidates', 1)
+    stages = illustration_stages(services, story.title, story.theme, story.characters, story.age_group, count)
+    result = run_job_pipeline(queue, job, services, payload, stages=stages)
+    candidates = []
+    for index in range(count):
+        image_url = result.get(f'save_image_{index}')
+        if image_url:
+            variants = result.get(f'image_variants_{index}')
+            candidates.append({
+                'imageUrl': image_url,
+                **variant_fields(dump_variants(variants)),
+                'imageVariants': variants
+            })
+    if not candidates:
+        raise ValueError("None of the generated illustrations could be saved")
+    selected = None
+    if len(candidates) == 1:
+        selected = 0
+        story.set_illustration(candidates[0]['imageUrl'], candidates[0]['imageVariants'])
+    job.result = json.dumps({'candidates': candidates, 'selected': selected})
+    return story
@@ -0,0 +1,259 @@
+import os
+import re
+import sys
+import hmac
+import mmap
+import time
+import base64
+import hashlib
+import tempfile
+import threading
+import mimetypes
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from services.storage_backend import StorageBackend, BlobInfo
+
+# mimetypes guesses these wrong (webm as video) or, on older Pythons, not at all
+CONTENT_TYPES = {
+    '.txt': 'text/plain; charset=utf-8',
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg; codecs=opus',
+    '.webm': 'audio/webm; codecs=opus',
+    '.avif': 'image/avif',
+    '.webp': 'image/webp'
+}
+
+CONTAINER_NAME = re.compile(r'^[a-z0-9][a-z0-9-]{1,62}$')
+
+
+class LocalStagedUpload:
+    """
+    The local counterpart of StagedBlobUpload: pieces are appended to a
+    temporary file next to the destination, which commit() renames into
+    place, so readers never see a partly written blob.
+    """
+    def __init__(self, storage, container_name, blob_name):
+        self.storage = storage
+        self.container_name = container_name
+        self.blob_name = blob_name
+        self.path = storage.path(container_name, blob_name)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.', suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+        self.size = 0
+
+    def write(self, data):
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        """
+        Move the file into place and return its signed URL
+        """
+        try:
+            self._file.flush()
+            if self.storage.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self._temp_path, self.path)
+        except Exception:
+            self.abort()
+            raise
+        print(f"Committed {self.size} bytes to {self.path}")
+        return self.storage.signed_url(self.container_name, self.blob_name)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Blobs as files under `root`, for running the whole pipeline on one box
+    without Azure. Each container is a directory, sharded two levels deep by
+    the SHA-256 of the blob name (images/3f/a2/Title_....png) so no
+    directory grows past a few thousand entries. Writes go to a temporary
+    file that is renamed into place.
+
+    Signed URLs point at `base_url` (the /api/storage route) and carry an
+    expiry and an HMAC-SHA256 of container, name and expiry; the route
+    serves the file with sendfile where the WSGI server supports it. Content
+    types are derived from the blob name's extension.
+    """
+    def __init__(self, root, base_url, secret, url_ttl_seconds=365 * 24 * 3600, fsync=True):
+        super().__init__()
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.url_ttl_seconds = url_ttl_seconds
+        self.fsync = fsync
+        self._containers_ready = False
+        self._containers_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.STORAGE_LOCAL_ROOT,
+            config.STORAGE_LOCAL_URL,
+            config.STORAGE_URL_SECRET or config.SECRET_KEY,
+            url_ttl_seconds=config.STORAGE_URL_TTL_SECONDS,
+            fsync=config.STORAGE_LOCAL_FSYNC
+        )
+
+    def ensure_containers(self, force=False):
+        if self._containers_ready and not force:
+            return
+        with self._containers_lock:
+            for container_name in self.CONTAINERS:
+                os.makedirs(self._container_dir(container_name), exist_ok=True)
+            if not self._containers_ready:
+                print(f"[LOCAL STORAGE] Storing blobs under {self.root}", file=sys.stderr)
+            self._containers_ready = True
+
+    def path(self, container_name, blob_name):
+        """
+        The file a blob is stored in. Names that could escape the container
+        directory (or collide with temporary files) are rejected.
+        """
+        if not blob_name or blob_name.startswith('.') or '/' in blob_name or '\\' in blob_name or '\0' in blob_name:
+            raise ValueError(f"Invalid blob name: {blob_name!r}")
+        digest = hashlib.sha256(blob_name.encode('utf-8')).hexdigest()
+        return os.path.join(self._container_dir(container_name), digest[:2], digest[2:4], blob_name)
+
+    def _container_dir(self, container_name):
+        if not CONTAINER_NAME.match(container_name):
+            raise ValueError(f"Invalid container name: {container_name!r}")
+        return os.path.join(self.root, container_name)
+
+    def content_type(self, blob_name):
+        extension = os.path.splitext(blob_name)[1].lower()
+        return CONTENT_TYPES.get(extension) or mimetypes.guess_type(blob_name)[0] or 'application/octet-stream'
+
+    def start_staged_upload(self, container_name, blob_name, content_type=None, block_size=1024 * 1024):
+        self.ensure_containers()
+        return LocalStagedUpload(self, container_name, blob_name)
+
+    def upload_blob(self, container_name, blob_name, data, content_type=None):
+        upload = self.start_staged_upload(container_name, blob_name, content_type)
+        try:
+            upload.write(data)
+        except Exception:
+            upload.abort()
+            raise
+        return upload.commit()
+
+    def exists(self, container_name, blob_name):
+        return os.path.isfile(self.path(container_name, blob_name))
+
+    def touch(self, container_name, blob_name):
+        try:
+            os.utime(self.path(container_name, blob_name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def stream_blob(self, container_name, blob_name, chunk_size=1024 * 1024):
+        with open(self.path(container_name, blob_name), 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            # Slicing the mapping reads straight from the page cache, with no read() buffer in between
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, len(mapped), chunk_size):
+                    yield mapped[offset:offset + chunk_size]
+
+    def _signature(self, container_name, blob_name, expires):
+        digest = hmac.new(
+            self.secret, f"{container_name}/{blob_name}:{expires}".encode('utf-8'), hashlib.sha256
+        ).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def signed_url(self, container_name, blob_name):
+        expires = int(time.time()) + self.url_ttl_seconds
+        signature = self._signature(container_name, blob_name, expires)
+        return f"{self.get_blob_url(container_name, blob_name)}?expires={expires}&sig={signature}"
+
+    def verify(self, container_name, blob_name, expires, signature):
+        """
+        Whether a signed URL's expiry and signature are valid
+        """
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time() or not signature:
+            return False
+        return hmac.compare_digest(self._signature(container_name, blob_name, expires).encode('ascii'), signature.encode('utf-8'))
+
+    def get_blob_url(self, container_name, blob_name):
+        return f"{self.base_url}/{container_name}/{quote(blob_name)}"
+
+    def delete_blob(self, container_name, blob_name):
+        os.remove(self.path(container_name, blob_name))
+
+    def list_blobs(self, container_name):
+        names = []
+        for _, _, files in os.walk(self._container_dir(container_name)):
+            names.extend(name for name in files if not name.startswith('.'))
+        return sorted(names)
+
+    def list_blob_pages(self, container_name, page_size=1000):
+        # Shard directories are walked in turn, so pages are not sorted by name
+        page = []
+        for directory, _, files in os.walk(self._container_dir(container_name)):
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                page.append(BlobInfo(name, datetime.fromtimestamp(stat.st_mtime, timezone.utc), stat.st_size))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+    def delete_blobs(self, container_name, blob_names, unmodified_since=None):
+        deleted, missing, failed, modified = [], [], [], []
+        for blob_name in blob_names:
+            try:
+                if unmodified_since is None:
+                    os.remove(self.path(container_name, blob_name))
+                    deleted.append(blob_name)
+                elif self._delete_unmodified(self.path(container_name, blob_name), unmodified_since.timestamp()):
+                    deleted.append(blob_name)
+                else:
+                    modified.append(blob_name)
+            except FileNotFoundError:
+                missing.append(blob_name)
+            except (OSError, ValueError) as e:
+                print(f"[LOCAL STORAGE] Failed to delete {container_name}/{blob_name}: {e}", file=sys.stderr)
+                failed.append(blob_name)
+        return deleted, missing, failed, modified
+
+    def _delete_unmodified(self, path, cutoff):
+        """
+        Delete the file unless it was modified after `cutoff`. It is moved
+        aside before its time is checked, so a touch racing with the delete
+        either lands first (and keeps the file) or finds no blob and uploads
+        it again.
+        """
+        aside = os.path.join(
+            os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}-{threading.get_ident()}.deleting"
+        )
+        os.rename(path, aside)
+        if os.stat(aside).st_mtime <= cutoff:
+            os.remove(aside)
+            return True
+        try:
+            # Put it back, unless the blob has been uploaded again meanwhile
+            os.link(aside, path)
+        except FileExistsError:
+            pass
+        os.remove(aside)
+        return False
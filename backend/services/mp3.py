@@ -0,0 +1,107 @@
+"""
+Just enough MPEG audio parsing to join MP3 files by concatenating their frames
+(no decoding or re-encoding) and to measure their duration.
+"""
+
+# Bitrates in kbps by (MPEG-1?, layer)
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates by version bits (0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1)
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+
+class Frame:
+    def __init__(self, offset, length, samples, sample_rate):
+        self.offset = offset
+        self.length = length
+        self.samples = samples
+        self.sample_rate = sample_rate
+
+    @property
+    def seconds(self):
+        return self.samples / self.sample_rate
+
+
+def parse_header(data, offset):
+    """
+    The Frame starting at `offset`, or None if there is no valid frame header there
+    """
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[offset + 1] >> 3) & 0x03
+    layer = 4 - ((data[offset + 1] >> 1) & 0x03)
+    bitrate_index = data[offset + 2] >> 4
+    rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+        samples = 384
+    elif layer == 2 or mpeg1:
+        length = 144 * bitrate // sample_rate + padding
+        samples = 1152
+    else:
+        length = 72 * bitrate // sample_rate + padding
+        samples = 576
+    return Frame(offset, length, samples, sample_rate)
+
+
+def _skip_id3v2(data):
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_vbr_header(frame_bytes):
+    # Xing/Info/VBRI frames carry stream metadata that is wrong once files are joined
+    head = frame_bytes[:64]
+    return b'Xing' in head or b'Info' in head or b'VBRI' in head
+
+
+def frames(data):
+    """
+    Yield the audio frames in an MP3, skipping ID3 tags, VBR header frames and junk between frames
+    """
+    end = len(data) - 128 if data[-128:-125] == b'TAG' else len(data)
+    offset = _skip_id3v2(data)
+    while offset + 4 <= end:
+        frame = parse_header(data, offset)
+        if frame is None or frame.length <= 4 or offset + frame.length > end:
+            offset += 1
+            continue
+        if not _is_vbr_header(data[offset:offset + frame.length]):
+            yield frame
+        offset += frame.length
+
+
+def concat(parts):
+    """
+    Join MP3 files frame by frame, so the result plays as one continuous stream
+    """
+    output = bytearray()
+    for data in parts:
+        for frame in frames(data):
+            output += data[frame.offset:frame.offset + frame.length]
+    return bytes(output)
+
+
+def duration(data):
+    return sum(frame.seconds for frame in frames(data))
@@ -0,0 +1,346 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from openai import AzureOpenAI
+
+from services.http_clients import HttpClients
+from services.rate_limiter import RateLimitTimeout
+
+
+class NoHealthyDeploymentError(Exception):
+    # Reported as 503 so the rate limiter backs off and retries
+    status_code = 503
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures (calls slower than
+    `slow_call_seconds` count as failures), rejects calls for `open_seconds`,
+    then lets a single trial call through before closing again.
+    """
+    def __init__(self, failure_threshold=5, open_seconds=30.0, slow_call_seconds=60.0):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = 'half_open'
+                self._trial_in_flight = False
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def available(self):
+        """
+        Like allow() but without claiming the half-open trial slot
+        """
+        with self._lock:
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at >= self.open_seconds
+            return self.state == 'closed' or not self._trial_in_flight
+
+    def release(self):
+        """
+        Give back a half-open trial slot that allow() handed out but wasn't used
+        """
+        with self._lock:
+            if self.state == 'half_open':
+                self._trial_in_flight = False
+
+    def record_success(self, seconds):
+        if seconds > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class Deployment:
+    def __init__(self, name, client, deployment, weight=1.0, breaker=None):
+        self.name = name
+        self.client = client
+        self.deployment = deployment
+        self.weight = float(weight)
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=200)
+        self.successes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            if ok:
+                self.latencies.append(seconds)
+                self.successes += 1
+            else:
+                self.failures += 1
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def score(self):
+        """
+        Routing weight: configured weight, scaled down for slow or failing deployments
+        """
+        with self._lock:
+            calls = self.successes + self.failures
+            success_rate = (self.successes + 1) / (calls + 1)
+            recent = list(self.latencies)[-20:]
+        mean_latency = sum(recent) / len(recent) if recent else 1.0
+        return self.weight * success_rate / max(mean_latency, 0.05)
+
+
+class DeploymentRouter:
+    """
+    Routes GPT chat completions across several Azure OpenAI deployments
+    (AZURE_OPENAI_DEPLOYMENTS), weighted by recent latency and success rate.
+    Each deployment has a circuit breaker, failed calls fail over to the next
+    deployment, and with hedging enabled a second request is sent to another
+    deployment when the first hasn't answered within its recent p95 latency.
+
+    `client_factory(spec)` builds the OpenAI client for a deployment spec, so
+    tests can route to local fake endpoints.
+    """
+    def __init__(self, deployments, hedge=False, hedge_delay=5.0, min_samples=20):
+        if not deployments:
+            raise ValueError("At least one GPT deployment is required")
+        self.deployments = deployments
+        self.hedge = hedge and len(deployments) > 1
+        self.default_hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='gpt-router') if self.hedge else None
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config):
+        """
+        The process-wide router, so deployment health is tracked across every AzureServices instance
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_config(config)
+            return cls._shared
+
+    @classmethod
+    def from_config(cls, config, client_factory=None):
+        specs = json.loads(config.AZURE_OPENAI_DEPLOYMENTS) if config.AZURE_OPENAI_DEPLOYMENTS else [{
+            'name': 'default',
+            'endpoint': os.getenv("AZURE_OPENAI_ENDPOINT"),
+            'api_key': os.getenv("AZURE_OPENAI_API_KEY"),
+            'deployment': os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            'api_version': os.getenv("AZURE_OPENAI_API_VERSION")
+        }]
+        # All deployments share the process-wide keep-alive pool for GPT
+        http_client = HttpClients.shared(config).client('gpt') if client_factory is None else None
+        client_factory = client_factory or (lambda spec: AzureOpenAI(
+            api_key=spec.get('api_key'),
+            api_version=spec.get('api_version') or os.getenv("AZURE_OPENAI_API_VERSION"),
+            azure_endpoint=spec.get('endpoint'),
+            max_retries=0,
+            http_client=http_client
+        ))
+        deployments = [
+            Deployment(
+                spec.get('name') or spec.get('endpoint'),
+                client_factory(spec),
+                spec.get('deployment'),
+                weight=spec.get('weight', 1.0),
+                breaker=CircuitBreaker(
+                    failure_threshold=config.GPT_BREAKER_FAILURES,
+                    open_seconds=config.GPT_BREAKER_OPEN_SECONDS,
+                    slow_call_seconds=config.GPT_BREAKER_SLOW_SECONDS
+                )
+            )
+            for spec in specs
+        ]
+        return cls(deployments, hedge=config.GPT_HEDGE_REQUESTS, hedge_delay=config.GPT_HEDGE_DEFAULT_DELAY)
+
+    @property
+    def primary(self):
+        return self.deployments[0]
+
+    def _candidates(self, exclude=()):
+        """
+        Available deployments in a health-weighted random order
+        """
+        available = [d for d in self.deployments if d not in exclude and d.breaker.available()]
+        ordered = []
+        while available:
+            pick = random.choices(available, weights=[d.score() for d in available])[0]
+            available.remove(pick)
+            ordered.append(pick)
+        return ordered
+
+    def _next(self, tried):
+        for deployment in self._candidates(exclude=tried):
+            if deployment.breaker.allow():
+                return deployment
+        return None
+
+    def _attempt(self, deployment, kwargs):
+        start = time.perf_counter()
+        try:
+            response = deployment.client.chat.completions.create(model=deployment.deployment, **kwargs)
+        except Exception as e:
+            deployment.record(time.perf_counter() - start, ok=False)
+            deployment.breaker.record_failure()
+            print(f"[GPT ROUTER] {deployment.name} failed: {str(e)}", file=sys.stderr)
+            raise
+        seconds = time.perf_counter() - start
+        deployment.record(seconds, ok=True)
+        deployment.breaker.record_success(seconds)
+        return response
+
+    def _hedge_delay(self, deployment):
+        if len(deployment.latencies) >= self.min_samples:
+            return deployment.percentile(0.95)
+        return self.default_hedge_delay
+
+    def chat_completion(self, charge=None, **kwargs):
+        """
+        Create a chat completion on the healthiest deployment, failing over
+        (and hedging, when enabled) to the others. Every attempt after the
+        first calls `charge(wait)` to pay for itself from the caller's rate
+        limit; a hedge is only sent if the budget is free right now (wait=False).
+        """
+        if self.hedge and not kwargs.get('stream'):
+            return self._hedged(kwargs, charge)
+        tried = set()
+        last_error = None
+        while True:
+            deployment = self._next(tried)
+            if deployment is None:
+                raise last_error or NoHealthyDeploymentError("All GPT deployments are unavailable")
+            if tried and charge is not None:
+                try:
+                    charge(True)
+                except RateLimitTimeout:
+                    deployment.breaker.release()
+                    raise
+            tried.add(deployment)
+            try:
+                return self._attempt(deployment, kwargs)
+            except Exception as e:
+                last_error = e
+
+    def _hedged(self, kwargs, charge=None):
+        tried = set()
+        futures = {}
+        last_error = None
+        hedged = False
+
+        def launch(wait=True):
+            deployment = self._next(tried)
+            if deployment is None:
+                return False
+            if tried and charge is not None:
+                try:
+                    charge(wait)
+                except RateLimitTimeout:
+                    deployment.breaker.release()
+                    if wait:
+                        raise
+                    # No budget to spare for a hedge; keep waiting on the first request
+                    return False
+            tried.add(deployment)
+            futures[self._pool.submit(self._attempt, deployment, kwargs)] = deployment
+            return True
+
+        if not launch():
+            raise NoHealthyDeploymentError("All GPT deployments are unavailable")
+        first = next(iter(futures.values()))
+        pending = set(futures)
+        try:
+            while pending:
+                timeout = None if hedged else self._hedge_delay(first)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # The first request is slower than usual: race it against another deployment
+                    hedged = True
+                    if launch(wait=False):
+                        with self._lock:
+                            self.hedged_requests += 1
+                        print(f"[GPT ROUTER] Hedging {first.name} after {timeout:.2f}s", file=sys.stderr)
+                        pending = set(f for f in futures if not f.done())
+                    continue
+                for future in done:
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if futures[future] is not first:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return response
+                if not pending and launch():
+                    # Everything in flight failed: fail over to a deployment we haven't tried
+                    pending = set(f for f in futures if not f.done())
+            raise last_error or NoHealthyDeploymentError("All GPT deployments are unavailable")
+        finally:
+            # Drop the losing attempt if it hasn't started; one already in flight
+            # can't be interrupted and finishes in the background, already paid for
+            for future in futures:
+                future.cancel()
+
+    def metrics(self):
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            'hedging': self.hedge,
+            'hedgedRequests': self.hedged_requests,
+            'hedgeWins': self.hedge_wins,
+            'deployments': [
+                {
+                    'name': d.name,
+                    'deployment': d.deployment,
+                    'weight': d.weight,
+                    'circuit': d.breaker.state,
+                    'timesOpened': d.breaker.times_opened,
+                    'successes': d.successes,
+                    'failures': d.failures,
+                    'p50Seconds': rounded(d.percentile(0.5)),
+                    'p95Seconds': rounded(d.percentile(0.95))
+                }
+                for d in self.deployments
+            ]
+        }
@@ -0,0 +1,271 @@
+import sys
+import time
+import random
+import threading
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class ThrottledError(Exception):
+    """
+    Raised by service calls when an upstream reports it is throttling us
+    """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire` blocks the caller until enough tokens
+    are available instead of failing, and `pause` stops all callers until a
+    point in time (used to honour Retry-After).
+    """
+    def __init__(self, name, capacity, refill_per_second):
+        if capacity <= 0 or refill_per_second <= 0:
+            raise ValueError(f"{name}: capacity and refill rate must be positive")
+        self.name = name
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.paused_until = 0.0
+        self.updated_at = time.monotonic()
+        self.waiting = 0
+        self.acquisitions = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def acquire(self, amount=1, timeout=None):
+        """
+        Take `amount` tokens, waiting as long as needed (up to `timeout` seconds).
+        Returns the time spent waiting.
+        """
+        # A single request larger than the bucket could never be served otherwise
+        amount = min(float(amount), self.capacity)
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self.paused_until and self.tokens >= amount:
+                        self.tokens -= amount
+                        break
+                    delay = max(self.paused_until - now, (amount - self.tokens) / self.refill_per_second)
+                    if timeout is not None and now + delay - start > timeout:
+                        raise RateLimitTimeout(
+                            f"Waited too long for {amount:.0f} {self.name} (need {delay:.1f}s more)"
+                        )
+                    self._cond.wait(delay)
+            finally:
+                self.waiting -= 1
+            waited = time.monotonic() - start
+            self.acquisitions += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            return waited
+
+    def refund(self, amount):
+        if amount <= 0:
+            return
+        with self._cond:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def snapshot(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'level': round(self.tokens, 1),
+                'capacity': self.capacity,
+                'refillPerSecond': round(self.refill_per_second, 3),
+                'pausedFor': round(max(0.0, self.paused_until - now), 3),
+                'waiting': self.waiting,
+                'acquisitions': self.acquisitions,
+                'totalWaitSeconds': round(self.total_wait, 3),
+                'avgWaitSeconds': round(self.total_wait / self.acquisitions, 3) if self.acquisitions else 0.0,
+                'maxWaitSeconds': round(self.max_wait, 3)
+            }
+
+
+def retry_after_seconds(error):
+    """
+    Read the server's requested delay from a throttling error, if it sent one
+    """
+    if isinstance(error, ThrottledError):
+        return error.retry_after
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_throttled(error):
+    if isinstance(error, ThrottledError):
+        return True
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status in (429, 503)
+
+
+class UpstreamRateLimiter:
+    """
+    Client-side rate limiting for the Azure upstreams: one or more token buckets
+    per upstream (requests and tokens per minute for GPT, images per minute for
+    DALL-E, characters per second for Speech). Calls wait for their budget, and
+    throttled calls are retried after Retry-After or a jittered exponential
+    backoff, pausing the upstream's buckets for every other caller too.
+    A limit of 0 turns that bucket off.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, buckets, max_retries=4, base_delay=1.0, max_delay=60.0, max_wait=120.0):
+        self.buckets = buckets  # {upstream: {dimension: TokenBucket}}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self.counters = {upstream: {'calls': 0, 'throttled': 0, 'retries': 0} for upstream in buckets}
+
+    @classmethod
+    def from_config(cls, config):
+        def limit(setting):
+            value = getattr(config, setting)
+            if value < 0:
+                raise ValueError(f"{setting} must be 0 (unlimited) or positive, got {value}")
+            return value
+
+        def per_minute(name, setting):
+            value = limit(setting)
+            return TokenBucket(name, value, value / 60.0) if value else None
+
+        speech_cps = limit('RATE_LIMIT_SPEECH_CPS')
+        buckets = {
+            'gpt': {
+                'requests': per_minute('gpt requests', 'RATE_LIMIT_GPT_RPM'),
+                'tokens': per_minute('gpt tokens', 'RATE_LIMIT_GPT_TPM')
+            },
+            'dalle': {
+                'images': per_minute('dalle images', 'RATE_LIMIT_DALLE_IPM')
+            },
+            'speech': {
+                # Allow a few seconds of burst so a whole story can start straight away
+                'characters': TokenBucket('speech characters', speech_cps * 5, speech_cps) if speech_cps else None
+            }
+        }
+        # Unlimited dimensions have no bucket; calls simply don't wait for them
+        buckets = {
+            upstream: {dimension: bucket for dimension, bucket in dimensions.items() if bucket is not None}
+            for upstream, dimensions in buckets.items()
+        }
+        return cls(
+            buckets,
+            max_retries=config.RATE_LIMIT_MAX_RETRIES,
+            max_wait=config.RATE_LIMIT_MAX_WAIT_SECONDS
+        )
+
+    @classmethod
+    def shared(cls, config):
+        """
+        The process-wide limiter, so every AzureServices instance and thread draws from the same buckets
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_config(config)
+            return cls._shared
+
+    def _backoff(self, attempt, retry_after):
+        if retry_after is not None:
+            # Honour the server, plus a little jitter so waiting callers don't retry in lockstep
+            return retry_after + random.uniform(0, min(1.0, retry_after * 0.1))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def acquire(self, upstream, cost, wait=True):
+        """
+        Take `cost` from the upstream's buckets, waiting up to max_wait (or not
+        at all with wait=False). Raises RateLimitTimeout, with nothing taken,
+        if the budget isn't available in time.
+        """
+        buckets = self.buckets[upstream]
+        taken = []
+        try:
+            for dimension, amount in cost.items():
+                if dimension in buckets:
+                    buckets[dimension].acquire(amount, timeout=self.max_wait if wait else 0)
+                    taken.append((dimension, amount))
+        except RateLimitTimeout:
+            for dimension, amount in taken:
+                buckets[dimension].refund(amount)
+            raise
+
+    def call(self, upstream, func, cost=None):
+        """
+        Run `func` once the upstream's budget allows it, retrying when throttled.
+        `cost` maps bucket dimensions to amounts, e.g. {'requests': 1, 'tokens': 900},
+        and is charged once per call, not again for each retry.
+        """
+        buckets = self.buckets[upstream]
+        cost = cost or {}
+        with self._lock:
+            self.counters[upstream]['calls'] += 1
+        self.acquire(upstream, cost)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func()
+            except Exception as e:
+                if not is_throttled(e):
+                    raise
+                delay = self._backoff(attempt, retry_after_seconds(e))
+                with self._lock:
+                    self.counters[upstream]['throttled'] += 1
+                if attempt == self.max_retries:
+                    raise
+                print(f"[RATE LIMIT] {upstream} throttled, retrying in {delay:.1f}s (attempt {attempt + 1})", file=sys.stderr)
+                # Everyone else waits in acquire(); this call already holds its budget, so it just sleeps
+                for bucket in buckets.values():
+                    bucket.pause(delay)
+                time.sleep(delay)
+                with self._lock:
+                    self.counters[upstream]['retries'] += 1
+
+    def refund(self, upstream, dimension, amount):
+        """
+        Give back budget that was reserved but not used (e.g. estimated vs actual GPT tokens)
+        """
+        bucket = self.buckets[upstream].get(dimension)
+        if bucket is not None:
+            bucket.refund(amount)
+
+    def metrics(self):
+        with self._lock:
+            counters = {upstream: dict(values) for upstream, values in self.counters.items()}
+        return {
+            upstream: {
+                **counters[upstream],
+                'buckets': {dimension: bucket.snapshot() for dimension, bucket in buckets.items()}
+            }
+            for upstream, buckets in self.buckets.items()
+        }
@@ -0,0 +1,152 @@
+import sys
+import time
+import threading
+
+from config.config import Config
+
+
+class _service:
+    """
+    A registry attribute built by `factory(registry)` on first access, once per
+    process. functools.cached_property no longer locks, so two request threads
+    could otherwise both build the same service.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, registry, owner=None):
+        if registry is None:
+            return self
+        return registry._get(self.name, self.factory)
+
+
+class ServiceRegistry:
+    """
+    Process-wide Azure services for the routes and background jobs, created on
+    first use rather than when the route modules are imported, so a worker
+    boots without any network I/O and the story and speech routes share one
+    AzureServices (one blob client, one container check) instead of two.
+
+    warm() builds everything up front and verifies the blob containers, for
+    `flask warm-services` at deploy time or SERVICES_EAGER_INIT.
+    """
+    def __init__(self, app=None, config=Config):
+        self.config = config
+        self._instances = {}
+        self._seconds = {}
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['services'] = self
+        if app.config.get('SERVICES_EAGER_INIT'):
+            self.warm()
+
+    def _get(self, name, factory):
+        instance = self._instances.get(name, _MISSING)
+        if instance is not _MISSING:
+            return instance
+        # Re-entrant: building story_services builds azure first
+        with self._lock:
+            instance = self._instances.get(name, _MISSING)
+            if instance is _MISSING:
+                start = time.perf_counter()
+                instance = factory(self)
+                self._seconds[name] = time.perf_counter() - start
+                self._instances[name] = instance
+                print(f"[SERVICES] Created {name} in {self._seconds[name]:.2f}s", file=sys.stderr)
+            return instance
+
+    @_service
+    def storage(self):
+        from services.storage_backend import create_storage_backend
+        return create_storage_backend(self.config)
+
+    @_service
+    def azure(self):
+        from services.azure_services import AzureServices
+        return AzureServices(storage=self.storage)
+
+    @_service
+    def generation_cache(self):
+        from services.generation_cache import GenerationCache
+        return GenerationCache.from_config(self.config) if self.config.GENERATION_CACHE_ENABLED else None
+
+    @_service
+    def single_flight(self):
+        from services.single_flight import SingleFlight
+        return SingleFlight()
+
+    @_service
+    def audio_cache(self):
+        from services.audio_cache import AudioCache
+        return AudioCache.from_config(self.config)
+
+    @_service
+    def story_services(self):
+        """
+        Narration already in blob storage is reused as is; otherwise identical in-flight
+        requests coalesce first, then look in the cache, then call Azure
+        """
+        from services.generation_cache import CachingAzureServices
+        from services.single_flight import CoalescingAzureServices
+        from services.audio_cache import AudioCachingServices
+        return AudioCachingServices(
+            CoalescingAzureServices(CachingAzureServices(self.azure, self.generation_cache), self.single_flight),
+            self.audio_cache
+        )
+
+    @_service
+    def batch_services(self):
+        """
+        Batch generation shares these per-upstream limits across all batch requests in the process
+        """
+        from services.upstream_limits import ConcurrencyLimitedServices
+        return ConcurrencyLimitedServices(self.story_services, {
+            'gpt': self.config.BATCH_GPT_CONCURRENCY,
+            'dalle': self.config.BATCH_DALLE_CONCURRENCY,
+            'speech': self.config.BATCH_SPEECH_CONCURRENCY
+        })
+
+    @_service
+    def speech_services(self):
+        """
+        Narration for text we have already synthesized is served from blob storage
+        """
+        from services.audio_cache import AudioCachingServices
+        return AudioCachingServices(self.azure, self.audio_cache)
+
+    def built(self, name):
+        """
+        The named service if something already created it, else None (never builds it)
+        """
+        instance = self._instances.get(name, _MISSING)
+        return None if instance is _MISSING else instance
+
+    def warm(self, verify_containers=True):
+        """
+        Build every service now and check (or create) the blob containers.
+        Returns the seconds each step took.
+        """
+        for name in ('storage', 'azure', 'generation_cache', 'single_flight', 'audio_cache',
+                     'story_services', 'batch_services', 'speech_services'):
+            getattr(self, name)
+        timings = dict(self._seconds)
+        if verify_containers:
+            start = time.perf_counter()
+            self.storage.ensure_containers(force=True)
+            timings['containers'] = time.perf_counter() - start
+        return timings
+
+    def stats(self):
+        with self._lock:
+            return {
+                'created': sorted(self._instances),
+                'creationSeconds': {name: round(seconds, 3) for name, seconds in self._seconds.items()}
+            }
+
+
+_MISSING = object()
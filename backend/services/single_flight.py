@@ -0,0 +1,125 @@
+import sys
+import hashlib
+import threading
+
+from services.generation_cache import make_key, story_key, illustration_key, speech_key
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, callers arriving while it is in flight wait for it and receive
+    the same result or the same exception.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def do(self, key, func, group='default'):
+        with self._lock:
+            stats = self._stats.setdefault(group, {'calls': 0, 'upstream': 0, 'saved': 0, 'errors': 0})
+            stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                stats['upstream'] += 1
+            else:
+                call.waiters += 1
+                stats['saved'] += 1
+
+        if not leader:
+            print(f"[SINGLEFLIGHT] Waiting on in-flight {group} call", file=sys.stderr)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inFlight': len(self._calls),
+                'groups': {group: dict(stats) for group, stats in self._stats.items()}
+            }
+
+
+def _data_digest(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class CoalescingAzureServices:
+    """
+    Wraps AzureServices (or the caching wrapper) so that concurrent requests for
+    the same story, illustration, narration or upload share one upstream call.
+    Uploads are keyed on title and content, so requests that coalesced on the
+    generation step also end up with the same blob URLs.
+    """
+    def __init__(self, services, single_flight):
+        self.services = services
+        self.single_flight = single_flight
+
+    def __getattr__(self, name):
+        return getattr(self.services, name)
+
+    def with_fresh(self):
+        # "Always fresh" callers (including warm pool refills) want their own
+        # generation, so they neither read the cache nor join in-flight calls
+        return self.services.with_fresh()
+
+    def generate_story(self, theme, characters, age_group):
+        key = story_key(self.services, theme, characters, age_group)
+        return self.single_flight.do(
+            key, lambda: self.services.generate_story(theme, characters, age_group), group='story'
+        )
+
+    def generate_illustration(self, title, theme, characters, age_group):
+        key = illustration_key(self.services, theme, characters)
+        return self.single_flight.do(
+            key, lambda: self.services.generate_illustration(title, theme, characters, age_group), group='illustration'
+        )
+
+    def text_to_speech(self, text, voice=None, audio_format=None):
+        key = speech_key(self.services, text, voice, audio_format)
+        return self.single_flight.do(
+            key, lambda: self.services.text_to_speech(text, voice, audio_format), group='speech'
+        )
+
+    def save_story_content(self, story_content, title):
+        key = make_key('save_story', title, _data_digest(story_content))
+        return self.single_flight.do(
+            key, lambda: self.services.save_story_content(story_content, title), group='save_story'
+        )
+
+    def save_image(self, image_data, title):
+        key = make_key('save_image', title, _data_digest(image_data))
+        return self.single_flight.do(key, lambda: self.services.save_image(image_data, title), group='save_image')
+
+    def save_audio(self, audio_data, title, audio_format=None):
+        key = make_key('save_audio', title, _data_digest(audio_data), str(audio_format))
+        return self.single_flight.do(
+            key, lambda: self.services.save_audio(audio_data, title, audio_format), group='save_audio'
+        )
@@ -0,0 +1,90 @@
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import mp3
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])["\')\]]*\s+')
+
+
+def _sentences(paragraph, max_chars):
+    pieces = []
+    for sentence in _SENTENCE_END.split(paragraph):
+        sentence = sentence.strip()
+        # A single sentence longer than a chunk is split on word boundaries
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_text(text, max_chars=800):
+    """
+    Split text into chunks of at most `max_chars`, breaking between paragraphs
+    where possible and otherwise between sentences
+    """
+    chunks = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text.strip()):
+        paragraph = ' '.join(paragraph.split())
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= max_chars else _sentences(paragraph, max_chars)
+        for index, piece in enumerate(pieces):
+            separator = '\n\n' if index == 0 else ' '
+            if current and len(current) + len(separator) + len(piece) <= max_chars:
+                current += separator + piece
+            else:
+                if current:
+                    chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ChunkTiming:
+    def __init__(self, index, chars, seconds, attempts):
+        self.index = index
+        self.chars = chars
+        self.seconds = seconds
+        self.attempts = attempts
+
+
+def synthesize_chunks(synthesize, text, max_chars=800, max_workers=4, max_attempts=3):
+    """
+    Synthesize `text` in chunks on a bounded thread pool and join the MP3s frame
+    by frame. A failed chunk is retried on its own, up to `max_attempts` times.
+    Returns (audio bytes, list of ChunkTiming).
+    """
+    chunks = split_text(text, max_chars)
+
+    def run(index, chunk):
+        start = time.perf_counter()
+        for attempt in range(1, max_attempts + 1):
+            try:
+                audio = synthesize(chunk)
+                return audio, ChunkTiming(index, len(chunk), time.perf_counter() - start, attempt)
+            except Exception as e:
+                if attempt == max_attempts:
+                    raise
+                print(f"[TTS] Chunk {index + 1}/{len(chunks)} failed (attempt {attempt}): {str(e)}", file=sys.stderr)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        results = list(pool.map(lambda args: run(*args), enumerate(chunks)))
+    elapsed = time.perf_counter() - start
+
+    timings = [timing for _, timing in results]
+    for timing in timings:
+        print(f"[TTS] Chunk {timing.index + 1}/{len(chunks)}: {timing.chars} chars in {timing.seconds:.2f}s"
+              f"{f' after {timing.attempts} attempts' if timing.attempts > 1 else ''}", file=sys.stderr)
+    sequential = sum(timing.seconds for timing in timings)
+    print(f"[TTS] {len(chunks)} chunks in {elapsed:.2f}s "
+          f"({sequential:.2f}s of synthesis, {sequential / elapsed if elapsed else 1:.1f}x parallelism)", file=sys.stderr)
+    return mp3.concat(audio for audio, _ in results), timings
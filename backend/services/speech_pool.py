@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import azure.cognitiveservices.speech as speechsdk
+
+
+class PooledSynthesizer:
+    def __init__(self, synthesizer, connection):
+        self.synthesizer = synthesizer
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.healthy = True
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class SynthesizerPool:
+    """
+    Reusable SpeechSynthesizer instances keyed by (voice, output format). Each
+    synthesizer has its own SpeechConfig, so requests can pick a voice without
+    touching shared state, and its connection is opened ahead of use so a
+    checkout doesn't pay the connection setup. A synthesizer is used by one
+    request at a time; broken, idle or heavily used ones are closed instead of
+    being returned to the pool.
+    """
+    def __init__(self, speech_key, region, max_idle=4, idle_seconds=300, max_uses=500):
+        self.speech_key = speech_key
+        self.region = region
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self.max_uses = max_uses
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._warming = False
+        self.counters = {'created': 0, 'reused': 0, 'discarded': 0, 'checkedOut': 0}
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config):
+        """
+        The process-wide pool, so every AzureServices instance reuses the same connections
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    os.getenv("AZURE_SPEECH_KEY"),
+                    os.getenv("AZURE_SPEECH_REGION"),
+                    max_idle=config.SPEECH_POOL_MAX_IDLE,
+                    idle_seconds=config.SPEECH_POOL_IDLE_SECONDS,
+                    max_uses=config.SPEECH_POOL_MAX_USES
+                )
+            return cls._shared
+
+    def _create(self, voice, output_format):
+        config = speechsdk.SpeechConfig(subscription=self.speech_key, region=self.region)
+        config.speech_synthesis_voice_name = voice
+        config.set_speech_synthesis_output_format(output_format)
+        # No audio output: audio arrives as result.audio_data and synthesizing events
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=config, audio_config=None)
+        connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+        pooled = PooledSynthesizer(synthesizer, connection)
+
+        def disconnected(event):
+            pooled.healthy = False
+
+        connection.disconnected.connect(disconnected)
+        # Warm up: open the websocket now rather than on the first speak call
+        connection.open(True)
+        with self._lock:
+            self.counters['created'] += 1
+        return pooled
+
+    def _usable(self, pooled):
+        return (
+            pooled.healthy
+            and pooled.uses < self.max_uses
+            and time.monotonic() - pooled.last_used < self.idle_seconds
+        )
+
+    def _take(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                pooled = idle.pop()
+                if self._usable(pooled):
+                    self.counters['reused'] += 1
+                    return pooled
+                self.counters['discarded'] += 1
+                pooled.close()
+        return None
+
+    def _release(self, key, pooled):
+        pooled.synthesizer.synthesizing.disconnect_all()
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            if self._usable(pooled) and len(idle) < self.max_idle:
+                idle.append(pooled)
+                return
+            self.counters['discarded'] += 1
+        pooled.close()
+
+    @contextmanager
+    def synthesizer(self, voice, output_format):
+        """
+        Check out a synthesizer for the duration of a request. Set `.healthy =
+        False` on it when a synthesis fails so it is closed instead of reused.
+        """
+        key = (voice, output_format)
+        pooled = self._take(key) or self._create(voice, output_format)
+        with self._lock:
+            self.counters['checkedOut'] += 1
+        try:
+            yield pooled
+            pooled.uses += 1
+        except BaseException:
+            pooled.healthy = False
+            raise
+        finally:
+            with self._lock:
+                self.counters['checkedOut'] -= 1
+            self._release(key, pooled)
+
+    def warm(self, voice, output_format, count=1):
+        """
+        Pre-connect `count` synthesizers for a voice, e.g. the default one at startup
+        """
+        key = (voice, output_format)
+        for _ in range(count):
+            try:
+                self._release(key, self._create(voice, output_format))
+            except Exception as e:
+                print(f"[SPEECH POOL] Warm-up failed: {str(e)}", file=sys.stderr)
+                return
+
+    def warm_in_background(self, voice, output_format, count=1):
+        """
+        Start warm() on a daemon thread, once per pool, so startup doesn't wait on Speech
+        """
+        with self._lock:
+            if self._warming or count <= 0:
+                return
+            self._warming = True
+        threading.Thread(target=self.warm, args=(voice, output_format, count), daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                'idle': {f"{voice}/{output_format.name}": len(idle) for (voice, output_format), idle in self._idle.items()}
+            }
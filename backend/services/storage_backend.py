@@ -0,0 +1,192 @@
+import hashlib
+import threading
+from collections import namedtuple
+from urllib.parse import urlparse, unquote
+
+from config.config import Config
+
+
+# A listed blob; last_modified is a timezone-aware datetime
+BlobInfo = namedtuple('BlobInfo', 'name last_modified size')
+
+
+def content_blob_name(data, extension):
+    """
+    Content-addressed name: the SHA-256 of the bytes, so identical content
+    always maps to the same blob whatever the story's title
+    """
+    return f"{hashlib.sha256(data).hexdigest()}.{extension}"
+
+
+def blob_from_url(url):
+    """
+    (container, blob name) of a URL handed out by a storage backend, or None.
+    Both the Azure and the local URLs end in /<container>/<blob name>.
+    """
+    if not url:
+        return None
+    segments = urlparse(url).path.rstrip('/').rsplit('/', 2)
+    if len(segments) < 3 or not segments[1] or not segments[2]:
+        return None
+    return unquote(segments[1]), unquote(segments[2])
+
+
+class StorageBackend:
+    """
+    Where story text, narration and illustrations are kept. AzureServices
+    only talks to this interface, so the same pipeline runs on Azure Blob
+    Storage (BlobStorageService) or on a local disk (LocalStorageBackend).
+
+    Blobs live in named containers (stories, audio, images) and are handed
+    out to browsers as signed, expiring read URLs. The last path segment of
+    a signed URL is always the blob name (see audio_cache.blob_name_from_url).
+    """
+    CONTAINERS = ('stories', 'audio', 'images')
+    # Blob Batch accepts at most 256 sub-requests
+    MAX_BATCH_DELETE = 256
+
+    def __init__(self):
+        self._content_stats = {'uploads': 0, 'uploadedBytes': 0, 'deduplicated': 0, 'savedBytes': 0}
+        self._content_lock = threading.Lock()
+
+    def ensure_containers(self, force=False):
+        """
+        Check (or create) the containers once per process, every time with `force`
+        """
+        raise NotImplementedError
+
+    def upload_blob(self, container_name, blob_name, data, content_type=None):
+        """
+        Store `data`, replacing any blob of the same name, and return its signed URL
+        """
+        raise NotImplementedError
+
+    def upload_blobs(self, uploads):
+        """
+        Store (container, blob name, data, content type) tuples and return their signed URLs in order
+        """
+        return [self.upload_blob(*upload) for upload in uploads]
+
+    def exists(self, container_name, blob_name):
+        raise NotImplementedError
+
+    def touch(self, container_name, blob_name):
+        """
+        Set a blob's last-modified time to now without changing its content,
+        so garbage collection treats it as just uploaded. Returns False if
+        the blob does not exist.
+        """
+        raise NotImplementedError
+
+    def upload_contents(self, uploads):
+        """
+        Store (container, data, extension, content type) tuples under
+        content-addressed names and return their signed URLs in order. A blob
+        that already exists is not uploaded again but touched (one request per
+        blob, instead of a HEAD), so the garbage collector's grace period
+        covers it until the caller's story is committed; identical content in
+        the same batch is uploaded once.
+        """
+        named = [
+            (container_name, content_blob_name(data, extension), data, content_type)
+            for container_name, data, extension, content_type in uploads
+        ]
+        missing = {}
+        for container_name, blob_name, data, content_type in named:
+            if (container_name, blob_name) not in missing and not self.touch(container_name, blob_name):
+                missing[(container_name, blob_name)] = (container_name, blob_name, data, content_type)
+        if missing:
+            self.upload_blobs(list(missing.values()))
+        uploaded = sum(len(upload[2]) for upload in missing.values())
+        total = sum(len(upload[2]) for upload in named)
+        with self._content_lock:
+            self._content_stats['uploads'] += len(missing)
+            self._content_stats['uploadedBytes'] += uploaded
+            self._content_stats['deduplicated'] += len(named) - len(missing)
+            self._content_stats['savedBytes'] += total - uploaded
+        return [self.signed_url(container_name, blob_name) for container_name, blob_name, _, _ in named]
+
+    def upload_content(self, container_name, data, extension, content_type=None):
+        return self.upload_contents([(container_name, data, extension, content_type)])[0]
+
+    def content_stats(self):
+        """
+        Content-addressed uploads made and skipped because the blob already existed
+        """
+        with self._content_lock:
+            return dict(self._content_stats)
+
+    def start_staged_upload(self, container_name, blob_name, content_type=None, block_size=1024 * 1024):
+        """
+        Begin an upload fed incrementally with write() and finished with
+        commit(), which returns the signed URL, or abort()
+        """
+        raise NotImplementedError
+
+    def stream_blob(self, container_name, blob_name, chunk_size=1024 * 1024):
+        """
+        Iterate over a blob's content in chunks of at most `chunk_size` bytes
+        """
+        raise NotImplementedError
+
+    def read_blob(self, container_name, blob_name):
+        return b''.join(self.stream_blob(container_name, blob_name))
+
+    def signed_url(self, container_name, blob_name):
+        """
+        Read-only URL for a blob that expires after a year
+        """
+        raise NotImplementedError
+
+    def get_blob_url(self, container_name, blob_name):
+        """
+        The blob's URL without a signature
+        """
+        raise NotImplementedError
+
+    def delete_blob(self, container_name, blob_name):
+        raise NotImplementedError
+
+    def list_blobs(self, container_name):
+        """
+        Names of the blobs in a container
+        """
+        raise NotImplementedError
+
+    def list_blob_pages(self, container_name, page_size=1000):
+        """
+        Iterate over a container's blobs as lists of at most `page_size` BlobInfo
+        """
+        raise NotImplementedError
+
+    def delete_blobs(self, container_name, blob_names, unmodified_since=None):
+        """
+        Delete up to MAX_BATCH_DELETE blobs in one call. Returns (deleted,
+        missing, failed, modified) lists of names; a missing blob is already
+        gone. With `unmodified_since` (an aware datetime), blobs uploaded or
+        touched after it are left alone and listed as modified.
+        """
+        raise NotImplementedError
+
+    def _content_type(self, container_name, content_type=None):
+        if content_type is None:
+            content_type_map = {
+                'images': 'image/png',
+                'audio': 'audio/mpeg',
+                'stories': 'text/plain'
+            }
+            content_type = content_type_map.get(container_name, 'application/octet-stream')
+        return content_type
+
+
+def create_storage_backend(config=Config):
+    """
+    The backend named by STORAGE_BACKEND: 'azure' (the default) or 'local'
+    """
+    if config.STORAGE_BACKEND == 'azure':
+        from services.blob_storage import BlobStorageService
+        return BlobStorageService()
+    if config.STORAGE_BACKEND == 'local':
+        from services.local_storage import LocalStorageBackend
+        return LocalStorageBackend.from_config(config)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{config.STORAGE_BACKEND}' (expected 'azure' or 'local')")
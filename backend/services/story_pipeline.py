@@ -0,0 +1,295 @@
+import sys
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+PLACEHOLDER_IMAGE_URL = "/static/placeholder.png"
+
+# Marker for stages whose failure must fail the whole pipeline
+REQUIRED = object()
+
+
+def derive_title(story_content, data):
+    """
+    Pick the story title: the requested one, the markdown heading of the story,
+    or a simple title based on theme and characters
+    """
+    title = data.get('title', '')
+    if not title:
+        if '**' in story_content and '**\n' in story_content:
+            # Extract title from markdown format if present
+            title = story_content.split('**')[1].strip()
+        else:
+            characters_str = ', '.join(data['characters'][:2]) if data['characters'] else ''
+            title = f"{data['theme']} Adventure with {characters_str}"
+    return title
+
+
+class PipelineStage:
+    """
+    A single unit of work in the story pipeline.
+
+    `func` receives the dict of results produced so far. A stage with a fallback
+    is optional: if it (or one of its dependencies) fails, the fallback is used
+    as its result and the pipeline carries on.
+    """
+    def __init__(self, name, func, depends_on=(), fallback=REQUIRED):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.fallback = fallback
+
+    @property
+    def required(self):
+        return self.fallback is REQUIRED
+
+
+class PipelineError(Exception):
+    def __init__(self, stage, error, timings):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.timings = timings
+
+
+class PipelineResult:
+    def __init__(self, results, timings, errors, elapsed):
+        self.results = results
+        self.timings = timings
+        self.errors = errors
+        self.elapsed = elapsed
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    def get(self, name, default=None):
+        return self.results.get(name, default)
+
+    def server_timing(self):
+        """
+        Format the stage timings as a Server-Timing header value
+        """
+        entries = [f"{name};dur={seconds * 1000:.0f}" for name, seconds in self.timings.items()]
+        entries.append(f"total;dur={self.elapsed * 1000:.0f}")
+        return ', '.join(entries)
+
+
+def illustration_stages(services, title, theme, characters, age_group, count=1):
+    """
+    Stages that regenerate an illustration: `count` candidates from DALL-E,
+    each saved to blob storage (save_image_0, ...) with its image variants
+    (image_variants_0, ...). Candidates that fail to save are dropped.
+    """
+    stages = [
+        PipelineStage(
+            'illustration',
+            lambda r: services.generate_illustrations(title, theme, characters, age_group, count)
+        )
+    ]
+    for index in range(count):
+        stages += [
+            PipelineStage(
+                f'save_image_{index}',
+                lambda r, index=index: services.save_image(r['illustration'][index], title),
+                depends_on=('illustration',),
+                fallback=None
+            ),
+            PipelineStage(
+                f'image_variants_{index}',
+                lambda r, index=index: services.create_image_variants(r[f'save_image_{index}']),
+                depends_on=(f'save_image_{index}',),
+                fallback=None
+            )
+        ]
+    return stages
+
+
+class StoryPipeline:
+    """
+    Runs the story creation stages (GPT, DALL-E, TTS and the blob uploads) as a
+    dependency graph. In concurrent mode independent stages run in a thread pool,
+    so the request takes roughly as long as the critical path
+    (story -> speech -> audio upload) instead of the sum of all stages.
+
+    `on_stage(name, status, seconds, error)` is called from the calling thread
+    whenever a stage starts running, succeeds, fails or is skipped.
+    """
+    def __init__(self, services, concurrent=True, max_workers=4, on_stage=None):
+        self.services = services
+        self.concurrent = concurrent
+        self.max_workers = max_workers
+        self.on_stage = on_stage
+
+    def build_stages(self, data):
+        services = self.services
+        # Keep passing characters the same way the route always has
+        characters_arg = json.dumps(data['characters'])
+        return [
+            PipelineStage(
+                'story',
+                lambda r: services.generate_story(data['theme'], characters_arg, data['age_group'])
+            ),
+            PipelineStage('title', lambda r: derive_title(r['story'], data), depends_on=('story',)),
+            # The illustration prompt only needs theme and characters, so it does not wait for the story
+            PipelineStage(
+                'illustration',
+                lambda r: services.generate_illustration(
+                    data.get('title') or data['theme'], data['theme'], characters_arg, data['age_group']
+                ),
+                fallback=PLACEHOLDER_IMAGE_URL
+            ),
+            PipelineStage(
+                'save_story',
+                lambda r: services.save_story_content(r['story'], r['title']),
+                depends_on=('story', 'title'),
+                fallback=None
+            ),
+            PipelineStage(
+                'save_image',
+                lambda r: services.save_image(r['illustration'], r['title']),
+                depends_on=('illustration', 'title'),
+                fallback=PLACEHOLDER_IMAGE_URL
+            ),
+            # Thumbnails and WebP/AVIF copies for list views; a story is fine without them
+            PipelineStage(
+                'image_variants',
+                lambda r: services.create_image_variants(r['save_image']),
+                depends_on=('save_image',),
+                fallback=None
+            ),
+            PipelineStage('speech', lambda r: services.text_to_speech(r['story']), depends_on=('story',), fallback=None),
+            PipelineStage(
+                'save_audio',
+                lambda r: services.save_audio(r['speech'], r['title']),
+                depends_on=('speech', 'title'),
+                fallback=None
+            ),
+        ]
+
+    def run(self, data, stages=None, seed=None):
+        """
+        Run all stages for the given request data and return a PipelineResult.
+
+        `seed` maps stage names to results that are already known (e.g. a story
+        that was streamed to the client); those stages are not run again.
+        """
+        stages = stages or self.build_stages(data)
+        start = time.perf_counter()
+        state = _RunState(self.on_stage)
+        if seed:
+            state.results.update(seed)
+            state.succeeded.update(seed)
+            stages = [stage for stage in stages if stage.name not in seed]
+        if self.concurrent and self.max_workers > 1:
+            self._run_concurrent(stages, state)
+        else:
+            self._run_sequential(stages, state)
+        elapsed = time.perf_counter() - start
+        timings = ', '.join(f"{name}={seconds:.2f}s" for name, seconds in state.timings.items())
+        print(f"[PIPELINE] Finished in {elapsed:.2f}s ({timings})", file=sys.stderr)
+        return PipelineResult(state.results, state.timings, state.errors, elapsed)
+
+    def _run_sequential(self, stages, state):
+        for stage in stages:
+            if state.blocked(stage):
+                state.skip(stage)
+                continue
+            state.start(stage)
+            started = time.perf_counter()
+            try:
+                value = stage.func(state.results)
+            except Exception as e:
+                state.fail(stage, e, time.perf_counter() - started)
+            else:
+                state.succeed(stage, value, time.perf_counter() - started)
+
+    def _run_concurrent(self, stages, state):
+        pending = list(stages)
+        running = {}
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='story-pipeline')
+        try:
+            while pending or running:
+                for stage in list(pending):
+                    if state.blocked(stage):
+                        pending.remove(stage)
+                        state.skip(stage)
+                    elif state.ready(stage):
+                        pending.remove(stage)
+                        state.start(stage)
+                        # Snapshot the results so the stage never sees a dict being mutated
+                        future = pool.submit(_timed, stage.func, dict(state.results))
+                        running[future] = stage
+                if not running:
+                    if pending:
+                        names = ', '.join(stage.name for stage in pending)
+                        raise ValueError(f"Pipeline stages have unsatisfiable dependencies: {names}")
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    value, error, seconds = future.result()
+                    if error is None:
+                        state.succeed(stage, value, seconds)
+                    else:
+                        state.fail(stage, error, seconds)
+        finally:
+            # On a required stage failure, don't hold the request for stages still in flight
+            pool.shutdown(wait=not running, cancel_futures=True)
+
+
+def _timed(func, results):
+    started = time.perf_counter()
+    try:
+        return func(results), None, time.perf_counter() - started
+    except Exception as e:
+        return None, e, time.perf_counter() - started
+
+
+class _RunState:
+    def __init__(self, on_stage=None):
+        self.on_stage = on_stage
+        self.results = {}
+        self.timings = {}
+        self.errors = {}
+        self.failed = set()
+        self.succeeded = set()
+
+    def ready(self, stage):
+        return all(dep in self.succeeded for dep in stage.depends_on)
+
+    def blocked(self, stage):
+        return any(dep in self.failed for dep in stage.depends_on)
+
+    def notify(self, stage, status, seconds=None, error=None):
+        if self.on_stage:
+            self.on_stage(stage.name, status, seconds, error)
+
+    def start(self, stage):
+        self.notify(stage, 'running')
+
+    def succeed(self, stage, value, seconds):
+        self.results[stage.name] = value
+        self.timings[stage.name] = seconds
+        self.succeeded.add(stage.name)
+        print(f"[PIPELINE] Stage '{stage.name}' finished in {seconds:.2f}s", file=sys.stderr)
+        self.notify(stage, 'succeeded', seconds)
+
+    def fail(self, stage, error, seconds):
+        self.timings[stage.name] = seconds
+        self.errors[stage.name] = str(error)
+        self.failed.add(stage.name)
+        print(f"[PIPELINE ERROR] Stage '{stage.name}' failed after {seconds:.2f}s: {error}", file=sys.stderr)
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+        self.notify(stage, 'failed', seconds, str(error))
+        if stage.required:
+            raise PipelineError(stage.name, error, self.timings)
+        self.results[stage.name] = stage.fallback
+
+    def skip(self, stage):
+        self.failed.add(stage.name)
+        self.notify(stage, 'skipped')
+        if stage.required:
+            raise PipelineError(stage.name, 'a dependency failed', self.timings)
+        self.results[stage.name] = stage.fallback
+        print(f"[PIPELINE] Stage '{stage.name}' skipped because a dependency failed", file=sys.stderr)
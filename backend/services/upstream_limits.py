@@ -0,0 +1,41 @@
+import threading
+
+
+class ConcurrencyLimitedServices:
+    """
+    Caps how many GPT, DALL-E and Speech calls made through this wrapper run at
+    the same time, so a large batch can't flood one upstream while the others
+    sit idle. Calls over the limit wait for a free slot; a limit of 0 leaves
+    that upstream unlimited.
+    """
+    UPSTREAMS = {
+        'generate_story': 'gpt',
+        'generate_illustration': 'dalle',
+        'text_to_speech': 'speech'
+    }
+
+    def __init__(self, services, limits, semaphores=None):
+        self.services = services
+        self.limits = dict(limits)
+        for upstream, limit in self.limits.items():
+            if limit < 0:
+                raise ValueError(f"Concurrency limit for {upstream} must be 0 (unlimited) or more, got {limit}")
+        self.semaphores = semaphores or {
+            upstream: threading.BoundedSemaphore(limit) for upstream, limit in self.limits.items() if limit > 0
+        }
+
+    def __getattr__(self, name):
+        attr = getattr(self.services, name)
+        upstream = self.UPSTREAMS.get(name)
+        if upstream is None or upstream not in self.semaphores:
+            return attr
+        semaphore = self.semaphores[upstream]
+
+        def limited(*args, **kwargs):
+            with semaphore:
+                return attr(*args, **kwargs)
+
+        return limited
+
+    def with_fresh(self):
+        return ConcurrencyLimitedServices(self.services.with_fresh(), self.limits, self.semaphores)
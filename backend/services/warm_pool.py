@@ -0,0 +1,168 @@
+import sys
+import json
+
+from services.generation_cache import make_key, canonical_characters
+from services.job_queue import run_job_pipeline
+from services.image_variants import dump_variants
+
+
+def bucket_key(theme, characters, age_group):
+    return make_key(
+        'warm_pool',
+        str(theme).strip().casefold(),
+        canonical_characters(characters),
+        str(age_group).strip().casefold()
+    )
+
+
+class WarmPool:
+    """
+    Keeps WARM_POOL_SIZE ready-to-serve stories (text, stored image and audio)
+    for each preset (theme, age group, characters) bucket in WARM_POOL_BUCKETS.
+    A matching POST /api/stories claims one with a single DB write instead of
+    running the generation pipeline; refills run as 'warm_pool' background jobs.
+    """
+    def __init__(self, app=None, job_queue=None):
+        self.buckets = {}
+        self.size = 0
+        self.job_queue = None
+        if app is not None:
+            self.init_app(app, job_queue)
+
+    def init_app(self, app, job_queue):
+        self.app = app
+        self.job_queue = job_queue
+        self.size = app.config.get('WARM_POOL_SIZE', 0)
+        self.buckets = {}
+        for spec in json.loads(app.config.get('WARM_POOL_BUCKETS') or '[]'):
+            spec = {
+                'theme': spec['theme'],
+                'characters': list(spec.get('characters', [])),
+                'age_group': spec['age_group']
+            }
+            self.buckets[bucket_key(spec['theme'], spec['characters'], spec['age_group'])] = spec
+        job_queue.register_handler('warm_pool', self._run_refill_job)
+        app.extensions['warm_pool'] = self
+
+        if self.enabled:
+            print(f"[WARM POOL] {len(self.buckets)} buckets, {self.size} stories each", file=sys.stderr)
+            self._refill_checked = False
+
+            @app.before_request
+            def _top_up_warm_pool():
+                if not self._refill_checked:
+                    self._refill_checked = True
+                    self.refill()
+
+    @property
+    def enabled(self):
+        return bool(self.buckets) and self.size > 0
+
+    def bucket_for(self, data):
+        if not self.enabled or data.get('fresh'):
+            return None
+        key = bucket_key(data['theme'], data['characters'], data['age_group'])
+        return key if key in self.buckets else None
+
+    def claim(self, data):
+        """
+        Turn a pooled story matching the request into a Story, or return None
+        """
+        from extensions import db
+        from models.models import Story, WarmStory, release_blob_refs
+
+        key = self.bucket_for(data)
+        if key is None:
+            return None
+        candidates = WarmStory.query.filter_by(bucket=key).order_by(WarmStory.created_at).limit(3).all()
+        for warm in candidates:
+            # The conditional delete makes sure two workers never hand out the same story
+            if WarmStory.query.filter_by(id=warm.id).delete(synchronize_session=False) != 1:
+                db.session.rollback()
+                continue
+            # The story below takes over the pooled story's blobs
+            release_blob_refs(db.session, warm)
+            story = Story(
+                title=data.get('title') or warm.title,
+                content=warm.content,
+                theme=data['theme'],
+                characters=json.dumps(data['characters']),
+                age_group=data['age_group'],
+                image_url=warm.image_url,
+                image_variants=warm.image_variants,
+                audio_url=warm.audio_url,
+                content_url=warm.content_url
+            )
+            db.session.add(story)
+            db.session.commit()
+            print(f"[WARM POOL] Served story {story.id} from bucket {key[:8]}", file=sys.stderr)
+            self.refill(key)
+            return story
+        print(f"[WARM POOL] Bucket {key[:8]} is empty", file=sys.stderr)
+        self.refill(key)
+        return None
+
+    def levels(self):
+        from extensions import db
+        from models.models import WarmStory
+
+        counts = dict(
+            db.session.query(WarmStory.bucket, db.func.count(WarmStory.id)).group_by(WarmStory.bucket).all()
+        )
+        return [
+            {**spec, 'ready': counts.get(key, 0), 'target': self.size}
+            for key, spec in self.buckets.items()
+        ]
+
+    def refill(self, key=None):
+        """
+        Enqueue generation jobs for buckets below the target size
+        """
+        from extensions import db
+        from models.models import StoryJob, WarmStory
+
+        if not self.enabled:
+            return 0
+        try:
+            in_flight = {}
+            for job in StoryJob.query.filter(
+                StoryJob.kind == 'warm_pool', StoryJob.status.in_(('queued', 'running'))
+            ):
+                bucket = json.loads(job.payload).get('bucket')
+                in_flight[bucket] = in_flight.get(bucket, 0) + 1
+            enqueued = 0
+            for bucket in ([key] if key else self.buckets):
+                ready = WarmStory.query.filter_by(bucket=bucket).count()
+                for _ in range(self.size - ready - in_flight.get(bucket, 0)):
+                    self.job_queue.enqueue('warm_pool', {**self.buckets[bucket], 'bucket': bucket})
+                    enqueued += 1
+            if enqueued:
+                print(f"[WARM POOL] Enqueued {enqueued} refill jobs", file=sys.stderr)
+            return enqueued
+        except Exception as e:
+            db.session.rollback()
+            print(f"[WARM POOL ERROR] Failed to refill: {str(e)}", file=sys.stderr)
+            return 0
+
+    def _run_refill_job(self, queue, job, services):
+        from extensions import db
+        from models.models import WarmStory
+
+        data = json.loads(job.payload)
+        # Pooled stories must differ from each other, so never serve them from the generation cache
+        data['fresh'] = True
+        result = run_job_pipeline(queue, job, services, data)
+        warm = WarmStory(
+            bucket=data['bucket'],
+            title=result['title'],
+            content=result['story'],
+            theme=data['theme'],
+            characters=json.dumps(data['characters']),
+            age_group=data['age_group'],
+            image_url=result['save_image'],
+            image_variants=dump_variants(result.get('image_variants')),
+            audio_url=result['save_audio'],
+            content_url=result['save_story']
+        )
+        db.session.add(warm)
+        return warm
@@ -0,0 +1,74 @@
+import pytest
+from flask import Flask
+
+from config.config import Config
+# The same db as extensions.db, imported through the models so their tables are registered
+from models.models import db
+from tests.fakes import FakeStoryServices
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    A bare Flask app on its own SQLite file with the models' tables, without
+    the blueprints or the background extensions create_app() starts
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        STORY_PIPELINE_CONCURRENT=False
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def fake_services():
+    return FakeStoryServices()
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch, fake_services):
+    """
+    Build the full create_app() app on its own SQLite file and return its test
+    client. Keyword arguments override Config; the job workers and the blob
+    sweeper are off and `fake_services` stands in for the registry's story and batch services.
+    """
+    from create_app import create_app
+    from extensions import service_registry
+
+    apps = []
+
+    def make(**config):
+        overrides = {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+            'STORY_JOB_WORKERS': 0,
+            'GC_SWEEP_INTERVAL_SECONDS': 0,
+            'STORY_PIPELINE_CONCURRENT': False,
+            'SERVICES_EAGER_INIT': False,
+            **config
+        }
+        for name, value in overrides.items():
+            monkeypatch.setattr(Config, name, value, raising=False)
+        app = create_app()
+        app.config['TESTING'] = True
+        monkeypatch.setattr(service_registry, '_instances', {
+            'story_services': fake_services, 'batch_services': fake_services
+        })
+        with app.app_context():
+            db.create_all()
+        apps.append(app)
+        return app.test_client()
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
@@ -0,0 +1,45 @@
+class FakeStoryServices:
+    """
+    Stands in for AzureServices in job tests: every pipeline stage returns
+    canned data at once. `failures` maps a method name to how many of its
+    next calls should raise.
+    """
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+
+    def _call(self, name, result):
+        self.calls.append(name)
+        if self.failures.get(name):
+            self.failures[name] -= 1
+            raise RuntimeError(f"{name} failed (simulated)")
+        return result
+
+    def with_fresh(self):
+        return self
+
+    def generate_story(self, theme, characters, age_group):
+        return self._call('generate_story', f"Once upon a time in {theme} there lived a fox. The end.")
+
+    def stream_story(self, theme, characters, age_group):
+        story = self._call('stream_story', f"Once upon a time in {theme} there lived a fox. The end.")
+        for word in story.split(' '):
+            yield word + ' '
+
+    def generate_illustration(self, title, theme, characters, age_group):
+        return self._call('generate_illustration', b'\x89PNG fake illustration')
+
+    def save_story_content(self, story, title):
+        return self._call('save_story_content', 'http://blobs.test/stories/story.txt')
+
+    def save_image(self, image, title):
+        return self._call('save_image', 'http://blobs.test/images/image.png')
+
+    def create_image_variants(self, image_url):
+        return self._call('create_image_variants', None)
+
+    def text_to_speech(self, story):
+        return self._call('text_to_speech', b'ID3 fake narration')
+
+    def save_audio(self, audio, title):
+        return self._call('save_audio', 'http://blobs.test/audio/audio.mp3')
@@ -0,0 +1,63 @@
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+from fake_azure import FakeAzureServer, FakeAzureProfile
+from fake_azure.server import ACCOUNT_NAME, ACCOUNT_KEY
+from services.async_blob_storage import AsyncBlobStorage
+
+
+@pytest.fixture
+def fake_azure():
+    server = FakeAzureServer(FakeAzureProfile.instant(), quiet=True).start()
+    server.app.config['FAKE_AZURE_BLOBS'].create_container('audio')
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def storage(fake_azure):
+    storage = AsyncBlobStorage(
+        f"{fake_azure.url}/{ACCOUNT_NAME}", ACCOUNT_KEY,
+        block_size=64 * 1024, max_concurrency=4, single_put_size=64 * 1024
+    )
+    yield storage
+    storage.close()
+
+
+def stored(fake_azure, name):
+    return fake_azure.app.config['FAKE_AZURE_BLOBS'].container('audio')['blobs'][name]
+
+
+def test_uploads_run_together_and_large_blobs_go_up_in_blocks(fake_azure, storage):
+    small = b'ID3 short narration'
+    large = bytes(range(256)) * 1200  # about 300 KB: five 64 KB blocks
+
+    names = storage.upload_many([
+        ('audio', 'small.mp3', small, 'audio/mpeg'),
+        ('audio', 'large.mp3', large, 'audio/mpeg')
+    ])
+
+    assert names == ['small.mp3', 'large.mp3']
+    assert stored(fake_azure, 'small.mp3')['data'] == small
+    assert stored(fake_azure, 'large.mp3')['data'] == large
+    assert stored(fake_azure, 'large.mp3')['content_type'] == 'audio/mpeg'
+    # One Put Blob for the small one; five Put Blocks and a Put Block List for the large one
+    assert fake_azure.app.test_client().get('/_fake/stats').json['requests']['blob'] == 7
+
+
+def test_a_failed_upload_is_raised_after_the_others_finish(fake_azure, storage):
+    with pytest.raises(ResourceNotFoundError):
+        storage.upload_many([
+            ('audio', 'kept.mp3', b'ID3', 'audio/mpeg'),
+            ('missing-container', 'lost.mp3', b'ID3', 'audio/mpeg')
+        ])
+
+    assert stored(fake_azure, 'kept.mp3')['data'] == b'ID3'
+
+
+def test_one_loop_serves_every_upload(storage):
+    storage.upload_blob('audio', 'one.mp3', b'ID3', 'audio/mpeg')
+    loop = storage._loop
+    storage.upload_blob('audio', 'two.mp3', b'ID3', 'audio/mpeg')
+
+    assert storage._loop is loop and loop.is_running()
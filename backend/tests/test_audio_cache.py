@@ -0,0 +1,63 @@
+import hashlib
+
+from services.audio_cache import AudioCache, AudioCachingServices, CachedAudio, blob_name_from_url
+from services.audio_formats import get_audio_format
+
+
+class ContentAddressedServices:
+    """
+    Speech and audio storage the way AzureServices does them with
+    BLOB_CONTENT_ADDRESSING: each save names the blob by its content's hash
+    """
+    speech_voice = 'en-US-JennyNeural'
+
+    def __init__(self):
+        self.blobs = {}
+        self.syntheses = 0
+
+    def speech_audio_format(self, audio_format=None):
+        return get_audio_format(audio_format)
+
+    def text_to_speech(self, text, voice=None, audio_format=None):
+        self.syntheses += 1
+        # Synthesis is not byte-for-byte repeatable, so every call returns different audio
+        return b'ID3' + f"{text}#{self.syntheses}".encode('utf-8')
+
+    def save_audio(self, audio_data, title, audio_format=None):
+        extension = self.speech_audio_format(audio_format).extension
+        name = f"{hashlib.sha256(bytes(audio_data)).hexdigest()}.{extension}"
+        self.blobs[name] = bytes(audio_data)
+        return f"http://blobs.test/audio/{name}?sig=x"
+
+
+def narrate(services, text, audio_format=None):
+    return services.save_audio(services.text_to_speech(text, audio_format=audio_format), 'Title', audio_format)
+
+
+def test_repeated_narration_is_served_from_the_cache(tmp_path):
+    inner = ContentAddressedServices()
+    services = AudioCachingServices(inner, AudioCache(str(tmp_path / 'audio.db')))
+
+    url = narrate(services, 'Once upon a time.')
+    assert isinstance(services.text_to_speech('Once upon a time.'), CachedAudio)
+    assert narrate(services, 'Once upon a time.') == url
+    assert inner.syntheses == 1
+
+
+def test_new_narration_after_eviction_does_not_overwrite_stored_blob(tmp_path):
+    inner = ContentAddressedServices()
+    cache = AudioCache(str(tmp_path / 'audio.db'))
+    services = AudioCachingServices(inner, cache)
+
+    first = blob_name_from_url(narrate(services, 'Once upon a time.'))
+    stored = inner.blobs[first]
+    # The cache entry goes, but a story may still point at the blob
+    assert cache.invalidate() == 1
+
+    second = blob_name_from_url(narrate(services, 'Once upon a time.'))
+    other_format = blob_name_from_url(narrate(services, 'Once upon a time.', 'ogg-opus'))
+
+    assert inner.syntheses == 3
+    assert len({first, second, other_format}) == 3
+    assert inner.blobs[first] == stored
+    assert second == f"{hashlib.sha256(inner.blobs[second]).hexdigest()}.mp3"
@@ -0,0 +1,150 @@
+import struct
+
+import pytest
+
+from extensions import service_registry
+from services.audio_formats import AUDIO_FORMATS, get_audio_format, negotiate, ogg_opus_duration, webm_duration
+
+
+class FakeSpeechServices:
+    """
+    Stands in for the registry's speech services, recording the format each call asked for
+    """
+    def __init__(self):
+        self.calls = []
+
+    def text_to_speech(self, text, voice=None, audio_format=None):
+        self.calls.append(('text_to_speech', audio_format))
+        return b'audio'
+
+    def save_audio(self, audio, title, audio_format=None):
+        self.calls.append(('save_audio', audio_format))
+        return f"https://blobs.test/audio/{title}.{AUDIO_FORMATS[audio_format].extension}"
+
+    def cached_audio_url(self, text, voice, audio_format):
+        return None
+
+    def stream_audio(self, text, title, voice=None, audio_format=None):
+        self.calls.append(('stream_audio', audio_format))
+        return f"https://blobs.test/audio/{title}", (chunk for chunk in [b'first', b'rest'])
+
+
+@pytest.fixture
+def speech(make_client):
+    client = make_client()
+    services = FakeSpeechServices()
+    service_registry._instances['speech_services'] = services
+    return client, services
+
+
+def test_explicit_format_wins_over_accept():
+    assert negotiate('audio/ogg', 'webm-opus').name == 'webm-opus'
+
+
+def test_accept_picks_the_highest_quality_audio_type():
+    accept = 'audio/webm;q=0.5, audio/ogg; codecs=opus;q=0.9, audio/mpeg;q=0.7'
+
+    assert negotiate(accept).name == 'ogg-opus'
+
+
+def test_wildcards_and_unknown_types_fall_back_to_mp3():
+    assert negotiate('*/*').name == 'mp3'
+    assert negotiate('audio/*, audio/flac').name == 'mp3'
+    assert negotiate(None).name == 'mp3'
+
+
+def test_accept_ignores_formats_that_are_not_allowed():
+    assert negotiate('audio/ogg, audio/webm;q=0.5', allowed=['mp3', 'webm-opus']).name == 'webm-opus'
+
+
+def test_unknown_or_disallowed_format_is_rejected():
+    with pytest.raises(ValueError):
+        get_audio_format('flac')
+    with pytest.raises(ValueError):
+        get_audio_format('ogg-opus', allowed=['webm-opus'])
+    # MP3 can't be switched off
+    assert get_audio_format('mp3', allowed=[]).name == 'mp3'
+
+
+def test_mime_type_drops_the_codecs_parameter():
+    assert AUDIO_FORMATS['ogg-opus'].mime_type == 'audio/ogg'
+    assert AUDIO_FORMATS['ogg-opus'].content_type == 'audio/ogg; codecs=opus'
+
+
+def ogg_page(granule, payload=b''):
+    return b'OggS\x00\x00' + struct.pack('<q', granule) + b'\x00' * 13 + payload
+
+
+def test_ogg_opus_duration_subtracts_pre_skip():
+    head = b'OpusHead\x01\x01' + struct.pack('<H', 312) + b'\x00' * 7
+    data = ogg_page(0, head) + ogg_page(-1) + ogg_page(48000 + 312) + ogg_page(-1)
+
+    assert ogg_opus_duration(data) == pytest.approx(1.0)
+
+
+def element(element_id, body):
+    return element_id + bytes([0x80 | len(body)]) + body
+
+
+UNKNOWN_SIZE = b'\x01\xff\xff\xff\xff\xff\xff\xff'
+
+
+def test_webm_duration_from_the_last_block_of_a_live_stream():
+    cluster = (
+        element(b'\xe7', (1000).to_bytes(2, 'big'))
+        + element(b'\xa3', b'\x81' + struct.pack('>h', 480) + b'\x80opus')
+    )
+    data = b'\x18\x53\x80\x67' + UNKNOWN_SIZE + b'\x1f\x43\xb6\x75' + UNKNOWN_SIZE + cluster
+
+    assert webm_duration(data) == pytest.approx(1.48 + 0.02)
+
+
+def test_webm_duration_prefers_the_info_duration():
+    info = element(b'\x15\x49\xa9\x66', element(b'\x2a\xd7\xb1', (1000000).to_bytes(3, 'big'))
+                   + element(b'\x44\x89', struct.pack('>f', 2500.0)))
+    data = b'\x18\x53\x80\x67' + UNKNOWN_SIZE + info
+
+    assert webm_duration(data) == pytest.approx(2.5)
+
+
+def test_speech_uses_the_requested_format(speech):
+    client, services = speech
+
+    response = client.post('/api/speech', json={'text': 'Hello', 'title': 'hello', 'format': 'ogg-opus'})
+
+    assert response.status_code == 200
+    assert response.json == {
+        'audioUrl': 'https://blobs.test/audio/hello.ogg', 'format': 'ogg-opus', 'contentType': 'audio/ogg; codecs=opus'
+    }
+    assert services.calls == [('text_to_speech', 'ogg-opus'), ('save_audio', 'ogg-opus')]
+
+
+def test_speech_ignores_accept_and_defaults_to_mp3(speech):
+    client, _ = speech
+
+    response = client.post('/api/speech', json={'text': 'Hello'}, headers={'Accept': 'audio/ogg'})
+
+    assert response.json['format'] == 'mp3'
+
+
+def test_speech_rejects_an_unknown_format(speech):
+    client, services = speech
+
+    response = client.post('/api/speech', json={'text': 'Hello', 'format': 'flac'})
+
+    assert response.status_code == 400
+    assert 'Unsupported audio format: flac' in response.json['error']
+    assert services.calls == []
+
+
+def test_stream_negotiates_from_accept(speech):
+    client, services = speech
+
+    response = client.get('/api/speech/stream?text=Hello', headers={'Accept': 'audio/webm, audio/mpeg;q=0.5'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'audio/webm; codecs=opus'
+    assert response.headers['X-Audio-Format'] == 'webm-opus'
+    assert response.headers['Vary'] == 'Accept'
+    assert response.data == b'firstrest'
+    assert services.calls == [('stream_audio', 'webm-opus')]
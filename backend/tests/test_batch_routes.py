@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from extensions import db
+from models.models import Story
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(BATCH_MAX_ITEMS=5, BATCH_COMMIT_SIZE=2, BATCH_MAX_CONCURRENT_ITEMS=2)
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def spec(theme):
+    return {'theme': theme, 'characters': ['a fox'], 'age_group': '3-5'}
+
+
+def test_each_story_is_reported_as_it_is_committed(client):
+    response = client.post('/api/stories/batch', json={'stories': [spec('Space'), spec('Ocean'), spec('Forest')]})
+
+    assert response.mimetype == 'application/x-ndjson'
+    results = lines(response)
+    created = [result for result in results if result['status'] == 'created']
+    assert sorted(result['index'] for result in created) == [0, 1, 2]
+    assert {result['story']['theme'] for result in created} == {'Space', 'Ocean', 'Forest'}
+    assert all('story' in result['timings'] for result in created)
+    assert results[-1]['status'] == 'done'
+    assert (results[-1]['created'], results[-1]['failed']) == (3, 0)
+    with client.application.app_context():
+        assert Story.query.count() == 3
+
+
+def test_invalid_and_failed_items_do_not_stop_the_batch(client, fake_services):
+    fake_services.failures['generate_story'] = 1
+
+    results = lines(client.post('/api/stories/batch', json={'stories': [{'theme': 'Space'}, spec('Ocean'), spec('Forest')]}))
+
+    failed = {result['index']: result['error'] for result in results if result['status'] == 'failed'}
+    assert failed[0] == 'Missing required fields'
+    assert len(failed) == 2
+    assert (results[-1]['created'], results[-1]['failed']) == (1, 2)
+    with client.application.app_context():
+        assert db.session.query(Story).count() == 1
+
+
+@pytest.mark.parametrize('body', [{}, {'stories': []}, {'stories': 'Space'}, {'stories': [spec('Space')] * 6}])
+def test_batch_size_is_checked(client, body):
+    assert client.post('/api/stories/batch', json=body).status_code == 400
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from extensions import db
+from models.models import StoryJob
+from services.blob_gc import BlobCollector
+from services.job_queue import StoryJobQueue
+from services.local_storage import LocalStorageBackend
+from services.storage_backend import content_blob_name
+
+STORY_TEXT = b'Once upon a time, a brave fox went to space.'
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorageBackend(str(tmp_path / 'blobs'), 'http://blobs.test/api/blobs', 'secret', fsync=False)
+
+
+@pytest.fixture
+def collector(app, storage):
+    app.config.update({
+        'STORY_JOB_WORKERS': 0, 'GC_GRACE_SECONDS': 3600, 'GC_PENDING_SECONDS': 600, 'GC_DRY_RUN': False
+    })
+    queue = StoryJobQueue()
+    queue.init_app(app, services_factory=lambda: None)
+    return BlobCollector(app, queue, SimpleNamespace(storage=storage, audio_cache=None))
+
+
+def upload_story_text(storage, age=0):
+    """
+    Save the story text the way the pipeline does, `age` seconds ago
+    """
+    storage.upload_content('stories', STORY_TEXT, 'txt', 'text/plain')
+    name = content_blob_name(STORY_TEXT, 'txt')
+    if age:
+        then = time.time() - age
+        os.utime(storage.path('stories', name), (then, then))
+    return name
+
+
+def run_delete_job(app, collector, blobs):
+    with app.app_context():
+        job_id = collector.release(blobs).id
+    assert collector.job_queue.run_pending() == 1
+    with app.app_context():
+        job = db.session.get(StoryJob, job_id)
+        assert job.status == 'succeeded'
+        return json.loads(job.result)
+
+
+def test_delete_job_deletes_unreferenced_blob(app, collector, storage):
+    name = upload_story_text(storage, age=2 * 3600)
+
+    result = run_delete_job(app, collector, [('stories', name)])
+
+    assert result['deleted'] == 1
+    assert not storage.exists('stories', name)
+
+
+def test_delete_job_does_not_wait_for_the_grace_period(app, collector, storage):
+    # Younger than GC_GRACE_SECONDS, but released by the delete and not touched since
+    name = upload_story_text(storage, age=1200)
+
+    result = run_delete_job(app, collector, [('stories', name)])
+
+    assert result['deleted'] == 1
+    assert not storage.exists('stories', name)
+
+
+def test_delete_job_keeps_blob_a_pending_story_touched(app, collector, storage):
+    # Reused by a pipeline whose story is not committed yet
+    name = upload_story_text(storage)
+
+    result = run_delete_job(app, collector, [('stories', name)])
+
+    assert result['deleted'] == 0 and result['recentlyUsed'] == 1
+    assert storage.exists('stories', name)
+
+
+def test_sweep_keeps_blobs_younger_than_the_grace_period(app, collector, storage):
+    young = upload_story_text(storage, age=1200)
+
+    with app.app_context():
+        result = collector.sweep()
+
+    assert result['listed'] == 1 and result['candidates'] == 0
+    assert storage.exists('stories', young)
+
+
+def test_delete_job_keeps_blob_a_concurrent_upload_deduplicated(app, collector, storage, monkeypatch):
+    # The deleted story's text is old, but another story saves the same text
+    # after the job found the blob unreferenced and before it deletes it
+    name = upload_story_text(storage, age=2 * 3600)
+    unreferenced = collector._unreferenced
+
+    def unreferenced_then_deduplicated(container, names, protected):
+        orphans = unreferenced(container, names, protected)
+        assert orphans == [name]
+        assert upload_story_text(storage) == name
+        return orphans
+
+    monkeypatch.setattr(collector, '_unreferenced', unreferenced_then_deduplicated)
+    result = run_delete_job(app, collector, [('stories', name)])
+
+    assert storage.content_stats()['deduplicated'] == 1
+    assert result['deleted'] == 0 and result['recentlyUsed'] == 1
+    assert storage.read_blob('stories', name) == STORY_TEXT
@@ -0,0 +1,124 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+from extensions import db
+from models.models import BlobRef, Story, WarmStory, referenced_blobs
+from services.azure_services import AzureServices
+from services.local_storage import LocalStorageBackend
+from services.storage_backend import blob_from_url, content_blob_name
+
+STORY_TEXT = b'Once upon a time, a brave fox went to space.'
+TEXT_NAME = content_blob_name(STORY_TEXT, 'txt')
+TEXT_URL = f"http://blobs.test/api/storage/stories/{TEXT_NAME}?expires=1&sig=x"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorageBackend(str(tmp_path / 'blobs'), 'http://blobs.test/api/storage', 'secret', fsync=False)
+
+
+def services_with(storage, content_addressing):
+    services = AzureServices.__new__(AzureServices)
+    services.config = SimpleNamespace(BLOB_CONTENT_ADDRESSING=content_addressing)
+    services.blob_storage = storage
+    return services
+
+
+def story(model=Story, **columns):
+    return model(title='Fox', content='Once upon a time', theme='space', characters='[]', age_group='4-6', **columns)
+
+
+def refcounts():
+    return {(ref.container, ref.name): ref.refcount for ref in BlobRef.query.all()}
+
+
+def test_content_blob_name_is_the_sha256():
+    assert TEXT_NAME == f"{hashlib.sha256(STORY_TEXT).hexdigest()}.txt"
+    assert content_blob_name(STORY_TEXT, 'mp3') != TEXT_NAME
+
+
+def test_blob_from_url_reads_container_and_name():
+    assert blob_from_url(TEXT_URL) == ('stories', TEXT_NAME)
+    assert blob_from_url('https://acct.blob.core.windows.net/audio/Fox%20story.mp3?sv=1') == ('audio', 'Fox story.mp3')
+    assert blob_from_url(None) is None
+    assert blob_from_url('https://example.com/') is None
+
+
+def test_existing_content_is_touched_not_uploaded(storage, monkeypatch):
+    first = storage.upload_content('stories', STORY_TEXT, 'txt', 'text/plain')
+    uploads = []
+    upload_blobs = storage.upload_blobs
+    monkeypatch.setattr(storage, 'upload_blobs', lambda batch: uploads.append(batch) or upload_blobs(batch))
+
+    second = storage.upload_content('stories', STORY_TEXT, 'txt', 'text/plain')
+
+    assert uploads == []
+    assert blob_from_url(first) == blob_from_url(second) == ('stories', TEXT_NAME)
+    assert storage.content_stats() == {
+        'uploads': 1, 'uploadedBytes': len(STORY_TEXT), 'deduplicated': 1, 'savedBytes': len(STORY_TEXT)
+    }
+
+
+def test_identical_content_in_one_batch_is_uploaded_once(storage):
+    urls = storage.upload_contents([
+        ('stories', STORY_TEXT, 'txt', 'text/plain'),
+        ('stories', STORY_TEXT, 'txt', 'text/plain'),
+        ('audio', STORY_TEXT, 'mp3', 'audio/mpeg')
+    ])
+
+    assert [blob_from_url(url)[0] for url in urls] == ['stories', 'stories', 'audio']
+    assert storage.list_blobs('stories') == [TEXT_NAME]
+    stats = storage.content_stats()
+    assert stats['uploads'] == 2 and stats['deduplicated'] == 1
+
+
+def test_save_blob_names_by_content_when_enabled(storage):
+    url = services_with(storage, True)._save_blob('stories', 'story_Fox_20260101_000000.txt', STORY_TEXT, 'text/plain')
+
+    assert blob_from_url(url) == ('stories', TEXT_NAME)
+
+
+def test_save_blob_keeps_the_filename_when_disabled(storage):
+    url = services_with(storage, False)._save_blob('stories', 'story_Fox_20260101_000000.txt', STORY_TEXT, 'text/plain')
+
+    assert blob_from_url(url) == ('stories', 'story_Fox_20260101_000000.txt')
+    assert storage.content_stats()['uploads'] == 0
+
+
+def test_referenced_blobs_skip_foreign_urls():
+    variants = '[{"url": "http://blobs.test/api/storage/images/fox_256.webp"}]'
+
+    blobs = referenced_blobs(
+        image_url='https://placehold.co/1024x1024.png', content_url=TEXT_URL, image_variants=variants
+    )
+
+    assert blobs == [('stories', TEXT_NAME), ('images', 'fox_256.webp')]
+    assert referenced_blobs(image_variants='not json') == []
+
+
+def test_stories_sharing_content_share_one_counted_blob(app):
+    with app.app_context():
+        first, second = story(content_url=TEXT_URL), story(content_url=TEXT_URL)
+        db.session.add_all([first, second, story(WarmStory, bucket='space', content_url=TEXT_URL)])
+        db.session.commit()
+        assert refcounts() == {('stories', TEXT_NAME): 3}
+
+        db.session.delete(first)
+        db.session.commit()
+        assert refcounts() == {('stories', TEXT_NAME): 2}
+        assert BlobRef.stats() == {'blobs': 1, 'references': 2, 'unreferenced': 0}
+
+
+def test_changing_a_url_moves_the_reference(app):
+    with app.app_context():
+        fox = story(image_url='http://blobs.test/api/storage/images/old.png')
+        db.session.add(fox)
+        db.session.commit()
+
+        fox.set_illustration('http://blobs.test/api/storage/images/new.png')
+        db.session.commit()
+
+        assert refcounts() == {('images', 'old.png'): 0, ('images', 'new.png'): 1}
+        assert BlobRef.stats()['unreferenced'] == 1
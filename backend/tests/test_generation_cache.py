@@ -0,0 +1,128 @@
+import sqlite3
+
+from services.generation_cache import GenerationCache, CachingAzureServices, CachedIllustration
+
+
+class StreamingServices:
+    openai_deployment_name = 'gpt-test'
+    story_temperature = 0.8
+    story_max_tokens = 600
+
+    def __init__(self):
+        self.streams = 0
+
+    def stream_story(self, theme, characters, age_group):
+        self.streams += 1
+        yield 'Once upon '
+        yield 'a time.'
+
+
+class IllustrationServices:
+    """
+    DALL-E and image storage the way AzureServices does them: save_image pipes
+    a DALL-E URL into a new blob and never sees the image bytes
+    """
+    dalle_deployment_name = 'dall-e-test'
+    illustration_size = '1024x1024'
+
+    def __init__(self):
+        self.generations = 0
+        self.saved = []
+        self.blob_storage = self
+        self.blobs = set()
+
+    def generate_illustration(self, title, theme, characters, age_group):
+        self.generations += 1
+        return f"https://dalle.test/generated/{self.generations}.png?expires=soon"
+
+    def save_image(self, image_data, title):
+        assert isinstance(image_data, str)
+        self.saved.append(image_data)
+        name = f"{title}_{len(self.saved)}.png"
+        self.blobs.add(('images', name))
+        return f"http://blobs.test/images/{name}?sig=x"
+
+    def touch(self, container_name, blob_name):
+        return (container_name, blob_name) in self.blobs
+
+    @property
+    def http(self):
+        raise AssertionError('the illustration must not be downloaded')
+
+
+def illustrate(services, title='Title'):
+    image = services.generate_illustration(title, 'Space', '["a fox"]', '3-5')
+    return services.save_image(image, title)
+
+
+class BrokenCache:
+    def get(self, namespace, key):
+        raise sqlite3.OperationalError('database is locked')
+
+    def set(self, namespace, key, value):
+        raise sqlite3.OperationalError('database is locked')
+
+
+def test_stream_story_is_cached(tmp_path):
+    services = StreamingServices()
+    caching = CachingAzureServices(services, GenerationCache(str(tmp_path / 'cache.db')))
+
+    assert ''.join(caching.stream_story('Space', '["a fox"]', '3-5')) == 'Once upon a time.'
+    assert list(caching.stream_story('Space', '["a fox"]', '3-5')) == ['Once upon a time.']
+    assert services.streams == 1
+
+
+def test_stream_story_treats_cache_errors_as_a_miss():
+    services = StreamingServices()
+    caching = CachingAzureServices(services, BrokenCache())
+
+    assert ''.join(caching.stream_story('Space', '["a fox"]', '3-5')) == 'Once upon a time.'
+    assert services.streams == 1
+
+
+def test_cached_illustration_reuses_the_stored_image(tmp_path):
+    services = IllustrationServices()
+    caching = CachingAzureServices(services, GenerationCache(str(tmp_path / 'cache.db')))
+
+    url = illustrate(caching)
+    assert services.saved == ['https://dalle.test/generated/1.png?expires=soon']
+    assert isinstance(caching.generate_illustration('Other', 'Space', '["a fox"]', '3-5'), CachedIllustration)
+    assert illustrate(caching, 'Other') == url
+    assert services.generations == 1 and len(services.saved) == 1
+
+
+def test_cached_illustration_whose_blob_was_deleted_is_generated_again(tmp_path):
+    services = IllustrationServices()
+    caching = CachingAzureServices(services, GenerationCache(str(tmp_path / 'cache.db')))
+
+    first = illustrate(caching)
+    services.blobs.clear()
+
+    assert illustrate(caching) != first
+    assert services.generations == 2
+    assert illustrate(caching) == illustrate(caching)
+    assert services.generations == 2
+
+
+class SpeechServices:
+    def __init__(self):
+        self.syntheses = 0
+
+    def text_to_speech(self, text, voice=None, audio_format=None):
+        self.syntheses += 1
+        return b'ID3 narration'
+
+
+def test_narration_is_left_to_the_audio_cache(tmp_path):
+    cache = GenerationCache(str(tmp_path / 'cache.db'))
+    cache.set('speech', 'old-narration', b'ID3 stored before the audio cache')
+    # Reopening the file drops narration cached by earlier versions
+    cache = GenerationCache(str(tmp_path / 'cache.db'))
+    upstream = SpeechServices()
+    services = CachingAzureServices(upstream, cache)
+
+    services.text_to_speech('Once upon a time.')
+    services.text_to_speech('Once upon a time.')
+
+    assert upstream.syntheses == 2
+    assert 'speech' not in cache.stats()
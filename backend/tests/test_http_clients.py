@@ -0,0 +1,94 @@
+import threading
+
+import httpx
+import openai
+import pytest
+
+from fake_azure import FakeAzureServer, FakeAzureProfile, LatencyModel
+from services.http_clients import HttpClients
+
+
+@pytest.fixture
+def fake_azure():
+    server = FakeAzureServer(FakeAzureProfile.instant(), quiet=True).start()
+    yield server
+    server.stop()
+
+
+def with_latency(server, upstream, spec):
+    server.app.config['FAKE_AZURE_PROFILE'].latency[upstream] = LatencyModel.parse(spec)
+
+
+def make_clients(**kwargs):
+    return HttpClients({'images': 2, 'gpt': 2}, http2=False, **kwargs)
+
+
+def test_keep_alive_reuses_one_connection(fake_azure):
+    clients = make_clients()
+    try:
+        client = clients.client('images')
+        for index in range(5):
+            assert client.get(f"{fake_azure.url}/fake-images/{index}.png").status_code == 200
+        assert clients.client('images') is client
+
+        pool = clients.stats()['pools']['images']
+        assert pool['requests'] == 5
+        assert pool['newConnections'] == 1
+        assert pool['connectionReuse'] == 0.8
+        assert pool['httpVersions'] == {'HTTP/1.1': 5}
+    finally:
+        clients.close()
+
+
+def test_pool_size_bounds_concurrent_connections(fake_azure):
+    with_latency(fake_azure, 'blob', 'fixed:0.2')
+    clients = make_clients()
+    try:
+        client = clients.client('images')
+        threads = [
+            threading.Thread(target=lambda index=index: client.get(f"{fake_azure.url}/fake-images/{index}.png"))
+            for index in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        pool = clients.stats()['pools']['images']
+        assert pool['requests'] == 6
+        assert pool['newConnections'] == 2
+        assert pool['maxConnections'] == 2
+    finally:
+        clients.close()
+
+
+def test_read_timeout(fake_azure):
+    with_latency(fake_azure, 'blob', 'fixed:1')
+    clients = make_clients(connect_timeout=1.0, read_timeout=0.2)
+    try:
+        client = clients.client('images')
+        assert client.timeout.connect == 1.0 and client.timeout.read == 0.2
+        with pytest.raises(httpx.ReadTimeout):
+            client.get(f"{fake_azure.url}/fake-images/slow.png")
+    finally:
+        clients.close()
+
+
+def test_openai_client_shares_the_pool(fake_azure):
+    clients = make_clients()
+    try:
+        gpt = openai.AzureOpenAI(
+            api_key='test', api_version='2024-02-01', azure_endpoint=fake_azure.url,
+            max_retries=0, http_client=clients.client('gpt')
+        )
+        for _ in range(3):
+            response = gpt.chat.completions.create(
+                model='gpt-4', messages=[{'role': 'user', 'content': 'Tell me a story'}], max_tokens=50
+            )
+            assert response.choices[0].message.content
+
+        pool = clients.stats()['pools']['gpt']
+        assert pool['requests'] == 3
+        assert pool['newConnections'] == 1
+    finally:
+        clients.close()
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from extensions import db
+from models.models import Story, StoryJob
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client()
+
+
+def add_story(client, job_status='succeeded'):
+    """
+    A story with a finished two-candidate illustration job; returns their ids
+    """
+    with client.application.app_context():
+        story = Story(
+            title='Fox', content='Once upon a time.', theme='forest', characters='["Fox"]', age_group='3-5',
+            image_url='http://blobs.test/images/old.png'
+        )
+        db.session.add(story)
+        db.session.flush()
+        job = StoryJob(
+            id='a' * 32, kind='illustration', status=job_status, payload='{}', story_id=story.id,
+            result=json.dumps({'candidates': [
+                {'imageUrl': f'http://blobs.test/images/new{index}.png', 'imageVariants': None}
+                for index in range(2)
+            ]})
+        )
+        db.session.add(job)
+        db.session.commit()
+        return story.id, job.id
+
+
+def test_regenerate_queues_a_job(client):
+    story_id, _ = add_story(client)
+
+    response = client.post(f'/api/stories/{story_id}/regenerate-illustration', json={'candidates': 2})
+
+    assert response.status_code == 202
+    assert response.headers['Location'] == response.get_json()['statusUrl']
+    with client.application.app_context():
+        job = db.session.get(StoryJob, response.get_json()['jobId'])
+        assert job.kind == 'illustration' and json.loads(job.payload) == {'candidates': 2}
+
+
+def test_regenerate_checks_the_candidate_count(client):
+    story_id, _ = add_story(client)
+
+    assert client.post(f'/api/stories/{story_id}/regenerate-illustration', json={'candidates': 99}).status_code == 400
+
+
+def test_choose_a_candidate(client):
+    story_id, job_id = add_story(client)
+
+    response = client.post(f'/api/stories/{story_id}/illustration', json={'jobId': job_id, 'candidate': 1})
+
+    assert response.status_code == 200
+    assert response.get_json()['imageUrl'] == 'http://blobs.test/images/new1.png'
+    with client.application.app_context():
+        assert json.loads(db.session.get(StoryJob, job_id).result)['selected'] == 1
+
+
+@pytest.mark.parametrize('candidate', [True, False, 2, -1, '0', None])
+def test_invalid_candidates_are_rejected(client, candidate):
+    story_id, job_id = add_story(client)
+
+    response = client.post(f'/api/stories/{story_id}/illustration', json={'jobId': job_id, 'candidate': candidate})
+
+    assert response.status_code == 400
+    with client.application.app_context():
+        assert db.session.get(Story, story_id).image_url == 'http://blobs.test/images/old.png'
+
+
+def test_unfinished_jobs_cannot_be_chosen_from(client):
+    story_id, job_id = add_story(client, job_status='running')
+
+    response = client.post(f'/api/stories/{story_id}/illustration', json={'jobId': job_id, 'candidate': 0})
+
+    assert response.status_code == 409
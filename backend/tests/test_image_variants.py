@@ -0,0 +1,86 @@
+import io
+
+import pytest
+
+from services.image_variants import ImageVariants, dump_variants, render_variants, variant_fields
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png(width, height, mode='RGB'):
+    output = io.BytesIO()
+    Image.new(mode, (width, height), 'orange').save(output, 'PNG')
+    return output.getvalue()
+
+
+def variant(width, image_format):
+    content_type = f"image/{image_format}"
+    return {
+        'width': width, 'height': width, 'format': image_format, 'contentType': content_type,
+        'bytes': 100, 'url': f"https://blobs.test/images/fox_{width}.{image_format}"
+    }
+
+
+def test_render_variants_scales_down_and_keeps_the_aspect_ratio():
+    variants = render_variants(png(400, 200), [100, 200], ['webp'], 75)
+
+    assert [(width, height, name) for width, height, name, _ in variants] == [(100, 50, 'webp'), (200, 100, 'webp')]
+    assert Image.open(io.BytesIO(variants[0][3])).format == 'WEBP'
+
+
+def test_render_variants_never_upscales():
+    variants = render_variants(png(150, 150), [100, 300, 600], ['webp'], 75)
+
+    assert [width for width, _, _, _ in variants] == [100]
+    # An image smaller than every width is only re-encoded
+    assert [width for width, _, _, _ in render_variants(png(50, 50), [100], ['webp'], 75)] == [50]
+
+
+def test_render_variants_converts_palette_images():
+    variants = render_variants(png(64, 64, mode='P'), [32], ['webp'], 75)
+
+    assert Image.open(io.BytesIO(variants[0][3])).size == (32, 32)
+
+
+def test_variant_fields_prefer_webp_and_list_avif_first():
+    stored = dump_variants([variant(512, 'webp'), variant(256, 'avif'), variant(256, 'webp'), variant(512, 'avif')])
+
+    fields = variant_fields(stored)
+
+    assert fields['thumbnailUrl'] == 'https://blobs.test/images/fox_256.webp'
+    assert fields['srcset'] == 'https://blobs.test/images/fox_256.webp 256w, https://blobs.test/images/fox_512.webp 512w'
+    assert [source['type'] for source in fields['imageSources']] == ['image/avif', 'image/webp']
+    assert fields['imageSources'][0]['srcset'].startswith('https://blobs.test/images/fox_256.avif 256w')
+
+
+def test_variant_fields_without_variants():
+    empty = {'thumbnailUrl': None, 'srcset': None, 'imageSources': []}
+
+    assert dump_variants([]) is None
+    assert variant_fields(None) == empty
+    assert variant_fields('not json') == empty
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        ImageVariants([256], ['gif'])
+
+
+def test_disabled_variants_render_nothing():
+    variants = ImageVariants([256], ['webp'], enabled=False)
+
+    assert not variants.enabled
+    assert variants.stats()['formats'] == []
+
+
+def test_render_in_the_process_pool_records_stats():
+    variants = ImageVariants([32, 64], ['webp'], workers=1)
+    try:
+        rendered = variants.render(png(64, 64))
+    finally:
+        variants.close()
+
+    assert [(width, name) for width, _, name, _ in rendered] == [(32, 'webp'), (64, 'webp')]
+    stats = variants.stats()
+    assert stats['images'] == 1 and stats['failed'] == 0
+    assert set(stats['avgVariantBytes']) == {'webp@32', 'webp@64'}
@@ -0,0 +1,134 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models.models import Story, StoryJob
+from services.job_queue import StoryJobQueue
+from tests.fakes import FakeStoryServices
+
+STORY_REQUEST = {'theme': 'Space Adventure', 'characters': ['a brave fox'], 'age_group': '3-5'}
+
+
+def make_queue(app, services, **config):
+    app.config.update({'STORY_JOB_WORKERS': 1, 'STORY_JOB_POLL_INTERVAL': 0.05, **config})
+    queue = StoryJobQueue()
+    queue.init_app(app, services_factory=lambda: services)
+    return queue
+
+
+def wait_for(app, job_id, statuses=('succeeded', 'failed'), timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            job = db.session.get(StoryJob, job_id)
+            if job.status in statuses:
+                return job.to_dict()
+        time.sleep(0.05)
+    pytest.fail(f"Job {job_id} did not finish within {timeout}s")
+
+
+def test_enqueued_story_job_completes(app, fake_services):
+    queue = make_queue(app, fake_services, STORY_JOB_WORKERS=0)
+    with app.app_context():
+        job_id = queue.enqueue('story', STORY_REQUEST).id
+        assert db.session.get(StoryJob, job_id).status == 'queued'
+
+    assert queue.run_pending() == 1
+
+    with app.app_context():
+        job = db.session.get(StoryJob, job_id)
+        assert job.status == 'succeeded'
+        assert job.attempts == 1
+        assert job.finished_at is not None
+        stages = json.loads(job.stages)
+        assert stages['story']['status'] == 'succeeded'
+        assert stages['save_audio']['status'] == 'succeeded'
+        story = db.session.get(Story, job.story_id)
+        assert story.theme == 'Space Adventure'
+        assert story.image_url == 'http://blobs.test/images/image.png'
+        assert story.audio_url == 'http://blobs.test/audio/audio.mp3'
+        assert story.content_url == 'http://blobs.test/stories/story.txt'
+
+
+def test_failed_job_is_retried(app):
+    services = FakeStoryServices(failures={'generate_story': 1})
+    queue = make_queue(app, services, STORY_JOB_WORKERS=0, STORY_JOB_MAX_ATTEMPTS=3)
+    with app.app_context():
+        job_id = queue.enqueue('story', STORY_REQUEST).id
+
+    # The first attempt fails and re-queues the job, the second one succeeds
+    assert queue.run_pending() == 2
+
+    with app.app_context():
+        job = db.session.get(StoryJob, job_id)
+        assert job.status == 'succeeded'
+        assert job.attempts == 2
+        assert services.calls.count('generate_story') == 2
+        assert Story.query.count() == 1
+
+
+def test_job_fails_after_max_attempts(app):
+    services = FakeStoryServices(failures={'generate_story': 5})
+    queue = make_queue(app, services, STORY_JOB_WORKERS=0, STORY_JOB_MAX_ATTEMPTS=2)
+    with app.app_context():
+        job_id = queue.enqueue('story', STORY_REQUEST).id
+
+    assert queue.run_pending() == 2
+
+    with app.app_context():
+        job = db.session.get(StoryJob, job_id)
+        assert job.status == 'failed'
+        assert 'generate_story failed' in job.error
+        assert Story.query.count() == 0
+
+
+def insert_abandoned_job(app, attempts=1, heartbeat_age=0):
+    """
+    A job a worker claimed and then died on: 'running', with its last heartbeat `heartbeat_age` seconds ago
+    """
+    with app.app_context():
+        now = datetime.utcnow()
+        job = StoryJob(
+            id='abandoned', kind='story', status='running', payload=json.dumps(STORY_REQUEST),
+            stages=json.dumps({}), attempts=attempts, started_at=now - timedelta(seconds=heartbeat_age),
+            heartbeat_at=now - timedelta(seconds=heartbeat_age)
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+
+def test_running_worker_picks_up_job_of_dead_worker(app, fake_services):
+    # The job's heartbeat is fresh when the surviving worker starts, so only a
+    # later stale check (not the one at start-up) can recover it
+    job_id = insert_abandoned_job(app)
+    queue = make_queue(app, fake_services, STORY_JOB_STALE_SECONDS=1, STORY_JOB_STALE_CHECK_SECONDS=0.1)
+    queue.start()
+    try:
+        time.sleep(0.3)
+        with app.app_context():
+            assert db.session.get(StoryJob, job_id).status == 'running'
+        job = wait_for(app, job_id)
+    finally:
+        queue.stop(timeout=5)
+
+    assert job['status'] == 'succeeded'
+    with app.app_context():
+        assert db.session.get(StoryJob, job_id).attempts == 2
+        assert Story.query.count() == 1
+
+
+def test_abandoned_job_out_of_attempts_fails(app, fake_services):
+    job_id = insert_abandoned_job(app, attempts=3, heartbeat_age=60)
+    queue = make_queue(app, fake_services, STORY_JOB_STALE_SECONDS=1, STORY_JOB_MAX_ATTEMPTS=3)
+    queue.start()
+    try:
+        job = wait_for(app, job_id)
+    finally:
+        queue.stop(timeout=5)
+
+    assert job['status'] == 'failed'
+    assert fake_services.calls == []
@@ -0,0 +1,158 @@
+import os
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from extensions import service_registry
+from services.local_storage import LocalStorageBackend
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorageBackend(str(tmp_path / 'blobs'), 'http://localhost/api/storage', 'secret', fsync=False)
+
+
+def signature_of(url):
+    query = parse_qs(urlsplit(url).query)
+    return query['expires'][0], query['sig'][0]
+
+
+def age(storage, container_name, blob_name, seconds):
+    then = time.time() - seconds
+    os.utime(storage.path(container_name, blob_name), (then, then))
+
+
+def test_upload_shards_by_name_and_reads_back(storage):
+    storage.upload_blob('stories', 'Fox_1.txt', b'Once upon a time')
+
+    path = storage.path('stories', 'Fox_1.txt')
+    assert os.path.relpath(path, storage.root).split(os.sep)[0] == 'stories'
+    assert len(os.path.relpath(path, storage.root).split(os.sep)) == 4
+    assert storage.read_blob('stories', 'Fox_1.txt') == b'Once upon a time'
+    assert storage.list_blobs('stories') == ['Fox_1.txt']
+
+
+def test_signed_url_verifies(storage):
+    url = storage.upload_blob('audio', 'Fox_1.mp3', b'mp3')
+    expires, signature = signature_of(url)
+
+    assert urlsplit(url).path == '/api/storage/audio/Fox_1.mp3'
+    assert storage.verify('audio', 'Fox_1.mp3', expires, signature)
+
+
+def test_tampered_or_expired_signature_is_rejected(storage):
+    expires, signature = signature_of(storage.upload_blob('audio', 'Fox_1.mp3', b'mp3'))
+
+    assert not storage.verify('audio', 'Fox_2.mp3', expires, signature)
+    assert not storage.verify('images', 'Fox_1.mp3', expires, signature)
+    assert not storage.verify('audio', 'Fox_1.mp3', str(int(expires) + 1), signature)
+    assert not storage.verify('audio', 'Fox_1.mp3', expires, None)
+    assert not storage.verify('audio', 'Fox_1.mp3', 'never', signature)
+    past = int(time.time()) - 1
+    assert not storage.verify('audio', 'Fox_1.mp3', past, storage._signature('audio', 'Fox_1.mp3', past))
+
+
+def test_names_that_escape_the_container_are_rejected(storage):
+    for blob_name in ('../secret.txt', 'a/b.txt', 'a\\b.txt', '.hidden.tmp', ''):
+        with pytest.raises(ValueError):
+            storage.path('stories', blob_name)
+    with pytest.raises(ValueError):
+        storage.path('../etc', 'passwd')
+
+
+def test_staged_upload_is_invisible_until_committed(storage):
+    upload = storage.start_staged_upload('audio', 'Fox_1.mp3')
+    upload.write(b'first ')
+    upload.write(b'second')
+
+    assert not storage.exists('audio', 'Fox_1.mp3')
+    assert storage.list_blobs('audio') == []
+    upload.commit()
+    assert storage.read_blob('audio', 'Fox_1.mp3') == b'first second'
+
+
+def test_aborted_staged_upload_leaves_nothing(storage):
+    upload = storage.start_staged_upload('audio', 'Fox_1.mp3')
+    upload.write(b'partial')
+    upload.abort()
+
+    assert not storage.exists('audio', 'Fox_1.mp3')
+    assert os.listdir(os.path.dirname(storage.path('audio', 'Fox_1.mp3'))) == []
+
+
+def test_list_blob_pages_reports_size_and_time(storage):
+    for index in range(5):
+        storage.upload_blob('images', f"Fox_{index}.png", b'x' * index)
+
+    pages = list(storage.list_blob_pages('images', page_size=2))
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    blobs = {blob.name: blob for page in pages for blob in page}
+    assert blobs['Fox_3.png'].size == 3
+    assert blobs['Fox_3.png'].last_modified.tzinfo is timezone.utc
+
+
+def test_delete_unmodified_keeps_touched_blobs(storage):
+    storage.upload_blob('stories', 'old.txt', b'old')
+    storage.upload_blob('stories', 'touched.txt', b'touched')
+    age(storage, 'stories', 'old.txt', 3600)
+    age(storage, 'stories', 'touched.txt', 3600)
+    cutoff = datetime.fromtimestamp(time.time() - 60, timezone.utc)
+    assert storage.touch('stories', 'touched.txt')
+
+    deleted, missing, failed, modified = storage.delete_blobs(
+        'stories', ['old.txt', 'touched.txt', 'gone.txt'], unmodified_since=cutoff
+    )
+
+    assert (deleted, missing, failed, modified) == (['old.txt'], ['gone.txt'], [], ['touched.txt'])
+    assert storage.read_blob('stories', 'touched.txt') == b'touched'
+    # Nothing is left moved aside
+    assert storage.list_blobs('stories') == ['touched.txt']
+    assert not any(name.endswith('.deleting') for _, _, files in os.walk(storage.root) for name in files)
+
+
+def test_delete_unmodified_keeps_a_blob_uploaded_again_meanwhile(storage, monkeypatch):
+    storage.upload_blob('stories', 'story.txt', b'old')
+    age(storage, 'stories', 'story.txt', 3600)
+    stat = os.stat
+
+    def stat_after_reupload(path, *args, **kwargs):
+        # The blob is uploaded again between moving it aside and checking its time
+        if path.endswith('.deleting') and not storage.exists('stories', 'story.txt'):
+            storage.upload_blob('stories', 'story.txt', b'new')
+            os.utime(path)
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'stat', stat_after_reupload)
+    cutoff = datetime.fromtimestamp(time.time() - 60, timezone.utc)
+    deleted, _, _, modified = storage.delete_blobs('stories', ['story.txt'], unmodified_since=cutoff)
+
+    assert (deleted, modified) == ([], ['story.txt'])
+    assert storage.read_blob('stories', 'story.txt') == b'new'
+
+
+def test_route_serves_signed_blobs(make_client, storage):
+    client = make_client()
+    service_registry._instances['storage'] = storage
+    url = storage.upload_blob('audio', 'Fox_1.mp3', b'mp3 audio')
+    path = url.split('http://localhost', 1)[1]
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert response.data == b'mp3 audio'
+    assert response.mimetype == 'audio/mpeg'
+    assert client.get(path, headers={'Range': 'bytes=4-'}).data == b'audio'
+
+
+def test_route_rejects_bad_signatures_and_unknown_blobs(make_client, storage):
+    client = make_client()
+    service_registry._instances['storage'] = storage
+    expires, signature = signature_of(storage.upload_blob('audio', 'Fox_1.mp3', b'mp3'))
+
+    assert client.get(f"/api/storage/audio/Fox_1.mp3?expires={expires}&sig=forged").status_code == 403
+    assert client.get('/api/storage/audio/Fox_1.mp3').status_code == 403
+    missing = storage.signed_url('audio', 'Fox_2.mp3').split('http://localhost', 1)[1]
+    assert client.get(missing).status_code == 404
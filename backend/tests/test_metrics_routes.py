@@ -0,0 +1,36 @@
+import pytest
+
+from extensions import service_registry
+
+
+@pytest.fixture
+def client(make_client, tmp_path, monkeypatch):
+    # The GPT router's counters are reported too, and building it needs (any) credentials
+    monkeypatch.setenv('AZURE_OPENAI_API_KEY', 'test')
+    monkeypatch.setenv('AZURE_OPENAI_ENDPOINT', 'http://gpt.test')
+    monkeypatch.setenv('AZURE_OPENAI_API_VERSION', '2024-02-01')
+    return make_client(
+        METRICS_TOKEN='s3cret',
+        GENERATION_CACHE_PATH=str(tmp_path / 'cache.db'),
+        AUDIO_CACHE_PATH=str(tmp_path / 'cache.db')
+    )
+
+
+def test_metrics_are_off_without_a_token(make_client):
+    assert make_client(METRICS_TOKEN=None).get('/api/metrics').status_code == 404
+
+
+@pytest.mark.parametrize('header', [None, 'Bearer wrong', 's3cret', 'Bearer s3cret '])
+def test_metrics_need_the_token(client, header):
+    response = client.get('/api/metrics', headers={'Authorization': header} if header else {})
+
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer'
+
+
+def test_metrics_do_not_build_the_storage_backend(client):
+    response = client.get('/api/metrics', headers={'Authorization': 'Bearer s3cret'})
+
+    assert response.status_code == 200
+    assert set(response.get_json()['blobContent']) == {'refs'}
+    assert service_registry.built('storage') is None
@@ -0,0 +1,66 @@
+import time
+from types import SimpleNamespace
+
+from services.openai_router import Deployment, DeploymentRouter
+from services.rate_limiter import RateLimitTimeout
+
+
+class FakeClient:
+    """
+    An OpenAI client whose chat completions answer after `delay` seconds, or fail
+    """
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return self.name
+
+
+def router(*clients, hedge=False):
+    return DeploymentRouter(
+        [Deployment(client.name, client, 'gpt') for client in clients], hedge=hedge, hedge_delay=0.05
+    )
+
+
+def test_failover_charges_the_extra_attempt():
+    charges = []
+    down, up = FakeClient('down', fail=True), FakeClient('up')
+    # Weighted so the broken deployment is (practically always) tried first
+    gpt = DeploymentRouter([Deployment('down', down, 'gpt', weight=10 ** 9), Deployment('up', up, 'gpt')])
+
+    assert gpt.chat_completion(charge=charges.append, messages=[]) == 'up'
+    assert down.calls == 1
+    assert charges == [True]
+
+
+def test_hedge_is_charged_without_waiting():
+    charges = []
+    slow, fast = FakeClient('slow', delay=0.5), FakeClient('fast')
+    gpt = DeploymentRouter(
+        [Deployment('slow', slow, 'gpt', weight=10 ** 9), Deployment('fast', fast, 'gpt')], hedge=True, hedge_delay=0.05
+    )
+
+    assert gpt.chat_completion(charge=charges.append, messages=[]) == 'fast'
+    assert charges == [False]
+    assert gpt.hedged_requests == 1 and gpt.hedge_wins == 1
+
+
+def test_no_hedge_without_spare_budget():
+    def no_budget(wait):
+        raise RateLimitTimeout('gpt requests')
+
+    slow = [FakeClient('first', delay=0.2), FakeClient('second', delay=0.2)]
+    gpt = router(*slow, hedge=True)
+
+    assert gpt.chat_completion(charge=no_budget, messages=[]) in ('first', 'second')
+    assert gpt.hedged_requests == 0
+    assert sum(client.calls for client in slow) == 1
+    assert all(d.breaker.state == 'closed' for d in gpt.deployments)
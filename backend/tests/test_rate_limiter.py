@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.rate_limiter import UpstreamRateLimiter, ThrottledError, TokenBucket, RateLimitTimeout
+
+
+def limits(**overrides):
+    values = dict(
+        RATE_LIMIT_GPT_RPM=60, RATE_LIMIT_GPT_TPM=60000, RATE_LIMIT_DALLE_IPM=6, RATE_LIMIT_SPEECH_CPS=2000,
+        RATE_LIMIT_MAX_RETRIES=2, RATE_LIMIT_MAX_WAIT_SECONDS=1.0
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_zero_limit_means_unlimited():
+    limiter = UpstreamRateLimiter.from_config(limits(RATE_LIMIT_GPT_TPM=0, RATE_LIMIT_SPEECH_CPS=0))
+
+    assert set(limiter.buckets['gpt']) == {'requests'}
+    assert limiter.buckets['speech'] == {}
+    # Far more tokens and characters than any bucket could hold, without waiting or dividing by zero
+    assert limiter.call('gpt', lambda: 'ok', cost={'requests': 1, 'tokens': 10 ** 9}) == 'ok'
+    assert limiter.call('speech', lambda: 'ok', cost={'characters': 10 ** 9}) == 'ok'
+    limiter.refund('gpt', 'tokens', 500)
+
+
+def test_negative_limit_is_rejected():
+    with pytest.raises(ValueError, match='RATE_LIMIT_DALLE_IPM'):
+        UpstreamRateLimiter.from_config(limits(RATE_LIMIT_DALLE_IPM=-1))
+
+
+def test_bucket_needs_a_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket('broken', 10, 0)
+
+
+def test_throttled_call_is_retried_without_a_bucket(monkeypatch):
+    limiter = UpstreamRateLimiter.from_config(limits(RATE_LIMIT_SPEECH_CPS=0))
+    sleeps = []
+    monkeypatch.setattr('services.rate_limiter.time.sleep', sleeps.append)
+    attempts = []
+
+    def synthesize():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ThrottledError('busy', retry_after=0.5)
+        return b'audio'
+
+    assert limiter.call('speech', synthesize, cost={'characters': 100}) == b'audio'
+    assert len(attempts) == 2
+    assert len(sleeps) == 1 and sleeps[0] >= 0.5
+
+
+def test_retries_are_not_charged_again(monkeypatch):
+    limiter = UpstreamRateLimiter.from_config(limits(RATE_LIMIT_DALLE_IPM=6))
+    monkeypatch.setattr('services.rate_limiter.time.sleep', lambda seconds: None)
+    images = limiter.buckets['dalle']['images']
+    attempts = []
+
+    def generate():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ThrottledError('busy', retry_after=0)
+        return b'image'
+
+    assert limiter.call('dalle', generate, cost={'images': 1}) == b'image'
+    assert len(attempts) == 3
+    assert images.acquisitions == 1
+    assert images.snapshot()['level'] == pytest.approx(5, abs=0.1)
+
+
+def test_acquire_takes_nothing_when_one_dimension_is_short():
+    limiter = UpstreamRateLimiter.from_config(limits(RATE_LIMIT_GPT_RPM=60, RATE_LIMIT_GPT_TPM=600))
+    limiter.acquire('gpt', {'tokens': 600})
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire('gpt', {'requests': 1, 'tokens': 500}, wait=False)
+    assert limiter.buckets['gpt']['requests'].snapshot()['level'] == pytest.approx(60, abs=0.1)
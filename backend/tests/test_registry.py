@@ -0,0 +1,65 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from flask import Flask
+
+from services.local_storage import LocalStorageBackend
+from services.registry import ServiceRegistry, _service
+
+
+def local_config(tmp_path):
+    return SimpleNamespace(
+        STORAGE_BACKEND='local', STORAGE_LOCAL_ROOT=str(tmp_path / 'blobs'), STORAGE_LOCAL_URL='http://blobs.test',
+        STORAGE_URL_SECRET='secret', SECRET_KEY='key', STORAGE_URL_TTL_SECONDS=60, STORAGE_LOCAL_FSYNC=False
+    )
+
+
+class SlowRegistry(ServiceRegistry):
+    builds = 0
+
+    @_service
+    def slow(self):
+        SlowRegistry.builds += 1
+        time.sleep(0.05)
+        return object()
+
+
+def test_services_are_built_on_first_use(tmp_path):
+    registry = ServiceRegistry(config=local_config(tmp_path))
+
+    assert registry.built('storage') is None
+    storage = registry.storage
+
+    assert isinstance(storage, LocalStorageBackend)
+    assert registry.built('storage') is storage and registry.storage is storage
+    assert registry.stats()['created'] == ['storage']
+    # Building the storage backend does no I/O; the containers are checked by warm()
+    assert not (tmp_path / 'blobs').exists()
+
+
+def test_concurrent_first_use_builds_once():
+    registry = SlowRegistry()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.slow)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert SlowRegistry.builds == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+
+
+def test_init_app_builds_nothing_unless_eager(tmp_path, monkeypatch):
+    warmed = []
+    monkeypatch.setattr(ServiceRegistry, 'warm', lambda self, verify_containers=True: warmed.append(self))
+    app = Flask(__name__)
+
+    lazy = ServiceRegistry(app, config=local_config(tmp_path))
+    assert app.extensions['services'] is lazy
+    assert warmed == [] and lazy.stats()['created'] == []
+
+    app.config['SERVICES_EAGER_INIT'] = True
+    eager = ServiceRegistry(app, config=local_config(tmp_path))
+    assert warmed == [eager]
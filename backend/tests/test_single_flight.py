@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from services.single_flight import SingleFlight, CoalescingAzureServices
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def run_together(targets):
+    """
+    Start a thread for each callable; the results (or exceptions) land in the returned list
+    """
+    results = [None] * len(targets)
+
+    def run(index):
+        try:
+            results[index] = targets[index]()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(targets))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def join(threads):
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        release.wait(5)
+        return 'story'
+
+    threads, results = run_together([lambda: flight.do('key', generate, group='story')] * 5)
+    wait_for(lambda: flight.stats()['groups']['story']['calls'] == 5)
+    release.set()
+    join(threads)
+
+    assert results == ['story'] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {
+        'inFlight': 0, 'groups': {'story': {'calls': 5, 'upstream': 1, 'saved': 4, 'errors': 0}}
+    }
+
+
+def test_waiters_get_the_leaders_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError('GPT is down')
+
+    threads, results = run_together([lambda: flight.do('key', fail)] * 3)
+    wait_for(lambda: flight.stats()['groups']['default']['calls'] == 3)
+    release.set()
+    join(threads)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()['groups']['default']['errors'] == 1
+
+
+def test_calls_after_completion_run_again():
+    flight = SingleFlight()
+    calls = []
+
+    assert flight.do('key', lambda: calls.append(1) or 'first') == 'first'
+    assert flight.do('key', lambda: calls.append(1) or 'second') == 'second'
+    assert len(calls) == 2
+
+
+class BlockingServices:
+    openai_deployment_name = 'gpt-test'
+    story_temperature = 0.8
+    story_max_tokens = 600
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.stories = 0
+        self.fresh_views = 0
+
+    def generate_story(self, theme, characters, age_group):
+        self.stories += 1
+        self.release.wait(5)
+        return f'A story about {theme}'
+
+    def with_fresh(self):
+        self.fresh_views += 1
+        return self
+
+
+@pytest.fixture
+def coalescing():
+    upstream = BlockingServices()
+    return upstream, CoalescingAzureServices(upstream, SingleFlight())
+
+
+def test_equivalent_story_requests_coalesce(coalescing):
+    upstream, services = coalescing
+
+    # Character order and case don't change the story key
+    threads, results = run_together([
+        lambda: services.generate_story('Space', '["a fox", "an owl"]', '3-5'),
+        lambda: services.generate_story('space', '["An Owl", "a fox"]', '3-5')
+    ])
+    wait_for(lambda: services.single_flight.stats()['groups'].get('story', {}).get('calls') == 2)
+    upstream.release.set()
+    join(threads)
+
+    assert upstream.stories == 1
+    assert results[0] == results[1]
+
+
+def test_different_requests_do_not_coalesce(coalescing):
+    upstream, services = coalescing
+    upstream.release.set()
+
+    services.generate_story('Space', '["a fox"]', '3-5')
+    services.generate_story('Ocean', '["a fox"]', '3-5')
+
+    assert upstream.stories == 2
+
+
+def test_fresh_requests_bypass_coalescing(coalescing):
+    upstream, services = coalescing
+
+    assert services.with_fresh() is upstream
+    assert upstream.fresh_views == 1
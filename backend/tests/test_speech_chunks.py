@@ -0,0 +1,133 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import mp3
+from services.audio_formats import AUDIO_FORMATS
+from services.azure_services import AzureServices
+from services.speech_chunks import split_text, synthesize_chunks
+
+
+def frame(fill):
+    """
+    One 144-byte MPEG-2 layer III frame (16 kHz, 32 kbps, mono), like Azure's MP3 narration
+    """
+    return bytes([0xFF, 0xF3, 0x48, 0xC0]) + bytes([fill]) * 140
+
+
+def id3_tag():
+    return b'ID3\x04\x00\x00\x00\x00\x00\x05' + b'\x00' * 5
+
+
+def vbr_header_frame():
+    return frame(0)[:40] + b'Xing' + frame(0)[44:]
+
+
+def narration(*fills):
+    """
+    An MP3 file as the Speech service sends it: ID3 tag, Xing frame, audio frames
+    """
+    return id3_tag() + vbr_header_frame() + b''.join(frame(fill) for fill in fills)
+
+
+def test_concat_joins_audio_frames_only():
+    joined = mp3.concat([narration(1, 2), narration(3) + b'TAG' + b'\x00' * 125])
+
+    assert joined == frame(1) + frame(2) + frame(3)
+    assert mp3.duration(joined) == pytest.approx(3 * 576 / 16000)
+
+
+def test_junk_between_frames_is_skipped():
+    assert [f.length for f in mp3.frames(frame(1) + b'\x00\x13' + frame(2))] == [144, 144]
+
+
+def test_split_text_keeps_chunks_under_the_limit_and_every_word():
+    text = ('Once upon a time. ' * 30).strip() + '\n\n' + 'A very ' + 'long ' * 200 + 'sentence.'
+
+    chunks = split_text(text, max_chars=100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert ' '.join(' '.join(chunks).split()) == ' '.join(text.split())
+
+
+def test_split_text_breaks_between_paragraphs_when_it_can():
+    assert split_text('First part.\n\nSecond part.', max_chars=15) == ['First part.', 'Second part.']
+    assert split_text('First part.\n\nSecond part.', max_chars=100) == ['First part.\n\nSecond part.']
+
+
+def test_chunks_run_in_parallel_and_join_in_order():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def synthesize(chunk):
+        with lock:
+            running.append(chunk)
+            peak.append(len(running))
+        # Later chunks finish first
+        time.sleep(0.05 * (5 - int(chunk[-2])))
+        with lock:
+            running.remove(chunk)
+        return narration(int(chunk[-2]))
+
+    text = ' '.join(f'Sentence {index}.' for index in range(5))
+    audio, timings = synthesize_chunks(synthesize, text, max_chars=12, max_workers=3)
+
+    assert audio == b''.join(frame(index) for index in range(5))
+    assert [timing.index for timing in timings] == list(range(5))
+    assert max(peak) == 3
+
+
+def test_failed_chunks_are_retried_on_their_own():
+    attempts = {}
+
+    def synthesize(chunk):
+        attempts[chunk] = attempts.get(chunk, 0) + 1
+        if chunk == 'Two.' and attempts[chunk] < 3:
+            raise RuntimeError('connection reset')
+        return narration(len(chunk))
+
+    audio, timings = synthesize_chunks(synthesize, 'One. Two. Six.', max_chars=5, max_attempts=3)
+
+    assert attempts == {'One.': 1, 'Two.': 3, 'Six.': 1}
+    assert [timing.attempts for timing in timings] == [1, 3, 1]
+    assert mp3.duration(audio) == pytest.approx(3 * 576 / 16000)
+
+
+def test_a_chunk_failing_every_attempt_fails_the_narration():
+    def synthesize(chunk):
+        raise RuntimeError('Speech is down')
+
+    with pytest.raises(RuntimeError):
+        synthesize_chunks(synthesize, 'One. Two.', max_chars=5, max_attempts=2)
+
+
+def chunking_services(calls):
+    services = AzureServices.__new__(AzureServices)
+    services.config = SimpleNamespace(
+        SPEECH_CHUNKED=True, SPEECH_CHUNK_CHARS=15, SPEECH_CHUNK_WORKERS=2, SPEECH_CHUNK_ATTEMPTS=1,
+        SPEECH_AUDIO_FORMATS=list(AUDIO_FORMATS)
+    )
+    services.audio_format = AUDIO_FORMATS['mp3']
+
+    def synthesize_speech(text, voice=None, audio_format=None):
+        calls.append(text)
+        return narration(len(calls))
+
+    services.synthesize_speech = synthesize_speech
+    return services
+
+
+def test_only_long_mp3_narration_is_chunked():
+    calls = []
+    services = chunking_services(calls)
+
+    services.text_to_speech('Short.')
+    services.text_to_speech('One sentence. And another.', audio_format='ogg-opus')
+    assert calls == ['Short.', 'One sentence. And another.']
+
+    calls.clear()
+    services.text_to_speech('One sentence. And another.')
+    assert sorted(calls) == ['And another.', 'One sentence.']
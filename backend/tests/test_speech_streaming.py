@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import azure.cognitiveservices.speech as speechsdk
+import pytest
+
+from services.azure_services import AzureServices
+from services.rate_limiter import ThrottledError, UpstreamRateLimiter
+
+
+def throttled_result():
+    return SimpleNamespace(
+        reason=speechsdk.ResultReason.Canceled,
+        cancellation_details=SimpleNamespace(
+            error_code=speechsdk.CancellationErrorCode.TooManyRequests, error_details='429 Too Many Requests'
+        )
+    )
+
+
+def completed_result():
+    return SimpleNamespace(reason=speechsdk.ResultReason.SynthesizingAudioCompleted)
+
+
+class FakeSynthesizer:
+    """
+    Plays one scripted attempt per speak_text_async call: the audio chunks it
+    streams through `synthesizing`, then the result it ends with
+    """
+    def __init__(self, attempts):
+        self.attempts = list(attempts)
+        self.handlers = []
+        self.synthesizing = SimpleNamespace(connect=self.handlers.append)
+
+    def speak_text_async(self, text):
+        chunks, result = self.attempts.pop(0)
+        for chunk in chunks:
+            for handler in self.handlers:
+                handler(SimpleNamespace(result=SimpleNamespace(audio_data=chunk)))
+        self.handlers.clear()
+        return SimpleNamespace(get=lambda: result)
+
+
+class FakeSpeechPool:
+    def __init__(self, attempts):
+        self.pooled = SimpleNamespace(synthesizer=FakeSynthesizer(attempts), healthy=True)
+
+    @contextmanager
+    def synthesizer(self, voice, output_format):
+        yield self.pooled
+
+
+def make_services(attempts, max_retries=3):
+    services = AzureServices.__new__(AzureServices)
+    services.speech_endpoint = None
+    services.speech_voice = 'en-US-JennyNeural'
+    services.audio_format = SimpleNamespace(name='mp3', sdk_format=None)
+    services.speech_pool = FakeSpeechPool(attempts)
+    services.rate_limiter = UpstreamRateLimiter({'speech': {}}, max_retries=max_retries, base_delay=0.01)
+    return services
+
+
+def test_throttled_stream_is_retried():
+    services = make_services([([], throttled_result()), ([b'ab', b'cd'], completed_result())])
+
+    assert b''.join(services.stream_speech('Once upon a time.')) == b'abcd'
+    assert services.rate_limiter.counters['speech']['throttled'] == 1
+    assert services.speech_pool.pooled.healthy
+
+
+def test_throttled_stream_raises_throttled_error():
+    services = make_services([([], throttled_result())] * 2, max_retries=1)
+
+    with pytest.raises(ThrottledError) as raised:
+        b''.join(services.stream_speech('Once upon a time.'))
+    assert raised.value.retry_after is None
+    assert services.speech_pool.pooled.healthy
+
+
+def test_stream_throttled_after_audio_is_not_restarted():
+    services = make_services([([b'ab'], throttled_result()), ([b'ab', b'cd'], completed_result())])
+
+    chunks = []
+    with pytest.raises(ThrottledError):
+        for chunk in services.stream_speech('Once upon a time.'):
+            chunks.append(chunk)
+    assert chunks == [b'ab']
+    assert services.rate_limiter.counters['speech']['throttled'] == 0
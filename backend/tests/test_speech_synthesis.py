@@ -0,0 +1,115 @@
+import tempfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import azure.cognitiveservices.speech as speechsdk
+import pytest
+
+from fake_azure import FakeAzureServer, FakeAzureProfile
+from services import mp3
+from services.audio_formats import AUDIO_FORMATS
+from services.azure_services import AzureServices
+from services.http_clients import HttpClients
+from services.rate_limiter import UpstreamRateLimiter
+from services.speech_pool import SynthesizerPool
+
+
+@pytest.fixture(autouse=True)
+def no_temp_files(monkeypatch):
+    """
+    Narration must never go through the filesystem
+    """
+    def refuse(*args, **kwargs):
+        raise AssertionError('speech synthesis wrote a temporary file')
+
+    for name in ('NamedTemporaryFile', 'TemporaryFile', 'mkstemp', 'mktemp'):
+        monkeypatch.setattr(tempfile, name, refuse)
+
+
+class FakeSynthesizer:
+    def __init__(self, result):
+        self.result = result
+        self.texts = []
+
+    def speak_text_async(self, text):
+        self.texts.append(text)
+        return SimpleNamespace(get=lambda: self.result)
+
+
+class FakeSpeechPool:
+    def __init__(self, result):
+        self.pooled = SimpleNamespace(synthesizer=FakeSynthesizer(result), healthy=True)
+        self.requested = []
+
+    @contextmanager
+    def synthesizer(self, voice, output_format):
+        self.requested.append((voice, output_format))
+        yield self.pooled
+
+
+def make_services(result=None, speech_endpoint=None):
+    services = AzureServices.__new__(AzureServices)
+    services.config = SimpleNamespace(SPEECH_VOICES=['en-GB-SoniaNeural'], SPEECH_AUDIO_FORMATS=list(AUDIO_FORMATS))
+    services.speech_endpoint = speech_endpoint
+    services.speech_key = 'fake-speech-key'
+    services.speech_voice = 'en-US-JennyNeural'
+    services.audio_format = AUDIO_FORMATS['mp3']
+    services.speech_pool = FakeSpeechPool(result)
+    services.rate_limiter = UpstreamRateLimiter({'speech': {}}, max_retries=0)
+    return services
+
+
+def test_sdk_audio_is_returned_from_memory():
+    services = make_services(SimpleNamespace(
+        reason=speechsdk.ResultReason.SynthesizingAudioCompleted, audio_data=b'ID3 narration'
+    ))
+
+    assert services.synthesize_speech('Once upon a time.', voice='en-GB-SoniaNeural', audio_format='ogg-opus') == \
+        b'ID3 narration'
+    assert services.speech_pool.requested == [('en-GB-SoniaNeural', AUDIO_FORMATS['ogg-opus'].sdk_format)]
+
+
+def test_canceled_synthesis_retires_the_synthesizer():
+    services = make_services(SimpleNamespace(
+        reason=speechsdk.ResultReason.Canceled,
+        cancellation_details=SimpleNamespace(error_code=speechsdk.CancellationErrorCode.ConnectionFailure,
+                                             error_details='connection lost')
+    ))
+
+    with pytest.raises(Exception, match='Speech synthesis failed'):
+        services.synthesize_speech('Once upon a time.')
+    assert not services.speech_pool.pooled.healthy
+
+
+def test_unknown_voices_are_rejected():
+    with pytest.raises(ValueError, match='voice'):
+        make_services().synthesize_speech('Once upon a time.', voice='xx-XX-Nobody')
+
+
+def test_pooled_synthesizers_have_no_audio_output(monkeypatch):
+    created = []
+
+    class Recorder:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+    connection = SimpleNamespace(disconnected=SimpleNamespace(connect=lambda handler: None), open=lambda warm: None)
+    monkeypatch.setattr(speechsdk, 'SpeechSynthesizer', Recorder)
+    monkeypatch.setattr(speechsdk.Connection, 'from_speech_synthesizer', lambda synthesizer: connection)
+
+    SynthesizerPool('fake-speech-key', 'local')._create('en-US-JennyNeural', AUDIO_FORMATS['mp3'].sdk_format)
+
+    assert created[0]['audio_config'] is None
+
+
+def test_rest_audio_is_returned_from_memory():
+    server = FakeAzureServer(FakeAzureProfile.instant(), quiet=True).start()
+    services = make_services(speech_endpoint=server.url)
+    services.http = HttpClients({'speech': 2}, http2=False)
+    try:
+        audio = services.synthesize_speech('Once upon a time.')
+    finally:
+        services.http.close()
+        server.stop()
+
+    assert mp3.duration(audio) > 0
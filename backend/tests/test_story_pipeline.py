@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+from services.story_pipeline import (
+    StoryPipeline, PipelineStage, PipelineError, PLACEHOLDER_IMAGE_URL, derive_title
+)
+from tests.fakes import FakeStoryServices
+
+REQUEST = {'theme': 'Space', 'characters': ['a fox'], 'age_group': '3-5'}
+
+
+class SlowStoryServices(FakeStoryServices):
+    """
+    GPT and DALL-E each take `delay` seconds
+    """
+    def __init__(self, delay, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+
+    def generate_story(self, theme, characters, age_group):
+        time.sleep(self.delay)
+        return super().generate_story(theme, characters, age_group)
+
+    def generate_illustration(self, title, theme, characters, age_group):
+        time.sleep(self.delay)
+        return super().generate_illustration(title, theme, characters, age_group)
+
+
+@pytest.mark.parametrize('concurrent', [True, False])
+def test_every_stage_runs(concurrent):
+    events = []
+    pipeline = StoryPipeline(
+        FakeStoryServices(), concurrent=concurrent, on_stage=lambda name, status, *_: events.append((name, status))
+    )
+
+    result = pipeline.run(REQUEST)
+
+    assert result['title'] == 'Space Adventure with a fox'
+    assert result['save_story'] == 'http://blobs.test/stories/story.txt'
+    assert result['save_image'] == 'http://blobs.test/images/image.png'
+    assert result['save_audio'] == 'http://blobs.test/audio/audio.mp3'
+    assert result.errors == {}
+    assert {name for name, status in events if status == 'succeeded'} == set(result.timings)
+    assert result.server_timing().endswith(f"total;dur={result.elapsed * 1000:.0f}")
+
+
+def test_independent_stages_overlap():
+    result = StoryPipeline(SlowStoryServices(delay=0.5), concurrent=True).run(REQUEST)
+
+    # Story and illustration run side by side instead of back to back
+    assert result.elapsed < 0.9
+
+
+def test_optional_stages_fall_back():
+    services = FakeStoryServices(failures={'generate_illustration': 1, 'text_to_speech': 1})
+
+    result = StoryPipeline(services, concurrent=True).run(REQUEST)
+
+    assert result['save_image'] == PLACEHOLDER_IMAGE_URL
+    assert result['save_audio'] is None
+    assert set(result.errors) == {'illustration', 'speech'}
+    # Skipped because their input failed, not called with the fallback
+    assert 'save_audio' not in services.calls
+
+
+@pytest.mark.parametrize('concurrent', [True, False])
+def test_required_stage_failure_fails_the_pipeline(concurrent):
+    services = FakeStoryServices(failures={'generate_story': 1})
+
+    with pytest.raises(PipelineError) as raised:
+        StoryPipeline(services, concurrent=concurrent).run(REQUEST)
+
+    assert raised.value.stage == 'story'
+
+
+def test_seeded_stages_are_not_run_again():
+    services = FakeStoryServices()
+
+    result = StoryPipeline(services, concurrent=True).run(REQUEST, seed={'story': 'Streamed earlier. The end.'})
+
+    assert 'generate_story' not in services.calls
+    assert result['story'] == 'Streamed earlier. The end.'
+
+
+def test_unsatisfiable_dependencies_are_reported():
+    stages = [PipelineStage('save', lambda r: None, depends_on=('missing',))]
+
+    with pytest.raises(ValueError, match='save'):
+        StoryPipeline(FakeStoryServices(), concurrent=True).run(REQUEST, stages=stages)
+
+
+def test_title_prefers_the_request_then_the_story_heading():
+    assert derive_title('**The Fox**\nOnce upon a time.', {**REQUEST, 'title': 'Chosen'}) == 'Chosen'
+    assert derive_title('**The Fox**\nOnce upon a time.', REQUEST) == 'The Fox'
+
+
+def test_create_story_runs_the_pipeline(make_client, fake_services):
+    client = make_client(STORY_PIPELINE_CONCURRENT=True)
+
+    response = client.post('/api/stories', json=REQUEST)
+
+    assert response.status_code == 201
+    assert response.get_json()['audioUrl'] == 'http://blobs.test/audio/audio.mp3'
+    assert 'story;dur=' in response.headers['Server-Timing']
+    assert fake_services.calls.count('generate_story') == 1
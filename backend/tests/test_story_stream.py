@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from extensions import db, job_queue
+from models.models import Story
+
+REQUEST = {'theme': 'Space', 'characters': ['a fox'], 'age_group': '3-5'}
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client()
+
+
+def events(response):
+    """
+    The (event, data) pairs of a text/event-stream body
+    """
+    parsed = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def test_story_text_is_streamed_then_saved(client, fake_services):
+    response = client.post('/api/stories/stream', json=REQUEST)
+
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    stream = events(response)
+    assert stream[0] == ('start', {'theme': 'Space'})
+    text = ''.join(data['text'] for event, data in stream if event == 'delta')
+    assert text.strip() == 'Once upon a time in Space there lived a fox. The end.'
+    event, story = stream[-1]
+    assert event == 'story'
+    assert story['content'] == text
+    assert story['statusUrl'].endswith(story['jobId'])
+    # Illustration and narration are left to the background job
+    assert fake_services.calls == ['stream_story']
+
+
+def test_media_job_completes_the_streamed_story(client, fake_services):
+    story_id = events(client.post('/api/stories/stream', json=REQUEST))[-1][1]['id']
+
+    assert job_queue.run_pending() == 1
+
+    with client.application.app_context():
+        story = db.session.get(Story, story_id)
+        assert story.image_url == 'http://blobs.test/images/image.png'
+        assert story.audio_url == 'http://blobs.test/audio/audio.mp3'
+    assert 'generate_story' not in fake_services.calls
+
+
+def test_eventsource_can_send_the_request_as_a_query(client):
+    response = client.get('/api/stories/stream?theme=Space&age_group=3-5&characters=a%20fox,an%20owl')
+
+    event, story = events(response)[-1]
+    assert event == 'story'
+    assert story['characters'] == ['a fox', 'an owl']
+
+
+def test_missing_fields_are_rejected_before_streaming(client):
+    assert client.post('/api/stories/stream', json={'theme': 'Space'}).status_code == 400
+
+
+def test_generation_errors_end_the_stream_with_an_error_event(client, fake_services):
+    fake_services.failures['stream_story'] = 1
+
+    event, data = events(client.post('/api/stories/stream', json=REQUEST))[-1]
+
+    assert event == 'error' and 'stream_story failed' in data['error']
+    with client.application.app_context():
+        assert Story.query.count() == 0
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from services.upstream_limits import ConcurrencyLimitedServices
+
+
+class SlowServices:
+    """
+    Records how many generate_story calls run at once
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def generate_story(self, theme, characters, age_group):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return 'story'
+
+    def save_story_content(self, story, title):
+        return 'http://blobs.test/stories/story.txt'
+
+    def with_fresh(self):
+        return self
+
+
+def run_at_once(services, count=6):
+    threads = [
+        threading.Thread(target=services.generate_story, args=('forest', [], '3-5')) for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_calls_over_the_limit_wait():
+    upstream = SlowServices()
+    run_at_once(ConcurrencyLimitedServices(upstream, {'gpt': 2}))
+    assert upstream.peak == 2
+
+
+def test_zero_means_unlimited():
+    upstream = SlowServices()
+    run_at_once(ConcurrencyLimitedServices(upstream, {'gpt': 0}))
+    assert upstream.peak > 2
+
+
+def test_negative_limits_are_rejected():
+    with pytest.raises(ValueError, match='gpt'):
+        ConcurrencyLimitedServices(SlowServices(), {'gpt': -1})
+
+
+def test_fresh_services_share_the_slots():
+    services = ConcurrencyLimitedServices(SlowServices(), {'gpt': 1})
+    assert services.with_fresh().semaphores is services.semaphores
+    assert services.save_story_content('story', 'Title') == 'http://blobs.test/stories/story.txt'
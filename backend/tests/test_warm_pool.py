@@ -0,0 +1,75 @@
+import json
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from extensions import db, warm_pool
+from models.models import Story, WarmStory
+from services.warm_pool import bucket_key
+
+PRESET = {'theme': 'forest', 'characters': ['Fox', 'Owl'], 'age_group': '3-5'}
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(WARM_POOL_BUCKETS=json.dumps([PRESET]), WARM_POOL_SIZE=1)
+
+
+def add_warm_story(client, title='Pooled story'):
+    with client.application.app_context():
+        db.session.add(WarmStory(
+            bucket=bucket_key(PRESET['theme'], PRESET['characters'], PRESET['age_group']),
+            title=title,
+            content='Once upon a time. The end.',
+            theme=PRESET['theme'],
+            characters=json.dumps(PRESET['characters']),
+            age_group=PRESET['age_group']
+        ))
+        db.session.commit()
+
+
+def test_preset_request_is_served_from_the_pool(client, fake_services):
+    add_warm_story(client)
+
+    response = client.post('/api/stories', json=PRESET)
+
+    assert response.status_code == 201
+    assert response.headers['X-Warm-Pool'] == 'hit'
+    assert response.get_json()['title'] == 'Pooled story'
+    assert fake_services.calls == []
+    with client.application.app_context():
+        assert WarmStory.query.count() == 0
+        assert Story.query.count() == 1
+
+
+def test_each_pooled_story_is_served_once(client, fake_services):
+    add_warm_story(client)
+
+    first = client.post('/api/stories', json=PRESET)
+    second = client.post('/api/stories', json=PRESET)
+
+    assert first.headers.get('X-Warm-Pool') == 'hit'
+    assert second.status_code == 201
+    assert 'X-Warm-Pool' not in second.headers
+    assert 'generate_story' in fake_services.calls
+
+
+def test_fresh_requests_skip_the_pool(client, fake_services):
+    add_warm_story(client)
+
+    response = client.post('/api/stories', json={**PRESET, 'fresh': True})
+
+    assert 'X-Warm-Pool' not in response.headers
+    with client.application.app_context():
+        assert WarmStory.query.count() == 1
+
+
+def test_claim_errors_are_reported_as_json(client, monkeypatch):
+    def fail(data):
+        raise OperationalError('DELETE FROM warm_story', {}, Exception('database is locked'))
+    monkeypatch.setattr(warm_pool, 'claim', fail)
+
+    response = client.post('/api/stories', json=PRESET)
+
+    assert response.status_code == 500
+    assert 'error' in response.get_json()
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { speechApi } from './services/api';
-import { generateStory, listStories, Story, toggleFavorite, regenerateIllustration, deleteStory } from './lib/api';
+import { generateStory, listStories, Story, toggleFavorite, regenerateIllustration, deleteStory, JobTimeoutError } from './lib/api';
 import { Toaster, toast } from 'react-hot-toast';
 import confetti from 'canvas-confetti';
 import './App.css';
@@ -379,6 +379,7 @@ const HeaderBubbles = () => {
 };
 
 // Story card component
+const CARD_IMAGE_SIZES = '(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw';
 const StoryCard = ({ story, onView, onToggleFavorite, onDelete }: { 
   story: Story, 
   onView: (story: Story) => void, 
@@ -430,12 +431,18 @@ const StoryCard = ({ story, onView, onToggleFavorite, onDelete }: {
       {/* Display AI-generated illustration if available */}
       {story.imageUrl && (
         <div className="story-illustration">
-          <img 
-            src={story.imageUrl} 
-            alt={`Illustration for "${story.title}"`} 
-            className="w-full h-48 object-cover rounded-lg mb-3"
-            loading="lazy"
-          />
+          {/* Cards load a thumbnail sized for the grid; the original PNG is only the fallback */}
+          <picture>
+            {story.imageSources?.map(source => (
+              <source key={source.type} type={source.type} srcSet={source.srcset} sizes={CARD_IMAGE_SIZES} />
+            ))}
+            <img 
+              src={story.thumbnailUrl || story.imageUrl} 
+              alt={`Illustration for "${story.title}"`} 
+              className="w-full h-48 object-cover rounded-lg mb-3"
+              loading="lazy"
+            />
+          </picture>
         </div>
       )}
       
@@ -480,6 +487,7 @@ const StoryModal = ({ story, isOpen, onClose, onToggleFavorite, onDelete }: Stor
   const [storyData, setStoryData] = useState(story);
   const audioRef = useRef<HTMLAudioElement | null>(null);
   const abortControllerRef = useRef<AbortController | null>(null);
+  const regenerateAbortRef = useRef<AbortController | null>(null);
 
   useEffect(() => {
     // Update storyData when the story prop changes
@@ -737,6 +745,8 @@ const StoryModal = ({ story, isOpen, onClose, onToggleFavorite, onDelete }: Stor
   useEffect(() => {
     return () => {
       stopSpeaking();
+      // Stop polling for a regenerated illustration nobody will see
+      regenerateAbortRef.current?.abort();
     };
   }, []);
 
@@ -750,14 +760,19 @@ const StoryModal = ({ story, isOpen, onClose, onToggleFavorite, onDelete }: Stor
 
   // Function to regenerate the illustration
   const handleRegenerateIllustration = async () => {
+    const controller = new AbortController();
+    regenerateAbortRef.current = controller;
     try {
       setIsRegeneratingImage(true);
-      const response = await regenerateIllustration(storyData.id);
+      const { story } = await regenerateIllustration(storyData.id, 1, { signal: controller.signal });
       
-      // Update the local story data with the new image URL
+      // Update the local story data with the saved illustration and its thumbnails
       setStoryData({
         ...storyData,
-        imageUrl: response.imageUrl
+        imageUrl: story?.imageUrl,
+        thumbnailUrl: story?.thumbnailUrl,
+        srcset: story?.srcset,
+        imageSources: story?.imageSources
       });
       
       toast.success("Illustration regenerated successfully!");
@@ -768,10 +783,14 @@ const StoryModal = ({ story, isOpen, onClose, onToggleFavorite, onDelete }: Stor
         origin: { y: 0.6 }
       });
     } catch (error) {
-      toast.error("Failed to regenerate illustration. Please try again.");
+      if (controller.signal.aborted) return;
+      toast.error(
+        error instanceof JobTimeoutError ? error.message : "Failed to regenerate illustration. Please try again."
+      );
       console.error("Error regenerating illustration:", error);
     } finally {
-      setIsRegeneratingImage(false);
+      if (regenerateAbortRef.current === controller) regenerateAbortRef.current = null;
+      if (!controller.signal.aborted) setIsRegeneratingImage(false);
     }
   };
 
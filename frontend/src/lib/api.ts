@@ -15,6 +15,10 @@ export interface Story {
   ageGroup: string;
   isFavorite: boolean;
   imageUrl?: string;
+  // Smaller WebP/AVIF copies of the illustration for list views (null until rendered)
+  thumbnailUrl?: string | null;
+  srcset?: string | null;
+  imageSources?: { type: string; srcset: string }[];
   createdAt: string;
 }
 
@@ -111,8 +115,94 @@ export async function toggleFavorite(storyId: number): Promise<{ isFavorite: boo
   return { isFavorite: (result as any).isFavorite };
 }
 
-export async function regenerateIllustration(storyId: number): Promise<{ id: number, imageUrl: string }> {
-  return fetchWithAuth(`/stories/${storyId}/regenerate-illustration`, { method: "POST" });
+export interface IllustrationCandidate {
+  imageUrl: string;
+  thumbnailUrl?: string | null;
+  srcset?: string | null;
+  imageSources?: { type: string; srcset: string }[];
+}
+
+interface IllustrationJob {
+  id: string;
+  status: "queued" | "running" | "succeeded" | "failed";
+  error?: string | null;
+  result?: { candidates: IllustrationCandidate[]; selected: number | null };
+  story?: Story;
+}
+
+export interface WaitOptions {
+  // Give up (with an error) after this long; defaults to JOB_TIMEOUT_MS
+  timeoutMs?: number;
+  intervalMs?: number;
+  // Stop polling, e.g. when the view waiting for the job goes away
+  signal?: AbortSignal;
+}
+
+// Longer than the backend needs for a few DALL-E candidates, retries included
+export const JOB_TIMEOUT_MS = 3 * 60 * 1000;
+
+export class JobTimeoutError extends Error {
+  jobId: string;
+
+  constructor(jobId: string) {
+    super("The illustration is taking longer than expected. Please try again later.");
+    this.name = "JobTimeoutError";
+    this.jobId = jobId;
+  }
+}
+
+function sleep(ms: number, signal?: AbortSignal): Promise<void> {
+  return new Promise((resolve, reject) => {
+    const onAbort = () => {
+      clearTimeout(timer);
+      reject(signal?.reason ?? new DOMException("Aborted", "AbortError"));
+    };
+    const timer = setTimeout(() => {
+      signal?.removeEventListener("abort", onAbort);
+      resolve();
+    }, ms);
+    signal?.addEventListener("abort", onAbort, { once: true });
+  });
+}
+
+async function waitForJob(
+  jobId: string,
+  { timeoutMs = JOB_TIMEOUT_MS, intervalMs = 1500, signal }: WaitOptions = {}
+): Promise<IllustrationJob> {
+  const deadline = Date.now() + timeoutMs;
+  for (;;) {
+    signal?.throwIfAborted();
+    const job: IllustrationJob = await fetchWithAuth(`/jobs/${jobId}`, { method: "GET", signal });
+    if (job.status === "succeeded") return job;
+    if (job.status === "failed") throw new Error(job.error || "Illustration job failed");
+    const remaining = deadline - Date.now();
+    if (remaining <= 0) throw new JobTimeoutError(jobId);
+    await sleep(Math.min(intervalMs, remaining), signal);
+  }
+}
+
+// Regeneration runs in the background: queue it, then poll the job until the new image is saved
+// (rejecting with JobTimeoutError if that takes longer than options.timeoutMs).
+// With candidates > 1 the story is unchanged until chooseIllustration() picks one.
+export async function regenerateIllustration(
+  storyId: number,
+  candidates = 1,
+  options: WaitOptions = {}
+): Promise<{ story?: Story; candidates: IllustrationCandidate[]; jobId: string }> {
+  const { jobId } = await fetchWithAuth(`/stories/${storyId}/regenerate-illustration`, {
+    method: "POST",
+    body: JSON.stringify({ candidates }),
+    signal: options.signal,
+  });
+  const job = await waitForJob(jobId, options);
+  return { story: job.story, candidates: job.result?.candidates ?? [], jobId };
+}
+
+export async function chooseIllustration(storyId: number, jobId: string, candidate: number): Promise<Story> {
+  return fetchWithAuth(`/stories/${storyId}/illustration`, {
+    method: "POST",
+    body: JSON.stringify({ jobId, candidate }),
+  });
 }
 
 export async function deleteStory(storyId: number): Promise<void> {
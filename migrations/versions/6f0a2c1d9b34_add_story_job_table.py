@@ -0,0 +1,45 @@
+"""Add story_job table for background story generation
+
+Revision ID: 6f0a2c1d9b34
+Revises: 54b16034b22a
+Create Date: 2026-10-18 09:12:04.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f0a2c1d9b34'
+down_revision = '54b16034b22a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('story_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('kind', sa.String(length=30), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('stages', sa.Text(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('story_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['story_id'], ['story.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('story_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_story_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('story_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_story_job_status'))
+
+    op.drop_table('story_job')
@@ -0,0 +1,41 @@
+"""Add warm_story table for the pre-generated story pool
+
+Revision ID: 9b7e3f52c6a1
+Revises: 6f0a2c1d9b34
+Create Date: 2026-10-18 11:40:27.530918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7e3f52c6a1'
+down_revision = '6f0a2c1d9b34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('warm_story',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.String(length=64), nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('theme', sa.String(length=50), nullable=False),
+    sa.Column('characters', sa.String(length=500), nullable=False),
+    sa.Column('age_group', sa.String(length=20), nullable=False),
+    sa.Column('image_url', sa.String(length=500), nullable=True),
+    sa.Column('audio_url', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('warm_story', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_warm_story_bucket'), ['bucket'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('warm_story', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_warm_story_bucket'))
+
+    op.drop_table('warm_story')
@@ -0,0 +1,32 @@
+"""Add image_variants to story and warm_story for thumbnail and WebP/AVIF copies
+
+Revision ID: c4d8a1e7f203
+Revises: 9b7e3f52c6a1
+Create Date: 2026-10-18 15:06:51.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8a1e7f203'
+down_revision = '9b7e3f52c6a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('warm_story', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('warm_story', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
+
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
@@ -0,0 +1,95 @@
+"""Add blob_ref reference counts and content_url for content-addressed blobs
+
+Revision ID: d7e2b9c41a58
+Revises: c4d8a1e7f203
+Create Date: 2026-10-18 16:42:13.580214
+
+"""
+import json
+from datetime import datetime
+from urllib.parse import urlparse, unquote
+
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2b9c41a58'
+down_revision = 'c4d8a1e7f203'
+branch_labels = None
+depends_on = None
+
+
+def _containers():
+    config = current_app.config
+    return {
+        config.get('AZURE_STORAGE_CONTAINER_STORIES', 'stories'),
+        config.get('AZURE_STORAGE_CONTAINER_AUDIO', 'audio'),
+        config.get('AZURE_STORAGE_CONTAINER_IMAGES', 'images')
+    }
+
+
+def _blob(url, containers):
+    # Stored blob URLs are absolute and end in /<container>/<name>; the placeholder image is relative
+    parsed = urlparse(url or '')
+    segments = parsed.path.rstrip('/').rsplit('/', 2)
+    if not parsed.scheme or len(segments) < 3 or not segments[1] or not segments[2]:
+        return None
+    container, name = unquote(segments[1]), unquote(segments[2])
+    # Anything else (an external image URL, say) is not ours to count
+    return (container, name) if container in containers else None
+
+
+def upgrade():
+    blob_ref = op.create_table('blob_ref',
+        sa.Column('container', sa.String(length=63), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('container', 'name')
+    )
+    with op.batch_alter_table('blob_ref', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_blob_ref_updated_at'), ['updated_at'], unique=False)
+
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_url', sa.String(length=500), nullable=True))
+
+    with op.batch_alter_table('warm_story', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_url', sa.String(length=500), nullable=True))
+
+    # Count the blobs existing stories already point at, so none of them looks unused
+    connection = op.get_bind()
+    containers = _containers()
+    counts = {}
+    for table in ('story', 'warm_story'):
+        # The same columns models.BLOB_URL_COLUMNS counts from then on
+        rows = connection.execute(sa.text(f"SELECT image_url, audio_url, content_url, image_variants FROM {table}"))
+        for image_url, audio_url, content_url, image_variants in rows:
+            urls = [image_url, audio_url, content_url]
+            try:
+                urls.extend(variant.get('url') for variant in json.loads(image_variants or '[]'))
+            except (ValueError, TypeError, AttributeError):
+                pass
+            for blob in filter(None, (_blob(url, containers) for url in urls)):
+                counts[blob] = counts.get(blob, 0) + 1
+    now = datetime.utcnow()
+    if counts:
+        op.bulk_insert(blob_ref, [
+            {'container': container, 'name': name, 'refcount': refcount, 'created_at': now, 'updated_at': now}
+            for (container, name), refcount in counts.items()
+        ])
+
+
+def downgrade():
+    with op.batch_alter_table('warm_story', schema=None) as batch_op:
+        batch_op.drop_column('content_url')
+
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        batch_op.drop_column('content_url')
+
+    with op.batch_alter_table('blob_ref', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_blob_ref_updated_at'))
+
+    op.drop_table('blob_ref')